@@ -0,0 +1,163 @@
+from typing import Callable, Dict, List, Literal, Optional, Sequence, Tuple
+from collections import defaultdict
+from benchmarks.corpus import load_test_corpus
+from benchmarks.results import (
+    add_result_arguments,
+    build_results,
+    report,
+)
+from dialog_reflection.reflection_cancelled import (
+    ReflectionCancelled,
+)
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+import argparse
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+import spacy
+
+# "default" is the filter of python for UserWarning which the library leaves as is,
+# "ignore" shows the cost of the cancellation without the warnings
+WARNING_ACTIONS: Tuple[Literal["default", "ignore"], ...] = ("default", "ignore")
+
+CORPUS_MODULES = (
+    "test_build_text_cut_suffix",
+    "test_build_text_finalize",
+    "test_reflection_text_builder",
+)
+
+
+class _KeigoOnlyBuilder(JaSpacyPlainReflectionTextBuilder):
+    # KeigoExclusionFailed は extract_tokens を経由すると再現しないため
+    # テストと同様に文全体を `_exclude_keigo` に通す
+    def build(self, doc: spacy.tokens.Doc) -> str:
+        return self._exclude_keigo(doc[:])
+
+
+def _outcome(builder: JaSpacyPlainReflectionTextBuilder, doc: spacy.tokens.Doc):
+    try:
+        builder.build(doc)
+        return "success"
+    except ReflectionCancelled as e:
+        return type(e.reason).__name__
+    except Exception as e:
+        return type(e).__name__
+
+
+def _time_per_call_ms(fn: Callable[[], object], calls: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter_ns() - start) / calls / 1e6
+
+
+def _peak_bytes_per_call(fn: Callable[[], object]) -> float:
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        return float(peak - before)
+    finally:
+        tracemalloc.stop()
+
+
+def _measure(
+    builder: JaSpacyPlainReflectionTextBuilder,
+    docs: List[spacy.tokens.Doc],
+    repeat: int,
+) -> Dict[str, float]:
+    """
+    "build" raises the cancellation only, "safe_build" also formats the traceback,
+    warns and builds the text instead of the error.
+    """
+
+    def _build_all():
+        for doc in docs:
+            try:
+                builder.build(doc)
+            except Exception:
+                pass
+
+    def _safe_build_all():
+        for doc in docs:
+            builder.safe_build(doc)
+
+    calls = repeat * len(docs)
+    build_ms = _time_per_call_ms(_build_all, repeat) / len(docs)
+    safe_build_ms = _time_per_call_ms(_safe_build_all, repeat) / len(docs)
+    return {
+        "build.mean_ms": build_ms,
+        "safe_build.mean_ms": safe_build_ms,
+        "handler.mean_ms": safe_build_ms - build_ms,
+        "safe_build.peak_bytes": _peak_bytes_per_call(_safe_build_all) / len(docs),
+        "calls": float(calls),
+    }
+
+
+def run(model: str, repeat: int) -> Dict[str, float]:
+    nlp = spacy.load(model)
+    builder = JaSpacyPlainReflectionTextBuilder()
+
+    scenarios: Dict[str, List[spacy.tokens.Doc]] = defaultdict(list)
+    for entry in load_test_corpus(CORPUS_MODULES):
+        doc = nlp(entry.text)
+        scenarios[_outcome(builder, doc)].append(doc)
+        if "?" in entry.text or "？" in entry.text:
+            scenarios["question_mark"].append(doc)
+    # 敬語変換の失敗は同じステージの成功と比較する
+    keigo_builder = _KeigoOnlyBuilder()
+    keigo_scenarios = {
+        "keigo.success": list(nlp.pipe(["あなたと歩きました", "下に見えました", "それは明日でした"])),
+        "keigo.KeigoExclusionFailed": list(nlp.pipe(["あなたは美しくあるでしょう"])),
+    }
+
+    metrics: Dict[str, float] = {}
+    for action in WARNING_ACTIONS:
+        measured: Dict[str, Dict[str, float]] = {}
+        # the warnings shown are written to devnull to time their formatting
+        # and the registry without the cost of the terminal
+        with warnings.catch_warnings(), open(os.devnull, "w") as devnull:
+            warnings.simplefilter(action)
+            with contextlib.redirect_stderr(devnull):
+                for scenario, docs in scenarios.items():
+                    measured[scenario] = _measure(builder, docs, repeat)
+                for scenario, docs in keigo_scenarios.items():
+                    measured[scenario] = _measure(keigo_builder, docs, repeat)
+
+        for scenario, values in measured.items():
+            success = "keigo.success" if scenario.startswith("keigo.") else "success"
+            if scenario != success and success in measured:
+                for name in ["safe_build.mean_ms", "safe_build.peak_bytes"]:
+                    values[f"extra_over_success.{name}"] = (
+                        values[name] - measured[success][name]
+                    )
+            for name, value in values.items():
+                metrics[f"warnings_{action}.{scenario}.{name}"] = value
+    return dict(sorted(metrics.items()))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="benchmark the cost of cancelled reflections over successful ones"
+    )
+    parser.add_argument("--model", default="ja_ginza")
+    parser.add_argument("--repeat", type=int, default=20)
+    add_result_arguments(parser)
+    args = parser.parse_args(argv)
+
+    metrics = run(args.model, args.repeat)
+    results = build_results(
+        "cancellation", metrics, model=args.model, repeat=args.repeat
+    )
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
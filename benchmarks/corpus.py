@@ -0,0 +1,66 @@
+from typing import Any, Dict, List, Optional, Sequence
+import attr
+import importlib.util
+import pathlib
+
+TESTS_DIR = pathlib.Path(__file__).parent.parent / "tests" / "lang" / "ja"
+
+# テストケースの入力を再利用する
+# 活用形ごとに1つずつ選ばれた入力のため、実運用のメッセージ分布とは異なる
+DEFAULT_TEST_MODULES = (
+    "test_build_text_cut_suffix",
+    "test_build_text_finalize",
+    "test_build_text_exclude_keigo",
+)
+
+
+@attr.define(frozen=True)
+class CorpusEntry:
+    module: str
+    test: str
+    params: Dict[str, Any]
+
+    @property
+    def text(self) -> str:
+        return self.params["text"]
+
+
+def _load_module(name: str):
+    spec = importlib.util.spec_from_file_location(name, TESTS_DIR / f"{name}.py")
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_test_corpus(
+    modules: Sequence[str] = DEFAULT_TEST_MODULES,
+    test: Optional[str] = None,
+) -> List[CorpusEntry]:
+    """
+    collect the parameters with "text" of `pytest.mark.parametrize` in the test modules.
+    """
+    entries = []
+    for name in modules:
+        module = _load_module(name)
+        for attr_name, fn in vars(module).items():
+            if not attr_name.startswith("test_") or not callable(fn):
+                continue
+            if test is not None and attr_name != test:
+                continue
+            for mark in getattr(fn, "pytestmark", []):
+                if mark.name != "parametrize":
+                    continue
+                argnames, argvalues = mark.args[0], mark.args[1]
+                if isinstance(argnames, str):
+                    argnames = [name.strip() for name in argnames.split(",")]
+                if "text" not in argnames:
+                    continue
+                for values in argvalues:
+                    params = dict(zip(argnames, values))
+                    entries.append(CorpusEntry(name, attr_name, params))
+    return entries
+
+
+def load_test_texts(modules: Sequence[str] = DEFAULT_TEST_MODULES) -> List[str]:
+    return [entry.text for entry in load_test_corpus(modules)]
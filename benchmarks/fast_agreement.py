@@ -0,0 +1,160 @@
+from typing import Any, Dict, List, Optional, Sequence
+from benchmarks.corpus import load_test_corpus
+from benchmarks.results import (
+    add_result_arguments,
+    build_results,
+    report,
+)
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.stage_hook import IStageHook, StageTimings
+from dialog_reflection.tools.replay import read_corpus
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.fast_reflection_text_builder import (
+    JaSpacyFastReflectionTextBuilder,
+    TOKENIZER_ONLY_EXCLUDE,
+)
+from dialog_reflection.lang.ja.adaptive_reflector import AdaptiveReflector
+import argparse
+import collections
+import sys
+import time
+import warnings
+import spacy
+
+
+class _OutcomeRecorder(IStageHook):
+    def __init__(self) -> None:
+        self.outcomes: List[str] = []
+
+    def on_reflection(self, timings: StageTimings) -> None:
+        self.outcomes.append(timings.outcome)
+
+
+def _reflect(
+    nlp: spacy.Language, builder: JaSpacyPlainReflectionTextBuilder, texts: List[str]
+) -> Dict[str, Any]:
+    recorder = _OutcomeRecorder()
+    builder.add_stage_hook(recorder)
+    start = time.perf_counter()
+    reflections = [builder.safe_build(doc) for doc in nlp.pipe(texts)]
+    elapsed_sec = time.perf_counter() - start
+    return {
+        "reflections": reflections,
+        "outcomes": recorder.outcomes,
+        "messages_per_sec": len(texts) / elapsed_sec,
+    }
+
+
+def _reflect_adaptive(nlp: spacy.Language, texts: List[str]) -> Dict[str, Any]:
+    """
+    reflect the messages one by one as served, with and without the fast path.
+    """
+    reflector = SpacyReflector(nlp, JaSpacyPlainReflectionTextBuilder())
+    adaptive = AdaptiveReflector(reflector)
+    start = time.perf_counter()
+    for text in texts:
+        reflector.reflect(text)
+    full_elapsed_sec = time.perf_counter() - start
+    start = time.perf_counter()
+    reflections = [adaptive.reflect(text) for text in texts]
+    elapsed_sec = time.perf_counter() - start
+    return {
+        "reflections": reflections,
+        "escalation_fraction": adaptive.escalation_fraction,
+        "escalation_reasons": adaptive.escalation_reasons,
+        "full_messages_per_sec": len(texts) / full_elapsed_sec,
+        "messages_per_sec": len(texts) / elapsed_sec,
+    }
+
+
+def compare(
+    full_nlp: spacy.Language,
+    fast_nlp: spacy.Language,
+    corpora: Dict[str, List[str]],
+    show: int,
+) -> Dict[str, float]:
+    """
+    compare the fast builder on the tokenizer with the full builder on the parser
+    per corpus, e.g. per test module.
+    """
+    metrics: Dict[str, float] = {}
+    for name, texts in corpora.items():
+        full = _reflect(full_nlp, JaSpacyPlainReflectionTextBuilder(), texts)
+        fast = _reflect(fast_nlp, JaSpacyFastReflectionTextBuilder(), texts)
+        changed = [
+            (text, a, b, a_outcome, b_outcome)
+            for text, a, b, a_outcome, b_outcome in zip(
+                texts,
+                full["reflections"],
+                fast["reflections"],
+                full["outcomes"],
+                fast["outcomes"],
+            )
+            if a != b
+        ]
+        metrics[f"{name}.messages"] = float(len(texts))
+        metrics[f"{name}.agreement"] = 1 - len(changed) / len(texts)
+        metrics[f"{name}.full.messages_per_sec"] = full["messages_per_sec"]
+        metrics[f"{name}.fast.messages_per_sec"] = fast["messages_per_sec"]
+
+        # 信頼度の低いメッセージのみ構文解析する
+        adaptive = _reflect_adaptive(full_nlp, texts)
+        adaptive_changed = sum(
+            1 for a, b in zip(full["reflections"], adaptive["reflections"]) if a != b
+        )
+        metrics[f"{name}.adaptive.agreement"] = 1 - adaptive_changed / len(texts)
+        metrics[f"{name}.adaptive.escalation_fraction"] = adaptive[
+            "escalation_fraction"
+        ]
+        metrics[f"{name}.adaptive.messages_per_sec"] = adaptive["messages_per_sec"]
+        metrics[f"{name}.adaptive.speedup"] = (
+            adaptive["messages_per_sec"] / adaptive["full_messages_per_sec"]
+        )
+        for reason, count in adaptive["escalation_reasons"].items():
+            metrics[f"{name}.adaptive.escalated.{reason}"] = count / len(texts)
+
+        outcome_changes = collections.Counter(
+            (a_outcome, b_outcome) for *_, a_outcome, b_outcome in changed
+        )
+        print(f"# {name}: {len(changed)} / {len(texts)} changed", file=sys.stderr)
+        for (a_outcome, b_outcome), count in outcome_changes.most_common():
+            print(f"  {a_outcome} -> {b_outcome}: {count}", file=sys.stderr)
+        for text, a, b, _, _ in changed[:show]:
+            print(f"  {text}\n    - {a}\n    + {b}", file=sys.stderr)
+    return metrics
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="report how far the tokenizer-only fast builder differs "
+        "from the full builder on the test corpora"
+    )
+    parser.add_argument("--model", default="ja_ginza")
+    parser.add_argument("--corpus", help="compare also on the messages of the file")
+    parser.add_argument("--limit", type=int, default=10000)
+    parser.add_argument("--show", type=int, default=10, help="examples to show")
+    add_result_arguments(parser)
+    args = parser.parse_args(argv)
+
+    corpora: Dict[str, List[str]] = collections.defaultdict(list)
+    for entry in load_test_corpus():
+        corpora[entry.module].append(entry.text)
+    if args.corpus:
+        corpora["corpus"] = read_corpus(args.corpus, limit=args.limit)
+
+    full_nlp = spacy.load(args.model)
+    fast_nlp = spacy.load(args.model, exclude=TOKENIZER_ONLY_EXCLUDE)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        metrics = compare(full_nlp, fast_nlp, dict(corpora), args.show)
+
+    results = build_results(
+        "fast_agreement", metrics, model=args.model, corpus=args.corpus
+    )
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
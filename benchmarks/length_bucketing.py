@@ -0,0 +1,144 @@
+from typing import Dict, List, Optional, Sequence
+from benchmarks.corpus import load_test_texts
+from benchmarks.results import (
+    add_result_arguments,
+    build_results,
+    report,
+)
+from dialog_reflection.reflector import SpacyReflector, order_by_length
+from dialog_reflection.tools.replay import read_corpus
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+import argparse
+import math
+import random
+import sys
+import time
+import warnings
+import spacy
+
+
+def synthetic_messages(
+    texts: Sequence[str],
+    count: int,
+    median_chars: float = 15.0,
+    sigma: float = 1.0,
+    max_chars: int = 300,
+    seed: int = 0,
+) -> List[str]:
+    """
+    join the texts into messages of log-normal lengths,
+    mostly short chat messages with a long tail.
+    """
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        target = min(max_chars, rng.lognormvariate(math.log(median_chars), sigma))
+        message = rng.choice(texts)
+        while len(message) < target:
+            message = message.rstrip("。") + "。" + rng.choice(texts)
+        messages.append(message)
+    return messages
+
+
+def padded_fraction(
+    lengths: Sequence[int], order: Sequence[int], batch_size: int
+) -> float:
+    """
+    the fraction of the padding in the batches padded to the longest,
+    as the transformer models compute.
+    """
+    padded = used = 0
+    for start in range(0, len(order), batch_size):
+        batch = [lengths[i] for i in order[start : start + batch_size]]
+        padded += max(batch) * len(batch)
+        used += sum(batch)
+    return 1 - used / padded if padded > 0 else 0.0
+
+
+def run(
+    reflector: SpacyReflector,
+    messages: List[str],
+    batch_size: int,
+    windows: Sequence[int],
+    repeat: int,
+) -> Dict[str, float]:
+    # 長さはトークン数で数える
+    lengths = [len(reflector.nlp.make_doc(message)) for message in messages]
+    expected = reflector.reflect_many(messages, batch_size=batch_size)
+
+    metrics: Dict[str, float] = {
+        "messages": float(len(messages)),
+        "tokens.mean": sum(lengths) / len(lengths),
+        "tokens.max": float(max(lengths)),
+    }
+    for window in [None, *windows]:
+        name = "unsorted" if window is None else f"window{window}"
+        order = (
+            range(len(messages))
+            if window is None
+            else order_by_length(messages, window)
+        )
+        elapsed_sec = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            reflections = reflector.reflect_many(
+                messages, batch_size=batch_size, sort_window=window
+            )
+            elapsed_sec.append(time.perf_counter() - start)
+            if reflections != expected:
+                raise AssertionError(f"the reflections changed by {name}")
+        metrics[f"{name}.messages_per_sec"] = len(messages) / min(elapsed_sec)
+        metrics[f"{name}.padded_fraction"] = padded_fraction(lengths, order, batch_size)
+        metrics[f"{name}.speedup"] = (
+            metrics[f"{name}.messages_per_sec"] / metrics["unsorted.messages_per_sec"]
+        )
+    return metrics
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="benchmark reflect_many sorting the messages by length "
+        "within the windows, against the unsorted batches"
+    )
+    parser.add_argument("--model", default="ja_ginza", help="e.g. ja_ginza_electra")
+    parser.add_argument(
+        "--corpus",
+        help="messages of the real length distribution (.txt, .jsonl or .parquet)",
+    )
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--median-chars", type=float, default=15.0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--windows", type=int, nargs="+", default=[256, 2048])
+    parser.add_argument("--repeat", type=int, default=3)
+    add_result_arguments(parser)
+    args = parser.parse_args(argv)
+
+    reflector = SpacyReflector(
+        spacy.load(args.model), JaSpacyPlainReflectionTextBuilder()
+    )
+    if args.corpus:
+        messages = read_corpus(args.corpus, limit=args.messages)
+    else:
+        messages = synthetic_messages(
+            load_test_texts(), args.messages, median_chars=args.median_chars
+        )
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        metrics = run(reflector, messages, args.batch_size, args.windows, args.repeat)
+
+    results = build_results(
+        "length_bucketing",
+        metrics,
+        model=args.model,
+        corpus=args.corpus or "synthetic",
+        batch_size=args.batch_size,
+        windows=args.windows,
+    )
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
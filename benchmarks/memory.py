@@ -0,0 +1,182 @@
+from typing import Dict, Iterator, List, Optional, Sequence
+from benchmarks.corpus import load_test_texts
+from benchmarks.results import (
+    add_result_arguments,
+    build_results,
+    report,
+)
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.serving.prefork import read_memory_usage
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import tracemalloc
+import warnings
+import spacy
+
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+
+# 未知語を含むメッセージのテンプレート
+NOVEL_TEMPLATES = (
+    "{}さんと会いました",
+    "{}に行きたいです",
+    "{}を食べたことはありますか",
+    "{}って知ってるきに",
+)
+
+
+def synthetic_stream(
+    texts: Sequence[str], novel_fraction: float, seed: int = 0
+) -> Iterator[str]:
+    """
+    yield the texts in random order mixed with messages of unseen words,
+    which add strings to the vocab as the real traffic does.
+    """
+    rng = random.Random(seed)
+    while True:
+        if rng.random() < novel_fraction:
+            word = "".join(rng.choices(KATAKANA, k=rng.randint(3, 8)))
+            yield rng.choice(NOVEL_TEMPLATES).format(word)
+        else:
+            yield rng.choice(texts)
+
+
+def warning_registry_size() -> int:
+    """
+    the number of warnings remembered in `__warningregistry__` of the modules,
+    which keep a key per distinct message under the "default" action.
+    """
+    size = 0
+    for module in list(sys.modules.values()):
+        registry = getattr(module, "__warningregistry__", None)
+        if registry:
+            size += sum(1 for key in registry if key != "version")
+    return size
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _snapshot(nlp: spacy.Language) -> Dict[str, float]:
+    usage = read_memory_usage(os.getpid())
+    return {
+        "rss_bytes": float(usage.rss_bytes if usage is not None else peak_rss_bytes()),
+        "vocab_lexemes": float(len(nlp.vocab)),
+        "strings": float(len(nlp.vocab.strings)),
+        "warning_registry": float(warning_registry_size()),
+    }
+
+
+def _growth_per_1k(checkpoints: List[Dict[str, float]], key: str) -> float:
+    # the first checkpoint is excluded as the warm-up
+    xs = [point["calls"] for point in checkpoints[1:]]
+    ys = [point[key] for point in checkpoints[1:]]
+    if len(xs) < 2:
+        return 0.0
+    return statistics.linear_regression(xs, ys).slope * 1000
+
+
+def run(
+    reflector: SpacyReflector,
+    stream: Iterator[str],
+    calls: int,
+    report_every: int,
+    trace_every: int,
+) -> Dict[str, float]:
+    """
+    reflect the stream measuring the allocations of every `trace_every` call
+    and the memory of the process at every `report_every` call.
+    """
+    peak_bytes: List[int] = []
+    retained_bytes: List[int] = []
+    checkpoints: List[Dict[str, float]] = []
+    for i in range(1, calls + 1):
+        message = next(stream)
+        if i % trace_every == 0:
+            tracemalloc.start()
+            try:
+                before, _ = tracemalloc.get_traced_memory()
+                reflector.reflect(message)
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            peak_bytes.append(peak - before)
+            retained_bytes.append(current - before)
+        else:
+            reflector.reflect(message)
+
+        if i % report_every == 0:
+            checkpoints.append({"calls": float(i), **_snapshot(reflector.nlp)})
+
+    metrics: Dict[str, float] = {}
+    for point in checkpoints:
+        for key, value in point.items():
+            if key != "calls":
+                metrics[f"calls{int(point['calls'])}.{key}"] = value
+    if peak_bytes:
+        metrics["alloc.mean_peak_bytes"] = statistics.fmean(peak_bytes)
+        metrics["alloc.max_peak_bytes"] = float(max(peak_bytes))
+        metrics["alloc.mean_retained_bytes"] = statistics.fmean(retained_bytes)
+    metrics["rss.peak_bytes"] = float(peak_rss_bytes())
+    for key in ["rss_bytes", "vocab_lexemes", "strings", "warning_registry"]:
+        metrics[f"growth.{key}_per_1k_calls"] = _growth_per_1k(checkpoints, key)
+    return metrics
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="benchmark the memory per reflection and its growth over time"
+    )
+    parser.add_argument("--model", default="ja_ginza")
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--report-every", type=int, default=1000)
+    parser.add_argument(
+        "--trace-every",
+        type=int,
+        default=50,
+        help="trace the allocations of 1 in N calls since tracing slows the calls",
+    )
+    parser.add_argument("--novel-fraction", type=float, default=0.3)
+    parser.add_argument(
+        "--warnings",
+        choices=["default", "ignore"],
+        default="default",
+        help="'default' keeps the filters of the process but hides the warnings",
+    )
+    add_result_arguments(parser)
+    args = parser.parse_args(argv)
+
+    reflector = SpacyReflector(
+        spacy.load(args.model), JaSpacyPlainReflectionTextBuilder()
+    )
+    stream = synthetic_stream(load_test_texts(), args.novel_fraction)
+    with warnings.catch_warnings():
+        if args.warnings == "ignore":
+            warnings.simplefilter("ignore")
+        else:
+            warnings.showwarning = lambda *args, **kwargs: None
+        metrics = run(
+            reflector, stream, args.calls, args.report_every, args.trace_every
+        )
+
+    results = build_results(
+        "memory",
+        metrics,
+        model=args.model,
+        calls=args.calls,
+        novel_fraction=args.novel_fraction,
+        warnings=args.warnings,
+    )
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
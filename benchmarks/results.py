@@ -0,0 +1,105 @@
+from typing import Any, Dict, List, Optional
+from dialog_reflection.stage_hook import LatencyHistogram
+import argparse
+import datetime
+import json
+import platform
+import spacy
+
+
+def histogram_metrics(prefix: str, histogram: LatencyHistogram) -> Dict[str, float]:
+    if histogram.count == 0:
+        return {}
+    return {
+        f"{prefix}.count": float(histogram.count),
+        f"{prefix}.mean_ms": histogram.sum_ns / histogram.count / 1e6,
+        f"{prefix}.p50_ms": histogram.percentile(0.5) / 1e6,
+        f"{prefix}.p90_ms": histogram.percentile(0.9) / 1e6,
+        f"{prefix}.p99_ms": histogram.percentile(0.99) / 1e6,
+        f"{prefix}.max_ms": histogram.max_ns / 1e6,
+        f"{prefix}.throughput_per_sec": histogram.count / (histogram.sum_ns / 1e9)
+        if histogram.sum_ns > 0
+        else 0.0,
+    }
+
+
+def build_results(name: str, metrics: Dict[str, float], **context: Any) -> Dict:
+    return {
+        "name": name,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "spacy": spacy.__version__,
+        "context": context,
+        "metrics": metrics,
+    }
+
+
+def write_results(path: str, results: Dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def read_results(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _lower_is_better(metric: str) -> Optional[bool]:
+    # the maximum is too noisy to compare
+    if metric.endswith("max_ms"):
+        return None
+    if metric.endswith("_per_sec"):
+        return False
+    if metric.endswith(("_ms", "_sec", "_bytes")):
+        return True
+    return None
+
+
+def compare_with_baseline(
+    results: Dict, baseline: Dict, tolerance: float = 0.2
+) -> List[str]:
+    """
+    return the metrics which got worse than the baseline over the tolerance (ratio).
+    """
+    regressions = []
+    for metric, value in results["metrics"].items():
+        base = baseline["metrics"].get(metric)
+        lower_is_better = _lower_is_better(metric)
+        if base is None or lower_is_better is None or base == 0:
+            continue
+        ratio = value / base
+        if (lower_is_better and ratio > 1 + tolerance) or (
+            not lower_is_better and ratio < 1 - tolerance
+        ):
+            regressions.append(f"{metric}: {base:.4g} -> {value:.4g} ({ratio:.2f}x)")
+    return regressions
+
+
+def print_metrics(metrics: Dict[str, float]) -> None:
+    width = max(map(len, metrics), default=0)
+    for metric, value in metrics.items():
+        print(f"{metric:<{width}}  {value:12.4f}")
+
+
+def add_result_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--output", help="path to write the results as JSON")
+    parser.add_argument("--baseline", help="path of the results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+
+
+def report(results: Dict, args: argparse.Namespace) -> int:
+    """
+    print and write the results, then return 1 if regressed from the baseline.
+    """
+    print_metrics(results["metrics"])
+    if args.output:
+        write_results(args.output, results)
+    if not args.baseline:
+        return 0
+
+    regressions = compare_with_baseline(
+        results, read_results(args.baseline), args.tolerance
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
@@ -0,0 +1,238 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from collections import Counter, defaultdict
+from benchmarks.results import (
+    add_result_arguments,
+    build_results,
+    report,
+)
+from dialog_reflection.reflection_cancelled import (
+    ReflectionCancelled,
+)
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.reflection_text_builder import (
+    ISpacyReflectionTextBuilder,
+)
+from dialog_reflection.stage_hook import (
+    IStageHook,
+    StageTimings,
+    TOTAL_STAGE,
+)
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+import argparse
+import math
+import statistics
+import sys
+import time
+import warnings
+import spacy
+
+DEFAULT_SIZES = (1, 10, 50, 100, 250, 500)
+
+# build_instead_of_error, timed apart from safe_build
+FALLBACK_STAGE = "fallback"
+
+# 入力の形ごとに、大きさnのメッセージを生成する
+SHAPES: Dict[str, Callable[[int], str]] = {
+    # 最後の文で成功する文の連続
+    "sentences": lambda n: "公園で友達と話しました。" * n,
+    # すべての文に疑問詞があり、全文を走査する
+    "sentences_wh": lambda n: "何を食べましたか。" * n,
+    # 有効な文がなく、全文を走査してから build_instead_of_error に入る
+    "sentences_no_valid": lambda n: "それはそれ。" * n,
+    # 読点でつながる長い一文
+    "long_sentence": lambda n: "雨が降って、" * n + "家に帰りました。",
+    # 連体修飾の入れ子が深い一文
+    "nested_modifiers": lambda n: "友達の" * n + "料理を食べました。",
+}
+
+
+class _TimingsRecorder(IStageHook):
+    def __init__(self) -> None:
+        self.durations_ns: Dict[str, List[int]] = defaultdict(list)
+        self.outcomes: Counter = Counter()
+        # errors other than the cancellations
+        self.errors: Counter = Counter()
+
+    def on_reflection(self, timings: StageTimings) -> None:
+        # e.g. RecursionError of the head walk on deep chains
+        self.outcomes[timings.outcome] += 1
+        if timings.error is not None and not isinstance(
+            timings.error, ReflectionCancelled
+        ):
+            self.errors[timings.outcome] += 1
+        self.durations_ns[TOTAL_STAGE].append(timings.total_ns)
+        for stage, duration_ns in timings.durations_ns.items():
+            self.durations_ns[stage].append(duration_ns)
+
+
+def _time_fallback_ns(
+    builder: ISpacyReflectionTextBuilder, doc: spacy.tokens.Doc
+) -> Optional[int]:
+    try:
+        builder.build(doc)
+        return None
+    except Exception as e:
+        start = time.monotonic_ns()
+        builder.build_instead_of_error(e)
+        return time.monotonic_ns() - start
+
+
+def measure(
+    reflector: SpacyReflector, shape: str, sizes: Sequence[int], repeat: int
+) -> Tuple[Dict[int, Dict[str, float]], List[str]]:
+    """
+    return the median duration (ms) per stage for each size,
+    with the errors other than the cancellations.
+    """
+    medians: Dict[int, Dict[str, float]] = {}
+    errors: List[str] = []
+    for n in sizes:
+        message = SHAPES[shape](n)
+        recorder = _TimingsRecorder()
+        reflector.stage_hooks = [recorder]
+        fallback_ns: List[int] = []
+        for _ in range(repeat):
+            reflector.reflect(message)
+            duration_ns = _time_fallback_ns(reflector.builder, reflector.nlp(message))
+            if duration_ns is not None:
+                fallback_ns.append(duration_ns)
+        if fallback_ns:
+            recorder.durations_ns[FALLBACK_STAGE] = fallback_ns
+
+        medians[n] = {
+            stage: statistics.median(durations) / 1e6
+            for stage, durations in recorder.durations_ns.items()
+        }
+        for outcome, count in recorder.outcomes.items():
+            medians[n][f"outcome.{outcome}"] = count / repeat
+        medians[n]["chars"] = float(len(message))
+        errors.extend(f"n{n}: {error}" for error in recorder.errors)
+    return medians, errors
+
+
+def _is_outcome(stage: str) -> bool:
+    return stage.startswith("outcome.")
+
+
+def growth_exponent(points: List[Tuple[float, float]]) -> Optional[float]:
+    """
+    least squares slope of log(duration) over log(size), i.e. k of O(n ** k).
+    """
+    points = [(x, y) for x, y in points if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    xs = [math.log(x) for x, _ in points]
+    ys = [math.log(y) for _, y in points]
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+
+
+def find_cliffs(
+    medians: Dict[int, Dict[str, float]],
+    max_exponent: float,
+    min_ms: float,
+) -> Tuple[Dict[str, float], List[str]]:
+    """
+    return the growth exponent per stage and the stages growing superlinearly.
+    durations under `min_ms` are excluded since the constant overhead dominates.
+    """
+    stages = sorted({stage for values in medians.values() for stage in values})
+    exponents: Dict[str, float] = {}
+    cliffs: List[str] = []
+    for stage in stages:
+        if stage == "chars" or _is_outcome(stage):
+            continue
+        points = [
+            (float(n), values[stage])
+            for n, values in sorted(medians.items())
+            if values.get(stage, 0.0) >= min_ms
+        ]
+        exponent = growth_exponent(points)
+        if exponent is None:
+            continue
+        exponents[stage] = exponent
+        if exponent > max_exponent:
+            cliffs.append(f"{stage}: O(n ** {exponent:.2f})")
+    return exponents, cliffs
+
+
+def run(
+    model: str,
+    shapes: Sequence[str],
+    sizes: Sequence[int],
+    repeat: int,
+    max_exponent: float,
+    min_ms: float,
+) -> Tuple[Dict[str, float], List[str]]:
+    reflector = SpacyReflector(spacy.load(model), JaSpacyPlainReflectionTextBuilder())
+    metrics: Dict[str, float] = {}
+    failures: List[str] = []
+    with warnings.catch_warnings():
+        # the cancelled reflections are expected
+        warnings.simplefilter("ignore")
+        for shape in shapes:
+            medians, errors = measure(reflector, shape, sizes, repeat)
+            failures.extend(f"ERROR {shape}.{error}" for error in errors)
+            for n, values in medians.items():
+                recorded_values = {"chars", *filter(_is_outcome, values)}
+                for stage, value in values.items():
+                    suffix = "" if stage in recorded_values else "_ms"
+                    metrics[f"{shape}.n{n}.{stage}{suffix}"] = value
+            exponents, _cliffs = find_cliffs(medians, max_exponent, min_ms)
+            for stage, exponent in exponents.items():
+                metrics[f"{shape}.{stage}.exponent"] = exponent
+            failures.extend(f"SUPERLINEAR {shape}.{cliff}" for cliff in _cliffs)
+    return metrics, failures
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="benchmark how the latency of the stages grows with the input"
+    )
+    parser.add_argument("--model", default="ja_ginza")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--max-exponent",
+        type=float,
+        default=1.3,
+        help="fail if a stage grows faster than O(n ** max_exponent)",
+    )
+    parser.add_argument(
+        "--min-ms",
+        type=float,
+        default=0.05,
+        help="ignore the durations shorter than this in the growth",
+    )
+    add_result_arguments(parser)
+    args = parser.parse_args(argv)
+
+    metrics, failures = run(
+        args.model,
+        args.shapes,
+        sorted(args.sizes),
+        args.repeat,
+        args.max_exponent,
+        args.min_ms,
+    )
+    results = build_results(
+        "scaling",
+        metrics,
+        model=args.model,
+        sizes=sorted(args.sizes),
+        repeat=args.repeat,
+    )
+    exit_code = report(results, args)
+    for failure in failures:
+        print(failure)
+    return 1 if failures else exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional, Sequence
+from benchmarks.corpus import load_test_texts
+from benchmarks.results import (
+    add_result_arguments,
+    build_results,
+    histogram_metrics,
+    report,
+)
+from dialog_reflection.stage_hook import (
+    LatencyHistogram,
+    StageTimingAggregator,
+)
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+import argparse
+import sys
+import time
+import warnings
+import spacy
+
+
+def run(model: str, texts: List[str], repeat: int) -> Dict[str, float]:
+    """
+    measure parse and builder separately, in the first pass after loading (cold)
+    and in the following passes (warm).
+    """
+    metrics: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    nlp = spacy.load(model)
+    metrics["load.model_sec"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    builder = JaSpacyPlainReflectionTextBuilder()
+    metrics["load.builder_sec"] = time.perf_counter() - start
+
+    for phase, passes in [("cold", 1), ("warm", repeat)]:
+        parse = LatencyHistogram()
+        aggregator = StageTimingAggregator()
+        builder.stage_hooks = [aggregator]
+        with warnings.catch_warnings():
+            # cancelled reflections are included in the corpus
+            warnings.simplefilter("ignore")
+            for _ in range(passes):
+                for text in texts:
+                    start_ns = time.monotonic_ns()
+                    doc = nlp(text)
+                    parse.add(time.monotonic_ns() - start_ns)
+                    builder.safe_build(doc)
+
+        metrics.update(histogram_metrics(f"{phase}.parse", parse))
+        for stage in aggregator.stages():
+            name = "builder" if stage == "total" else f"builder.{stage}"
+            metrics.update(
+                histogram_metrics(f"{phase}.{name}", aggregator.histogram(stage))
+            )
+    return metrics
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="benchmark parse and builder stages on the inputs of the tests"
+    )
+    parser.add_argument("--model", default="ja_ginza")
+    parser.add_argument("--repeat", type=int, default=5)
+    add_result_arguments(parser)
+    args = parser.parse_args(argv)
+
+    texts = load_test_texts()
+    metrics = run(args.model, texts, args.repeat)
+    results = build_results(
+        "stages", metrics, model=args.model, texts=len(texts), repeat=args.repeat
+    )
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import time
+
+# the time when the import of this package started
+# used to measure the time spent in import for `StartupReport`
+IMPORT_STARTED_AT = time.perf_counter()
@@ -3,7 +3,11 @@ import spacy
 
 
 class ICancelledReason:
-    pass
+    def last_token_tag(self) -> Optional[str]:
+        """
+        tag of the token which caused the cancellation if any.
+        """
+        return None
 
 
 class NoValidSentence(ICancelledReason):
@@ -30,6 +34,9 @@ class NoValidToken(ICancelledReason):
             return self.message
         return f"No Valid Token In Tokens. tokens: {self.tokens}"
 
+    def last_token_tag(self) -> Optional[str]:
+        return self.tokens[-1].tag_ if len(self.tokens) > 0 else None
+
 
 class CancelledByToken(ICancelledReason):
     def __init__(
@@ -49,3 +56,24 @@ class CancelledByToken(ICancelledReason):
         if self.tokens:
             message += f" in {self.tokens}"
         return message
+
+    def last_token_tag(self) -> Optional[str]:
+        return self.token.tag_
+
+
+class DeadlineExceeded(ICancelledReason):
+    def __init__(self, deadline_ms: float, stage: str):
+        self.deadline_ms = deadline_ms
+        self.stage = stage
+
+    def __str__(self):
+        return f"Deadline Exceeded Before Stage: {self.stage} deadline_ms: {self.deadline_ms}"
+
+
+class Overloaded(ICancelledReason):
+    def __init__(self, queue_depth: int, latency_ms: float):
+        self.queue_depth = queue_depth
+        self.latency_ms = latency_ms
+
+    def __str__(self):
+        return f"Overloaded. queue_depth: {self.queue_depth} latency_ms: {self.latency_ms:.1f}"
@@ -0,0 +1,111 @@
+from typing import List, Optional, Tuple
+from spacy.tokens import Doc
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.stage_hook import observe_stages
+import re
+import spacy
+
+
+class IncrementalReflectionSession:
+    """
+    reflect the partial texts of an utterance, e.g. the hypotheses of ASR,
+    parsing only the pieces changed since the last update.
+    the text is split into pieces after the sentence ends and the parsed pieces
+    are joined by `Doc.from_docs`, which may parse differently from the full text
+    since the parser sees no context over the pieces.
+    NOT thread-safe: a session per utterance.
+    """
+
+    # split after the sentence ends
+    piece_end_pattern = re.compile(r"(?<=[。．！？!?\n])")
+
+    def __init__(self, reflector: SpacyReflector) -> None:
+        self.reflector = reflector
+        self.text = ""
+        # the reflection of the latest partial text
+        self.speculative_reflection: Optional[str] = None
+        # the number of the pieces parsed and reused over the updates
+        self.parsed_pieces = 0
+        self.reused_pieces = 0
+        self._pieces: List[Tuple[str, spacy.tokens.Doc]] = []
+        self._doc: Optional[spacy.tokens.Doc] = None
+        self._nlp: Optional[spacy.Language] = None
+
+    def update(self, text: str) -> str:
+        """
+        return the speculative reflection of the partial text.
+        the stage hooks are not called, they are called once by `finish`.
+        **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
+        """
+        if text == self.text and self.speculative_reflection is not None:
+            return self.speculative_reflection
+
+        self.text = text
+        # not to finish with the doc of the previous text if parsing fails
+        self._doc = None
+        builder = self.reflector.builder
+        try:
+            self._doc = self._parse(text)
+            self.speculative_reflection = builder.build(self._doc)
+        except Exception as e:
+            # the cancellations are expected in the partial texts
+            self.speculative_reflection = builder.build_instead_of_error(e)
+        return self.speculative_reflection
+
+    def finish(self, text: Optional[str] = None, exact: bool = True) -> str:
+        """
+        return the reflection at the end of the utterance.
+        `exact` returns the same as `reflector.reflect(text)`, parsing the full text
+        unless the text was parsed at once. otherwise the speculative reflection
+        is returned without parsing.
+        **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
+        """
+        if text is None:
+            text = self.text
+        if not exact:
+            reflection = self.update(text)
+        elif text == self.text and len(self._pieces) <= 1 and self._doc is not None:
+            # the doc equals the parse of the full text
+            reflection = observe_stages(
+                self.reflector.stage_hooks, self.reflector.builder.safe_build, self._doc
+            )
+        else:
+            reflection = self.reflector.reflect(text)
+        self.reset()
+        return reflection
+
+    def reset(self) -> None:
+        self.text = ""
+        self.speculative_reflection = None
+        self._pieces = []
+        self._doc = None
+
+    def _parse(self, text: str) -> spacy.tokens.Doc:
+        nlp = self.reflector.nlp
+        if nlp is not self._nlp:
+            # the docs of the renewed pipeline can not be joined with the old ones
+            self._pieces = []
+            self._nlp = nlp
+
+        pieces = [piece for piece in self.piece_end_pattern.split(text) if piece]
+        reused = 0
+        for (piece_text, _), piece in zip(self._pieces, pieces):
+            if piece_text != piece:
+                break
+            reused += 1
+        parsed = list(nlp.pipe(pieces[reused:]))
+        self._pieces = self._pieces[:reused] + list(zip(pieces[reused:], parsed))
+        self.reused_pieces += reused
+        self.parsed_pieces += len(parsed)
+
+        if not self._pieces:
+            return nlp(text)
+        if len(self._pieces) == 1:
+            return self._pieces[0][1]
+        # the user data of the bunsetu is not used by the builder
+        # `exclude` is accepted at runtime but missing in the type stubs of spaCy
+        return Doc.from_docs(  # type: ignore[call-arg]
+            [doc for _, doc in self._pieces],
+            ensure_whitespace=False,
+            exclude=["user_data"],
+        )
@@ -0,0 +1,131 @@
+from typing import FrozenSet, Optional, Tuple
+from collections import Counter
+from dialog_reflection.reflector import (
+    IReflector,
+    SpacyReflector,
+)
+from dialog_reflection.reflection_cancelled import (
+    ReflectionCancelled,
+)
+from dialog_reflection.cancelled_reason import (
+    NoValidSentence,
+)
+from dialog_reflection.stage_hook import (
+    current_timings,
+    observe_stages,
+    record_error,
+)
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.fast_reflection_text_builder import (
+    JaSpacyFastReflectionTextBuilder,
+    LOW_CONFIDENCE_REASONS,
+)
+import attr
+import threading
+import time
+import spacy
+
+# the fast builder cancelled the reflection, e.g. no valid root or a wh word
+CANCELLED_REASON = "cancelled"
+
+
+@attr.define(frozen=True)
+class AdaptiveReflectionOption:
+    # escalate to the full parse on the reasons of
+    # CANCELLED_REASON and LOW_CONFIDENCE_REASONS
+    escalate_on: FrozenSet[str] = frozenset([CANCELLED_REASON, *LOW_CONFIDENCE_REASONS])
+
+
+class AdaptiveReflector(IReflector):
+    """
+    reflect by the fast builder on the tokenizer of the pipeline first,
+    and escalate to `reflector.reflect` parsing the message
+    when the fast builder reports a low confidence.
+    the escalated reflections are the same as `reflector.reflect`.
+    the stage hooks of the reflector get "tokenize" and the stages of the fast builder
+    with the stages of the full parse if escalated.
+    faster than `reflector.reflect` per message, but not than `reflect_many`
+    parsing the messages in batches.
+    the fast builder shares the option of the reflector's builder if it is
+    `JaSpacyPlainReflectionTextBuilder` unless `fast_builder` is given.
+    """
+
+    def __init__(
+        self,
+        reflector: SpacyReflector,
+        op: AdaptiveReflectionOption = AdaptiveReflectionOption(),
+        fast_builder: Optional[JaSpacyFastReflectionTextBuilder] = None,
+    ) -> None:
+        self.reflector = reflector
+        self.op = op
+        if fast_builder is None:
+            fast_builder = (
+                JaSpacyFastReflectionTextBuilder(reflector.builder.op)
+                if isinstance(reflector.builder, JaSpacyPlainReflectionTextBuilder)
+                else JaSpacyFastReflectionTextBuilder()
+            )
+        self.fast_builder = fast_builder
+        self.fast_count = 0
+        self.escalated_count = 0
+        # reason -> the number of the escalated reflections with the reason
+        self.escalation_reasons: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def escalation_fraction(self) -> float:
+        """
+        the fraction of the reflections escalated to the full parse.
+        """
+        total = self.fast_count + self.escalated_count
+        return self.escalated_count / total if total > 0 else 0.0
+
+    def reflect(self, message: str) -> str:
+        return observe_stages(self.reflector.stage_hooks, self._reflect, message)
+
+    def _reflect(self, message: str) -> str:
+        reflection, reasons = self._reflect_fast(message)
+        with self._lock:
+            if not reasons:
+                self.fast_count += 1
+            else:
+                self.escalated_count += 1
+                self.escalation_reasons.update(reasons)
+        if reflection is not None:
+            return reflection
+        return self.reflector.reflect(message)
+
+    def _reflect_fast(self, message: str) -> Tuple[Optional[str], Tuple[str, ...]]:
+        """
+        the reflection of the fast builder or the reasons to escalate.
+        """
+        doc = self._tokenize(message)
+        builder = self.fast_builder
+        try:
+            if doc.text.strip() == "":
+                raise ReflectionCancelled(reason=NoValidSentence(message="Empty Doc"))
+            tokens = builder.run_stage("extract_tokens", builder.extract_tokens, doc)
+            reasons = tuple(
+                reason
+                for reason in builder.low_confidence_reasons(tokens)
+                if reason in self.op.escalate_on
+            )
+            if reasons:
+                return None, reasons
+            return builder.build_text(tokens), ()
+        except Exception as e:
+            if CANCELLED_REASON in self.op.escalate_on:
+                return None, (CANCELLED_REASON,)
+            record_error(e)
+            return builder.build_instead_of_error(e), ()
+
+    def _tokenize(self, message: str) -> spacy.tokens.Doc:
+        timings = current_timings.get()
+        if timings is None:
+            return self.reflector.nlp.make_doc(message)
+
+        start = time.monotonic_ns()
+        doc = self.reflector.nlp.make_doc(message)
+        timings.add("tokenize", time.monotonic_ns() - start)
+        return doc
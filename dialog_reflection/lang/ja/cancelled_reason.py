@@ -1,3 +1,4 @@
+from typing import Optional
 from dialog_reflection.cancelled_reason import (
     ICancelledReason,
 )
@@ -13,6 +14,9 @@ class WhTokenNotSupported(ICancelledReason):
     def __str__(self):
         return f"5W1H Token Not Supported. doc: {self.doc} wh_token: {self.wh_token}"
 
+    def last_token_tag(self) -> Optional[str]:
+        return self.wh_token.tag_
+
 
 class DialectNotSupported(ICancelledReason):
     def __init__(self, tokens: spacy.tokens.Span, dialect_token: spacy.tokens.Token):
@@ -22,6 +26,9 @@ class DialectNotSupported(ICancelledReason):
     def __str__(self):
         return f"Dialect Token Not Supported. tokens: {self.tokens} token: {self.dialect_token}"
 
+    def last_token_tag(self) -> Optional[str]:
+        return self.dialect_token.tag_
+
 
 class KeigoExclusionFailed(ICancelledReason):
     def __init__(self, e: KatsuyoTextError, tokens: spacy.tokens.Span):
@@ -30,3 +37,6 @@ class KeigoExclusionFailed(ICancelledReason):
 
     def __str__(self):
         return str(self.e)
+
+    def last_token_tag(self) -> Optional[str]:
+        return self.tokens[-1].tag_ if len(self.tokens) > 0 else None
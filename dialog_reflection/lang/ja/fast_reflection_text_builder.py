@@ -0,0 +1,241 @@
+from typing import List, Optional, Tuple
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+    get_conjugation,
+)
+import spacy
+
+# the components of ja_ginza excluded to run only the tokenizer (Sudachi)
+# the tag, lemma, norm and inflection are the same as the full pipeline
+TOKENIZER_ONLY_EXCLUDE = (
+    "tok2vec",
+    "parser",
+    "ner",
+    "morphologizer",
+    "compound_splitter",
+    "bunsetu_recognizer",
+)
+
+SENTENCE_END_TEXTS = {"。", "．", "！", "？", "!", "?"}
+
+# 文節の先頭とならない品詞
+FUNCTION_TAG_PREFIXES = ("助詞", "助動詞", "補助記号", "接尾辞", "空白")
+# 直後で文節が区切られる品詞
+BOUNDARY_TAG_PREFIXES = ("助詞", "助動詞", "補助記号", "副詞", "連体詞", "感動詞", "接続詞")
+PREDICATE_TAG_PREFIXES = ("動詞", "形容詞")
+# the pos of the root by the tag, since the tokenizer tags the verbs
+# "非自立可能" as AUX without the context, e.g. "見" of "見た"
+ROOT_POS_BY_TAG_PREFIX = (
+    ("動詞", "VERB"),
+    ("形容詞", "ADJ"),
+    ("形状詞", "ADJ"),
+    ("名詞-固有名詞", "PROPN"),
+    ("名詞-数詞", "NUM"),
+    ("名詞", "NOUN"),
+    ("代名詞", "PRON"),
+)
+
+# the reasons the span may differ from the span chosen by the parser
+# "skipped_sentence": a sentence follows the span, e.g. a question
+# "predicates": the sentence of the span has several predicates
+# "compound": a bunsetu of the span is a compound, e.g. "東京大学に"
+# "conjunction": the span is joined by a conjunction, e.g. "雨だけど行く"
+LOW_CONFIDENCE_REASONS = ("skipped_sentence", "predicates", "compound", "conjunction")
+
+_Bunsetu = Tuple[int, int]
+
+
+class JaSpacyFastReflectionTextBuilder(JaSpacyPlainReflectionTextBuilder):
+    """
+    the builder for the docs only tokenized, without the dependency parser,
+    e.g. `spacy.load("ja_ginza", exclude=TOKENIZER_ONLY_EXCLUDE)`.
+    the root and the span are chosen from the tail of the sentences
+    by the bunsetu (文節) split by the tags instead of the dependencies,
+    so the reflections may differ from `JaSpacyPlainReflectionTextBuilder`.
+    the pos tags of the tokenizer differ in part from the morphologizer, e.g. "いる".
+    """
+
+    def extract_tokens(self, doc: spacy.tokens.Doc) -> spacy.tokens.Span:
+        _set_sentence_starts(doc)
+        return super().extract_tokens(doc)
+
+    def build_candidates(self, doc: spacy.tokens.Doc, k: int) -> List[str]:
+        _set_sentence_starts(doc)
+        return super().build_candidates(doc, k)
+
+    def low_confidence_reasons(self, tokens: spacy.tokens.Span) -> List[str]:
+        """
+        the reasons in LOW_CONFIDENCE_REASONS found in the span of `extract_tokens`.
+        no reason does not ensure the same reflection as the parser.
+        """
+        doc = tokens.doc
+        sent = tokens.sent
+        bunsetus = _split_bunsetu(sent)
+        heads = [_head_of(doc, start, end) for start, end in bunsetus]
+        spans = [
+            (start, end, head)
+            for (start, end), head in zip(bunsetus, heads)
+            if start >= tokens.start
+        ]
+
+        reasons = []
+        if any(_is_content(token) for token in doc[sent.end :]):
+            reasons.append("skipped_sentence")
+        if sum(1 for head in heads if head is not None and _is_predicate(head)) > 1:
+            reasons.append("predicates")
+        if any(
+            head is not None and any(_is_content(doc[i]) for i in range(start, head.i))
+            for start, _, head in spans
+        ):
+            reasons.append("compound")
+        if any(_ends_with_conjunction(doc, start, end) for start, end, _ in spans[:-1]):
+            reasons.append("conjunction")
+        return reasons
+
+    def _root_of(self, tokens: spacy.tokens.Span) -> spacy.tokens.Token:
+        """
+        the head of the last bunsetu with a content word, e.g. "行き" of "旅行へ行きました".
+        """
+        bunsetus = _split_bunsetu(tokens)
+        for start, end in reversed(bunsetus):
+            head = _head_of(tokens.doc, start, end)
+            if head is not None:
+                return head
+        return tokens[-1]
+
+    def _pos_of(self, token: spacy.tokens.Token) -> str:
+        for prefix, pos in ROOT_POS_BY_TAG_PREFIX:
+            if token.tag_.startswith(prefix):
+                return pos
+        return token.pos_
+
+    def _extract_tokens_with_nearest_heads(
+        self,
+        root: spacy.tokens.Token,
+    ) -> spacy.tokens.Span:
+        """
+        extend the span from the bunsetu of the root to the left
+        while the previous bunsetu would depend on the current head,
+        e.g. "旅行へ行く" of "今日は旅行へ行く", "友達の料理を食べた".
+        """
+        doc = root.doc
+        sent = root.sent
+        bunsetus = _split_bunsetu(sent)
+        b = next(i for i, (start, end) in enumerate(bunsetus) if start <= root.i < end)
+        head = root
+        while True:
+            start, _ = bunsetus[b]
+            # 複合語は文節の先頭から
+            if any(_is_content(doc[i]) for i in range(start, head.i)):
+                break
+            if b == 0:
+                break
+            prev_start, prev_end = bunsetus[b - 1]
+            prev_head = _head_of(doc, prev_start, prev_end)
+            if prev_head is None:
+                break
+            # 述語には直前の文節が係り、名詞には連体修飾のみが係る
+            if not (
+                head is root
+                or _is_predicate(head)  # noqa: W503
+                or _is_adnominal(doc, prev_start, prev_end)  # noqa: W503
+            ):
+                break
+            b -= 1
+            head = prev_head
+
+        return doc[bunsetus[b][0] : sent.end]
+
+
+def _set_sentence_starts(doc: spacy.tokens.Doc) -> None:
+    """
+    split the sentences after the sentence ends if the doc is not parsed.
+    """
+    if doc.has_annotation("SENT_START"):
+        return
+    for i, token in enumerate(doc):
+        token.is_sent_start = i == 0 or doc[i - 1].text in SENTENCE_END_TEXTS
+
+
+def _is_content(token: spacy.tokens.Token) -> bool:
+    return not token.tag_.startswith(FUNCTION_TAG_PREFIXES)
+
+
+def _is_predicate(token: spacy.tokens.Token) -> bool:
+    return token.tag_.startswith(PREDICATE_TAG_PREFIXES)
+
+
+def _starts_bunsetu(prev: spacy.tokens.Token, token: spacy.tokens.Token) -> bool:
+    if not _is_content(token):
+        return False
+    if prev.tag_.startswith(BOUNDARY_TAG_PREFIXES):
+        # e.g. "して|いる" -> "している"
+        if prev.tag_ == "助詞-接続助詞" and token.tag_.endswith("非自立可能"):
+            return False
+        return True
+    # e.g. "読む|本"
+    if prev.tag_.startswith(PREDICATE_TAG_PREFIXES):
+        _, conjugation_form = get_conjugation(prev)
+        return conjugation_form is not None and conjugation_form.startswith(
+            ("連体形", "終止形")
+        )
+    return False
+
+
+def _split_bunsetu(tokens: spacy.tokens.Span) -> List[_Bunsetu]:
+    bunsetus: List[_Bunsetu] = []
+    start = tokens.start
+    for token in tokens[1:]:
+        if _starts_bunsetu(token.doc[token.i - 1], token):
+            bunsetus.append((start, token.i))
+            start = token.i
+    bunsetus.append((start, tokens.end))
+    return bunsetus
+
+
+def _head_of(
+    doc: spacy.tokens.Doc, start: int, end: int
+) -> Optional[spacy.tokens.Token]:
+    """
+    the last noun of the compound or the first predicate,
+    e.g. "大学" of "東京大学に", "勉強" of "勉強した", "食べ" of "食べ始める".
+    """
+    head = None
+    for token in doc[start:end]:
+        if not _is_content(token) or token.tag_.startswith("接頭辞"):
+            continue
+        if _is_predicate(token):
+            if head is None or (
+                not _is_predicate(head) and not token.tag_.endswith("非自立可能")
+            ):
+                head = token
+        elif head is None or not _is_predicate(head):
+            head = token
+    return head
+
+
+def _is_adnominal(doc: spacy.tokens.Doc, start: int, end: int) -> bool:
+    """
+    if the bunsetu modifies a noun, e.g. "友達の", "静かな", "読む", "その".
+    """
+    last = doc[end - 1]
+    if last.tag_ == "助詞-格助詞":
+        return last.norm_ == "の"
+    if last.tag_.startswith("連体詞"):
+        return True
+    if last.tag_.startswith(("動詞", "形容詞", "助動詞")):
+        _, conjugation_form = get_conjugation(last)
+        return conjugation_form is not None and conjugation_form.startswith(
+            ("連体形", "終止形")
+        )
+    return False
+
+
+def _ends_with_conjunction(doc: spacy.tokens.Doc, start: int, end: int) -> bool:
+    """
+    e.g. "雨だけど", "食べて、", "でも".
+    """
+    tokens = [token for token in doc[start:end] if not token.tag_.startswith("補助記号")]
+    if not tokens:
+        return False
+    return tokens[-1].tag_ == "助詞-接続助詞" or tokens[0].tag_.startswith("接続詞")
@@ -1,3 +1,4 @@
+from typing import Dict, Hashable, List, Optional
 from dialog_reflection.reflection_cancelled import (
     ReflectionCancelled,
 )
@@ -33,6 +34,25 @@ import traceback
 import warnings
 import spacy
 
+# the option fields used by `_cut_suffix`
+CUT_SUFFIX_OPTION_FIELDS = (
+    "invalid_jodoushi_types",
+    "valid_jodoushi_types",
+    "dialect_jodoushi_types",
+    "invalid_setsuzokujoshi_norms",
+    "valid_setsuzokujoshi_norms",
+    "dialect_setsuzokujoshi_norms",
+    "invalid_shujoshi_norms",
+    "valid_shujoshi_norms",
+    "dialect_shujoshi_norms",
+    "invalid_fukujoshi_norms",
+    "valid_fukujoshi_norms",
+    "invalid_keijoshi_norms",
+    "valid_keijoshi_norms",
+    "invalid_kakuoshi_norms",
+    "valid_kakuoshi_norms",
+)
+
 
 class JaSpacyPlainReflectionTextBuilder(ISpacyReflectionTextBuilder):
     def __init__(
@@ -48,6 +68,22 @@ class JaSpacyPlainReflectionTextBuilder(ISpacyReflectionTextBuilder):
                 DanteiTeinei(): Dantei(),
             }
         )
+        # オプションの値が等しいbuilder同士でステージの結果を共有する
+        self._stage_keys: Dict[str, Hashable] = {
+            "extract_tokens": (
+                type(self),
+                frozenset(op.allowed_root_pos_tags),
+                frozenset(op.forbidden_wh_norms),
+            ),
+            "cut_suffix": (
+                type(self),
+                *(frozenset(getattr(op, name)) for name in CUT_SUFFIX_OPTION_FIELDS),
+            ),
+            "exclude_keigo": (type(self),),
+        }
+
+    def stage_key(self, stage: str) -> Optional[Hashable]:
+        return self._stage_keys.get(stage)
 
     def extract_tokens(
         self,
@@ -71,16 +107,15 @@ class JaSpacyPlainReflectionTextBuilder(ISpacyReflectionTextBuilder):
         wh_token = None
         for sent in sents:
             # check wh_token
-            _wh_token = next(
-                filter(lambda x: x.norm_ in self.op.forbidden_wh_norms, sent), None
-            )
+            _wh_token = self._find_wh_token(sent)
             if _wh_token:
                 wh_token = _wh_token if wh_token is None else wh_token
                 warnings.warn(f"sent has wh_word: {wh_token} in {sent}", UserWarning)
                 continue
             # check pos_tag
-            if sent.root.pos_ in self.op.allowed_root_pos_tags:
-                return sent.root
+            root = self._root_of(sent)
+            if self._pos_of(root) in self.op.allowed_root_pos_tags:
+                return root
 
         if wh_token:
             raise ReflectionCancelled(WhTokenNotSupported(doc, wh_token))
@@ -93,6 +128,78 @@ class JaSpacyPlainReflectionTextBuilder(ISpacyReflectionTextBuilder):
             )
         )
 
+    def _root_of(self, tokens: spacy.tokens.Span) -> spacy.tokens.Token:
+        return tokens.root
+
+    def _pos_of(self, token: spacy.tokens.Token) -> str:
+        return token.pos_
+
+    def _find_wh_token(
+        self,
+        sent: spacy.tokens.Span,
+    ) -> Optional[spacy.tokens.Token]:
+        return next(filter(lambda x: x.norm_ in self.op.forbidden_wh_norms, sent), None)
+
+    def build_candidates(self, doc: spacy.tokens.Doc, k: int) -> List[str]:
+        """
+        build up to k reflections in a single pass, e.g. for a ranker.
+        the candidates are of the valid sentences from the latest,
+        followed by the spans starting from their roots, e.g. "行くんですね。".
+        the first candidate equals `build` if it does not raise.
+        return `[safe_build(doc)]` if no candidate is valid.
+        k less than 1 is taken as 1 to return a reflection at least.
+        **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
+        """
+        k = max(1, k)
+
+        spans: List[spacy.tokens.Span] = []
+        root_spans: List[spacy.tokens.Span] = []
+        for sent in reversed(list(doc.sents)):
+            if len(spans) >= k:
+                break
+            root = self._root_of(sent)
+            if (
+                self._find_wh_token(sent) is not None
+                or self._pos_of(root) not in self.op.allowed_root_pos_tags  # noqa: W503
+            ):
+                continue
+            try:
+                tokens = self._extract_tokens_with_nearest_heads(root)
+                tokens = self.run_stage("cut_suffix", self._cut_suffix, tokens)
+            except ReflectionCancelled:
+                continue
+            except Exception:
+                type_, value, traceback_ = sys.exc_info()
+                warnings.warn(
+                    "\n".join(traceback.format_exception(type_, value, traceback_)),
+                    UserWarning,
+                )
+                continue
+            spans.append(tokens)
+            # 末尾の切り取り結果を共有する
+            if tokens.start < root.i < tokens.end:
+                root_spans.append(doc[root.i : tokens.end])
+
+        candidates: List[str] = []
+        for tokens in [*spans, *root_spans]:
+            if len(candidates) >= k:
+                break
+            try:
+                text = self.run_stage("finalize", self._finalize, tokens)
+            except ReflectionCancelled:
+                continue
+            except Exception:
+                type_, value, traceback_ = sys.exc_info()
+                warnings.warn(
+                    "\n".join(traceback.format_exception(type_, value, traceback_)),
+                    UserWarning,
+                )
+                continue
+            if text not in candidates:
+                candidates.append(text)
+
+        return candidates if candidates else [self.safe_build(doc)]
+
     def _extract_tokens_with_nearest_heads(
         self,
         root: spacy.tokens.Token,
@@ -128,8 +235,8 @@ class JaSpacyPlainReflectionTextBuilder(ISpacyReflectionTextBuilder):
         self,
         tokens: spacy.tokens.Span,
     ) -> str:
-        _tokens = self._cut_suffix(tokens)
-        return self._finalize(_tokens)
+        _tokens = self.run_stage("cut_suffix", self._cut_suffix, tokens)
+        return self.run_stage("finalize", self._finalize, _tokens)
 
     def _cut_suffix(self, tokens: spacy.tokens.Span) -> spacy.tokens.Span:
         assert len(tokens) > 0
@@ -258,7 +365,7 @@ class JaSpacyPlainReflectionTextBuilder(ISpacyReflectionTextBuilder):
         assert len(tokens) > 0
 
         # 変換処理
-        tokens_text = self._exclude_keigo(tokens)
+        tokens_text = self.run_stage("exclude_keigo", self._exclude_keigo, tokens)
 
         # 末尾処理
         last_token = tokens[-1]
@@ -275,8 +382,9 @@ class JaSpacyPlainReflectionTextBuilder(ISpacyReflectionTextBuilder):
 
         try:
             # root以降の敬語を除外
-            tokens_until_root = tokens.doc[tokens[0].i : tokens.root.i]
-            tokens_from_root = tokens.doc[tokens.root.i : tokens[-1].i + 1]
+            root = self._root_of(tokens)
+            tokens_until_root = tokens.doc[tokens[0].i : root.i]
+            tokens_from_root = tokens.doc[root.i : tokens[-1].i + 1]
             text_excluded_keigo = self._keigo_converter.convert(tokens_from_root)
 
             return tokens_until_root.text + text_excluded_keigo
@@ -1,18 +1,46 @@
+from typing import Iterable, Optional
+from dialog_reflection import IMPORT_STARTED_AT
 from dialog_reflection.reflector import (
     SpacyReflector,
     ISpacyReflectionTextBuilder,
 )
+from dialog_reflection.startup_report import StartupReport
 from dialog_reflection.lang.ja.reflection_text_builder import (
     JaSpacyPlainReflectionTextBuilder,
 )
+from dialog_reflection.lang.ja.warm_up_corpus import WARM_UP_CORPUS
+import time
 import spacy
 
+_IMPORT_SEC = time.perf_counter() - IMPORT_STARTED_AT
+
+# the components of ja_ginza not used by JaSpacyPlainReflectionTextBuilder
+# excluding them does not change the reflections
+PRUNABLE_COMPONENTS = ("ner", "compound_splitter", "bunsetu_recognizer")
+
 
 class JaSpacyReflector(SpacyReflector):
+    warm_up_corpus = WARM_UP_CORPUS
+
     def __init__(
         self,
         model: str,  # need to be installed
-        builder: ISpacyReflectionTextBuilder = JaSpacyPlainReflectionTextBuilder(),
+        builder: Optional[ISpacyReflectionTextBuilder] = None,
+        # e.g. PRUNABLE_COMPONENTS to parse faster
+        exclude: Iterable[str] = (),
     ) -> None:
-        nlp = spacy.load(model)
-        super().__init__(nlp, builder)
+        report = StartupReport(import_sec=_IMPORT_SEC)
+
+        exclude = list(exclude)
+        start = time.perf_counter()
+        nlp = spacy.load(model, exclude=exclude)
+        report.model_load_sec = time.perf_counter() - start
+
+        if builder is None:
+            start = time.perf_counter()
+            builder = JaSpacyPlainReflectionTextBuilder()
+            report.builder_construction_sec = time.perf_counter() - start
+
+        super().__init__(nlp, builder, report)
+        # renew the pipeline without the excluded components
+        self.nlp_factory = lambda: spacy.load(model, exclude=exclude)
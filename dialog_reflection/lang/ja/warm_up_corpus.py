@@ -0,0 +1,50 @@
+# `_cut_suffix` の全分岐を通過するメッセージ
+# キャンセルされるメッセージも含む
+WARM_UP_CORPUS = (
+    # 補助記号-句点, 助動詞(INVALID, VALID)
+    "今日は旅行へ行きました。",
+    # 連体詞, 助詞-終助詞(INVALID), 補助記号-読点, 感動詞-フィラー, 助詞-格助詞
+    "あのね、えーと、昨日は雨だった。",
+    # 助詞-準体助詞, 助詞-終助詞(INVALID)
+    "本を読むのさ",
+    # 感動詞-一般
+    "ほら",
+    # 補助記号-句点(?)
+    "旅行に行った?",
+    # 5W1H
+    "どうでしょう？",
+    # 助動詞(未登録)
+    "あらず",
+    # 助動詞(方言)
+    "知らへん",
+    # 助詞-接続助詞(INVALID)
+    "雨が降ったから",
+    # 助詞-接続助詞(VALID)
+    "音楽を聴きながら",
+    # 助詞-接続助詞(方言)
+    "雨やさかい",
+    # 助詞-終助詞(VALID)
+    "もちろん行くとも",
+    # 助詞-終助詞(未登録)
+    "明日は晴れるかしら",
+    # 助詞-終助詞(方言)
+    "そんなん知らんねん",
+    # 助詞-副助詞(INVALID)
+    "もう帰るって",
+    # 助詞-副助詞
+    "駅まで",
+    # 助詞-係助詞
+    "明日も",
+    # 助詞-格助詞
+    "明日は学校に",
+    # 形状詞-助動詞語幹
+    "見そうだ",
+    # 体言, 敬語
+    "田中さんでした",
+    # 用言, 敬語
+    "楽しかったです",
+    # 命令形
+    "早くしろ",
+    # 空文字
+    "",
+)
@@ -0,0 +1,135 @@
+from typing import Callable, Optional
+from dialog_reflection.reflection_cancelled import (
+    ReflectionCancelled,
+)
+from dialog_reflection.cancelled_reason import (
+    Overloaded,
+)
+from dialog_reflection.reflector import (
+    IReflector,
+    SpacyReflector,
+)
+from dialog_reflection.stage_hook import (
+    observe_stages,
+    record_error,
+)
+import attr
+import threading
+import time
+import warnings
+
+
+def _require_probe_to_watch_latency(instance, attribute, value) -> None:
+    # the latency is measured only by the probes while shedding
+    if value is None and instance.high_latency_ms is not None:
+        raise ValueError(
+            "probe_interval is required with high_latency_ms to recover from shedding"
+        )
+
+
+@attr.define(frozen=True)
+class LoadSheddingOption:
+    # start shedding when the load exceeds the high watermark
+    # and stop when it falls below the low watermark
+    # (high None: not watched, low None: same as high)
+    high_queue_depth: Optional[int] = 32
+    low_queue_depth: Optional[int] = 16
+    high_latency_ms: Optional[float] = None
+    low_latency_ms: Optional[float] = None
+    latency_smoothing: float = 0.1
+    # let 1 in N requests through while shedding to keep measuring the latency
+    # (None: no probe, only with the queue depth watched)
+    probe_interval: Optional[int] = attr.field(
+        default=10, validator=_require_probe_to_watch_latency
+    )
+
+
+class LoadSheddingReflector(IReflector):
+    """
+    answer the fallback text of the builder without parsing under overload.
+    the queue depth is the number of reflections in flight unless `queue_depth` is given,
+    e.g. `queue_depth=lambda: queue.qsize()` to watch the queue of the caller.
+    """
+
+    def __init__(
+        self,
+        reflector: SpacyReflector,
+        op: LoadSheddingOption = LoadSheddingOption(),
+        queue_depth: Optional[Callable[[], int]] = None,
+    ) -> None:
+        self.reflector = reflector
+        self.op = op
+        self.is_shedding = False
+        self.shed_count = 0
+        self.latency_ms = 0.0
+        self.in_flight = 0
+        self._queue_depth = queue_depth
+        self._since_probe = 0
+        self._lock = threading.Lock()
+
+    def reflect(self, message: str) -> str:
+        with self._lock:
+            queue_depth = self._get_queue_depth()
+            self._update_shedding(queue_depth)
+            if self.is_shedding and not self._should_probe():
+                self.shed_count += 1
+                reason = Overloaded(queue_depth=queue_depth, latency_ms=self.latency_ms)
+                shed = True
+            else:
+                self.in_flight += 1
+                shed = False
+
+        if shed:
+            return observe_stages(self.reflector.stage_hooks, self._shed, reason)
+
+        start = time.monotonic_ns()
+        try:
+            return self.reflector.reflect(message)
+        finally:
+            latency_ms = (time.monotonic_ns() - start) / 1_000_000
+            with self._lock:
+                self.in_flight -= 1
+                self.latency_ms += self.op.latency_smoothing * (
+                    latency_ms - self.latency_ms
+                )
+
+    def _shed(self, reason: Overloaded) -> str:
+        e = ReflectionCancelled(reason=reason)
+        record_error(e)
+        return self.reflector.builder.build_instead_of_error(e)
+
+    def _get_queue_depth(self) -> int:
+        if self._queue_depth is None:
+            return self.in_flight
+        try:
+            return self._queue_depth()
+        except Exception as e:
+            # the callback of the caller must not break the reflection
+            warnings.warn(f"queue_depth failed, using in_flight: {e!r}", UserWarning)
+            return self.in_flight
+
+    def _update_shedding(self, queue_depth: int) -> None:
+        loads = [
+            (queue_depth, self.op.high_queue_depth, self.op.low_queue_depth),
+            (self.latency_ms, self.op.high_latency_ms, self.op.low_latency_ms),
+        ]
+        if not self.is_shedding:
+            self.is_shedding = any(
+                high is not None and load > high for load, high, _ in loads
+            )
+            return
+
+        # hysteresis: recover only when every load falls below its low watermark
+        self.is_shedding = any(
+            high is not None and load >= (high if low is None else low)
+            for load, high, low in loads
+        )
+
+    def _should_probe(self) -> bool:
+        if self.op.probe_interval is None:
+            return False
+        self._since_probe += 1
+        if self._since_probe < self.op.probe_interval:
+            return False
+        self._since_probe = 0
+        return True
@@ -0,0 +1,65 @@
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from dialog_reflection.reflection_cancelled import (
+    ReflectionCancelled,
+)
+from dialog_reflection.stage_hook import (
+    IStageHook,
+    StageTimings,
+)
+import threading
+
+METRIC_NAME = "dialog_reflection_reflections_total"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class OutcomeCounter(IStageHook):
+    """
+    count reflections per outcome, i.e. "success" or the name of the cancelled reason,
+    broken down by the tag of the token which caused the cancellation.
+    """
+
+    def __init__(self) -> None:
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def on_reflection(self, timings: StageTimings) -> None:
+        tag = None
+        if isinstance(timings.error, ReflectionCancelled):
+            tag = timings.error.reason.last_token_tag()
+        with self._lock:
+            self._counts[(timings.outcome, tag)] += 1
+
+    def counts(self) -> Dict[Tuple[str, Optional[str]], int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def count(self, outcome: str, tag: Optional[str] = None) -> int:
+        """
+        return the count of the outcome, summed over tags if `tag` is None.
+        """
+        return sum(
+            count
+            for (_outcome, _tag), count in self.counts().items()
+            if _outcome == outcome and tag in (None, _tag)
+        )
+
+    def to_prometheus(self) -> str:
+        """
+        render the counts in Prometheus text exposition format.
+        """
+        lines: List[str] = [
+            f"# HELP {METRIC_NAME} Reflections by outcome and cancelled token tag.",
+            f"# TYPE {METRIC_NAME} counter",
+        ]
+        for (outcome, tag), count in sorted(
+            self.counts().items(), key=lambda item: (item[0][0], item[0][1] or "")
+        ):
+            labels = f'outcome="{_escape_label_value(outcome)}"'
+            if tag is not None:
+                labels += f',tag="{_escape_label_value(tag)}"'
+            lines.append(f"{METRIC_NAME}{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
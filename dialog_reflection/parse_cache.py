@@ -0,0 +1,131 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+from spacy.tokens import DocBin
+from spacy.vocab import Vocab
+import argparse
+import glob
+import json
+import os
+import spacy
+
+META_FILE = "meta.json"
+
+# only the attributes read by the builders,
+# i.e. the default of DocBin without the entity links ENT_KB_ID and ENT_ID
+DOC_ATTRS = (
+    "ORTH",
+    "NORM",
+    "LEMMA",
+    "TAG",
+    "POS",
+    "MORPH",
+    "HEAD",
+    "DEP",
+    "SENT_START",
+    "ENT_IOB",
+    "ENT_TYPE",
+)
+
+
+def _shard_path(cache_dir: str, index: int) -> str:
+    return os.path.join(cache_dir, f"docs-{index:06d}.spacy")
+
+
+def write_parse_cache(
+    nlp: spacy.Language,
+    texts: Iterable[str],
+    cache_dir: str,
+    shard_size: int = 10000,
+    batch_size: int = 256,
+) -> int:
+    """
+    parse the texts once and store the docs as DocBin shards.
+    return the number of the docs.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(cache_dir, "docs-*.spacy")):
+        os.remove(path)
+
+    shards = 0
+    count = 0
+    doc_bin = DocBin(attrs=DOC_ATTRS)
+    for doc in nlp.pipe(texts, batch_size=batch_size):
+        doc_bin.add(doc)
+        count += 1
+        if len(doc_bin) >= shard_size:
+            doc_bin.to_disk(_shard_path(cache_dir, shards))
+            shards += 1
+            doc_bin = DocBin(attrs=DOC_ATTRS)
+    if len(doc_bin) > 0 or shards == 0:
+        doc_bin.to_disk(_shard_path(cache_dir, shards))
+        shards += 1
+
+    meta: Dict[str, Any] = {
+        "model": f"{nlp.meta.get('name')}-{nlp.meta.get('version')}",
+        "pipeline": nlp.pipe_names,
+        "spacy": spacy.__version__,
+        "docs": count,
+        "shards": shards,
+    }
+    with open(os.path.join(cache_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return count
+
+
+class ParseCache:
+    """
+    docs parsed in advance, read without loading the model.
+    """
+
+    def __init__(self, cache_dir: str, vocab: Optional[Vocab] = None) -> None:
+        meta_path = os.path.join(cache_dir, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"no parse cache in {cache_dir}")
+        with open(meta_path, encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.cache_dir = cache_dir
+        # the strings are restored from the shards
+        self.vocab = Vocab() if vocab is None else vocab
+
+    def __len__(self) -> int:
+        return self.meta["docs"]
+
+    @property
+    def shards(self) -> List[str]:
+        return [_shard_path(self.cache_dir, i) for i in range(self.meta["shards"])]
+
+    def read_shard(self, index: int) -> List[spacy.tokens.Doc]:
+        doc_bin = DocBin().from_disk(_shard_path(self.cache_dir, index))
+        return list(doc_bin.get_docs(self.vocab))
+
+    def docs(
+        self, shards: Optional[Sequence[int]] = None
+    ) -> Iterator[spacy.tokens.Doc]:
+        for index in range(self.meta["shards"]) if shards is None else shards:
+            yield from self.read_shard(index)
+
+    def texts(self) -> Iterator[str]:
+        return (doc.text for doc in self.docs())
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="parse the messages once (a message per line) into DocBin shards"
+    )
+    parser.add_argument("input")
+    parser.add_argument("cache_dir")
+    parser.add_argument("--model", default="ja_ginza")
+    parser.add_argument("--shard-size", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    nlp = spacy.load(args.model)
+    with open(args.input, encoding="utf-8") as f:
+        texts = (line.rstrip("\r\n") for line in f)
+        count = write_parse_cache(
+            nlp, texts, args.cache_dir, args.shard_size, args.batch_size
+        )
+    print(f"{count} docs cached in {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+from typing import Any, Callable, Dict, Optional, TypeVar
+import attr
+import cProfile
+import json
+import os
+import queue
+import threading
+import time
+import tracemalloc
+import warnings
+
+T = TypeVar("T")
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+@attr.define(frozen=True)
+class ProfilingOption:
+    dump_dir: str
+    # profile 1 in N calls (None: disabled)
+    every_n: Optional[int] = None
+    # profile calls slower than the threshold (None: disabled)
+    slower_than_ms: Optional[float] = None
+    mode: str = attr.field(
+        default="cprofile", validator=attr.validators.in_(PROFILE_MODES)
+    )
+    # the oldest dumps are removed over the limit
+    max_dumps: int = 100
+    # slow calls waiting to be profiled are dropped over the limit
+    max_pending: int = 16
+
+
+class ProfilingSampler:
+    """
+    profile sampled reflections and dump the profiles with the messages.
+    the slow calls are known only after they finish, so they are profiled again
+    in a background thread since a reflection is deterministic for the message.
+    """
+
+    def __init__(self, op: ProfilingOption) -> None:
+        self.op = op
+        self.dump_count = 0
+        self.dropped_count = 0
+        self._calls = 0
+        self._lock = threading.Lock()
+        self._pending: Optional[queue.Queue] = None
+        os.makedirs(op.dump_dir, exist_ok=True)
+
+    def sample(
+        self,
+        fn: Callable[..., T],
+        message: str,
+        *args: Any,
+        replay: Optional[Callable[[str], Any]] = None,
+        prepare_replay: Optional[Callable[[], Any]] = None,
+    ) -> T:
+        """
+        call `fn(message, *args)`, profiling it if sampled.
+        the slow calls are profiled with `replay(message)` if given,
+        e.g. to avoid reporting the same message twice to the hooks.
+        `prepare_replay()` is called in the background thread before each replay
+        without profiling, e.g. to load the pipeline owned by the thread.
+        """
+        with self._lock:
+            self._calls += 1
+            calls = self._calls
+        if self.op.every_n is not None and calls % self.op.every_n == 0:
+            return self._profile(fn, message, args, trigger="every_n")
+
+        start = time.perf_counter()
+        result = fn(message, *args)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if self.op.slower_than_ms is not None and elapsed_ms > self.op.slower_than_ms:
+            if replay is None:
+                self._enqueue(fn, message, args, elapsed_ms, None)
+            else:
+                self._enqueue(replay, message, (), elapsed_ms, prepare_replay)
+        return result
+
+    def join(self) -> None:
+        """
+        wait until the pending slow calls are profiled.
+        """
+        if self._pending is not None:
+            self._pending.join()
+
+    def _enqueue(
+        self,
+        fn: Callable,
+        message: str,
+        args: tuple,
+        elapsed_ms: float,
+        prepare: Optional[Callable[[], Any]],
+    ):
+        with self._lock:
+            if self._pending is None:
+                self._pending = queue.Queue(maxsize=self.op.max_pending)
+                threading.Thread(
+                    target=self._run_pending, name="ProfilingSampler", daemon=True
+                ).start()
+        try:
+            self._pending.put_nowait((fn, message, args, elapsed_ms, prepare))
+        except queue.Full:
+            self.dropped_count += 1
+
+    def _run_pending(self) -> None:
+        assert self._pending is not None
+        while True:
+            fn, message, args, elapsed_ms, prepare = self._pending.get()
+            try:
+                if prepare is not None:
+                    prepare()
+                self._profile(fn, message, args, trigger="slow", elapsed_ms=elapsed_ms)
+            except Exception as e:
+                # the thread keeps profiling the next calls
+                warnings.warn(f"profiling failed: {e!r}", UserWarning)
+            finally:
+                self._pending.task_done()
+
+    def _profile(
+        self,
+        fn: Callable[..., T],
+        message: str,
+        args: tuple,
+        trigger: str,
+        elapsed_ms: Optional[float] = None,
+    ) -> T:
+        meta: Dict[str, Any] = {
+            "message": message,
+            "trigger": trigger,
+            "mode": self.op.mode,
+            "elapsed_ms": elapsed_ms,
+        }
+        match self.op.mode:
+            case "cprofile":
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError as e:
+                    # e.g. another profiler is already active
+                    warnings.warn(f"profiling skipped: {e}", UserWarning)
+                    return fn(message, *args)
+                start = time.perf_counter()
+                try:
+                    result = fn(message, *args)
+                finally:
+                    profile.disable()
+                meta["profiled_ms"] = (time.perf_counter() - start) * 1000
+                self._dump(meta, ".prof", profile.dump_stats)
+            case "tracemalloc":
+                started = not tracemalloc.is_tracing()
+                if started:
+                    tracemalloc.start()
+                try:
+                    tracemalloc.reset_peak()
+                    start = time.perf_counter()
+                    result = fn(message, *args)
+                    meta["profiled_ms"] = (time.perf_counter() - start) * 1000
+                    meta["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+                    snapshot = tracemalloc.take_snapshot()
+                finally:
+                    if started:
+                        tracemalloc.stop()
+                self._dump(meta, ".tracemalloc", snapshot.dump)
+        return result
+
+    def _dump(self, meta: Dict[str, Any], suffix: str, dump: Callable[[str], Any]):
+        with self._lock:
+            self.dump_count += 1
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.dump_count:06d}-{meta['trigger']}"
+        path = os.path.join(self.op.dump_dir, name)
+        try:
+            dump(path + suffix)
+            with open(path + ".json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+            self._remove_old_dumps()
+        except OSError as e:
+            warnings.warn(f"failed to dump the profile: {e}", UserWarning)
+
+    def _remove_old_dumps(self) -> None:
+        names = sorted(
+            name for name in os.listdir(self.op.dump_dir) if name.endswith(".json")
+        )
+        for name in names[: max(0, len(names) - self.op.max_dumps)]:
+            stem = os.path.join(self.op.dump_dir, name[: -len(".json")])
+            for suffix in (".json", ".prof", ".tracemalloc"):
+                if os.path.exists(stem + suffix):
+                    os.remove(stem + suffix)
@@ -0,0 +1,57 @@
+from typing import Optional
+from contextvars import ContextVar
+from dialog_reflection.reflection_cancelled import (
+    ReflectionCancelled,
+)
+from dialog_reflection.cancelled_reason import (
+    DeadlineExceeded,
+)
+import attr
+import math
+import time
+
+
+@attr.define
+class Deadline:
+    deadline_ms: float
+    expires_at_ns: int
+    # turns True when the deadline is detected to be exceeded
+    missed: bool = False
+
+    @classmethod
+    def after(cls, deadline_ms: float) -> "Deadline":
+        """
+        the deadline expires immediately if `deadline_ms` is NaN or negative.
+        `deadline_ms` must not be +inf, which is no deadline.
+        """
+        now_ns = time.monotonic_ns()
+        if math.isnan(deadline_ms) or deadline_ms < 0:
+            return cls(deadline_ms=deadline_ms, expires_at_ns=now_ns)
+        return cls(
+            deadline_ms=deadline_ms,
+            expires_at_ns=now_ns + int(deadline_ms * 1_000_000),
+        )
+
+    def remaining_ms(self) -> float:
+        return (self.expires_at_ns - time.monotonic_ns()) / 1_000_000
+
+    def check(self, stage: str) -> None:
+        """
+        raise `ReflectionCancelled` if the deadline has been exceeded before the stage.
+        """
+        if time.monotonic_ns() < self.expires_at_ns:
+            return
+        raise self.miss(stage)
+
+    def miss(self, stage: str) -> ReflectionCancelled:
+        self.missed = True
+        return ReflectionCancelled(
+            reason=DeadlineExceeded(deadline_ms=self.deadline_ms, stage=stage)
+        )
+
+
+# the deadline of the reflection running in the current context
+# checked between the stages of the builder
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar(
+    "current_deadline", default=None
+)
@@ -1,26 +1,73 @@
-from typing import Any
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+from contextvars import ContextVar
 from dialog_reflection.reflection_cancelled import (
     ReflectionCancelled,
 )
 from dialog_reflection.cancelled_reason import (
     NoValidSentence,
 )
+from dialog_reflection.reflection_deadline import (
+    current_deadline,
+)
+from dialog_reflection.stage_hook import (
+    IStageHook,
+    current_timings,
+    observe_stages,
+    record_error,
+)
 import abc
 import sys
+import time
 import traceback
 import warnings
 import spacy
 
+T = TypeVar("T")
+
+# results of the stages shared between the builders over the same doc
+# None when the stages are not shared
+current_stage_memo: ContextVar[Optional[Dict[Hashable, Tuple[bool, Any]]]] = ContextVar(
+    "current_stage_memo", default=None
+)
+
 
 class IReflectionTextBuilder(abc.ABC):
+    stage_hooks: Sequence[IStageHook] = ()
+
+    def add_stage_hook(self, hook: IStageHook) -> None:
+        # replace the sequence not to affect the reflections running in other threads
+        self.stage_hooks = [*self.stage_hooks, hook]
+
     def safe_build(self, doc: Any) -> str:
         """
         check if the doc is valid for reflection and build reflection message.
         **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
         """
+        return observe_stages(self.stage_hooks, self._safe_build, doc)
+
+    def build_many(self, docs: Iterable[Any]) -> List[str]:
+        """
+        `safe_build` the docs, e.g. read from `ParseCache` without the model.
+        **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
+        """
+        return [self.safe_build(doc) for doc in docs]
+
+    def _safe_build(self, doc: Any) -> str:
         try:
             return self.build(doc)
         except BaseException as e:
+            record_error(e)
             type_, value, traceback_ = sys.exc_info()
             warnings.warn(
                 "\n".join(traceback.format_exception(type_, value, traceback_)),
@@ -52,9 +99,53 @@ class ISpacyReflectionTextBuilder(IReflectionTextBuilder):
     def build(self, doc: spacy.tokens.Doc) -> str:
         if doc.text.strip() == "":
             raise ReflectionCancelled(reason=NoValidSentence(message="Empty Doc"))
-        tokens = self.extract_tokens(doc)
+        tokens = self.run_stage("extract_tokens", self.extract_tokens, doc)
         return self.build_text(tokens)
 
+    def run_stage(self, stage: str, fn: Callable[..., T], *args: Any) -> T:
+        """
+        run a stage of `build` checking the deadline of the current reflection.
+        the duration is timed only when a stage hook is installed.
+        """
+        deadline = current_deadline.get()
+        if deadline is not None:
+            deadline.check(stage)
+
+        memo = current_stage_memo.get()
+        stage_key = None if memo is None else self.stage_key(stage)
+        if memo is None or stage_key is None:
+            return self._run_timed(stage, fn, *args)
+
+        key = (stage, stage_key, args)
+        if key not in memo:
+            try:
+                memo[key] = (False, self._run_timed(stage, fn, *args))
+            except Exception as e:
+                # the cancellations are shared as well
+                memo[key] = (True, e)
+        raised, value = memo[key]
+        if raised:
+            raise value
+        return value
+
+    def _run_timed(self, stage: str, fn: Callable[..., T], *args: Any) -> T:
+        timings = current_timings.get()
+        if timings is None:
+            return fn(*args)
+
+        start = time.monotonic_ns()
+        try:
+            return fn(*args)
+        finally:
+            timings.add(stage, time.monotonic_ns() - start)
+
+    def stage_key(self, stage: str) -> Optional[Hashable]:
+        """
+        the builders with the same key share the result of the stage
+        in `safe_build_variants`. None if the stage is not shared.
+        """
+        return None
+
     @abc.abstractmethod
     def extract_tokens(self, doc: spacy.tokens.Doc) -> spacy.tokens.Span:
         raise NotImplementedError()
@@ -66,3 +157,18 @@ class ISpacyReflectionTextBuilder(IReflectionTextBuilder):
     @abc.abstractmethod
     def build_instead_of_error(self, e: BaseException) -> str:
         raise NotImplementedError()
+
+
+def safe_build_variants(
+    builders: Sequence[ISpacyReflectionTextBuilder], doc: spacy.tokens.Doc
+) -> List[str]:
+    """
+    `safe_build` the doc with each builder,
+    sharing the stages between the builders with the same `stage_key`.
+    **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
+    """
+    token = current_stage_memo.set({})
+    try:
+        return [builder.safe_build(doc) for builder in builders]
+    finally:
+        current_stage_memo.reset(token)
@@ -1,7 +1,29 @@
+from typing import Callable, Iterable, List, Optional, Sequence
+from dialog_reflection import IMPORT_STARTED_AT
+from dialog_reflection.reflection_text_builder import (
+    ISpacyReflectionTextBuilder,
+    safe_build_variants,
+)
+from dialog_reflection.reflection_deadline import Deadline, current_deadline
+from dialog_reflection.startup_report import StartupReport
+from dialog_reflection.profiling_sampler import ProfilingSampler
+from dialog_reflection.vocab_growth_policy import VocabGrowthPolicy, VocabSize
+from dialog_reflection.stage_hook import (
+    IStageHook,
+    current_timings,
+    observe_stages,
+    record_error,
+)
 import abc
+import math
+import sys
+import threading
+import time
+import traceback
+import warnings
 import spacy
 
-from dialog_reflection.reflection_text_builder import ISpacyReflectionTextBuilder
+_IMPORT_SEC = time.perf_counter() - IMPORT_STARTED_AT
 
 
 class IReflector(abc.ABC):
@@ -15,12 +37,306 @@ class IReflector(abc.ABC):
 
 
 class SpacyReflector(IReflector):
+    # messages used by `warm_up` when no corpus is given
+    warm_up_corpus: Sequence[str] = ()
+    # the parsing time is estimated in proportion to the length of the message
+    # short messages are excluded because the overhead of the pipeline dominates
+    parse_cost_min_chars: int = 64
+    parse_cost_smoothing: float = 0.1
+    stage_hooks: Sequence[IStageHook] = ()
+    # profile sampled calls of `reflect` (None: disabled)
+    profiling_sampler: Optional[ProfilingSampler] = None
+    # swap in a freshly loaded pipeline when the vocab grows (None: disabled)
+    vocab_growth_policy: Optional[VocabGrowthPolicy] = None
+    # load the fresh pipeline, `spacy.load(nlp.path)` if None
+    nlp_factory: Optional[Callable[[], spacy.Language]] = None
+
     def __init__(
-        self, nlp: spacy.Language, builder: ISpacyReflectionTextBuilder
+        self,
+        nlp: spacy.Language,
+        builder: ISpacyReflectionTextBuilder,
+        startup_report: Optional[StartupReport] = None,
     ) -> None:
         self.nlp = nlp
         self.builder = builder
+        self.startup_report = (
+            StartupReport(import_sec=_IMPORT_SEC)
+            if startup_report is None
+            else startup_report
+        )
+        # turns True after `warm_up`
+        self.is_ready = False
+        # the number of reflections replaced by the fallback text due to the deadline
+        self.deadline_missed_count = 0
+        self._deadline_lock = threading.Lock()
+        self._parse_ns_per_char: Optional[float] = None
+        # the number of the pipelines swapped in by `vocab_growth_policy`
+        self.nlp_renewed_count = 0
+        self._vocab_baseline = VocabSize.of(nlp)
+        self._calls_since_vocab_check = 0
+        self._renewing_nlp = False
+        self._vocab_lock = threading.Lock()
+        # the pipeline replaying the slow calls in the thread of `profiling_sampler`
+        self._replay_nlp: Optional[spacy.Language] = None
 
-    def reflect(self, message: str) -> str:
+    def add_stage_hook(self, hook: IStageHook) -> None:
+        """
+        the hook gets the durations of "nlp" and the stages of the builder.
+        """
+        # replace the sequence not to affect the reflections running in other threads
+        self.stage_hooks = [*self.stage_hooks, hook]
+
+    def reflect(
+        self,
+        message: str,
+        deadline_ms: Optional[float] = None,
+        builder: Optional[ISpacyReflectionTextBuilder] = None,
+    ) -> str:
+        """
+        return the fallback text of the builder
+        if the reflection would not finish within `deadline_ms`.
+        `deadline_ms` of None or inf is no deadline, and NaN or negative expires at once.
+        `builder` replaces `self.builder`, e.g. the builder of a tenant.
+        """
+        if builder is None:
+            builder = self.builder
+        if self.profiling_sampler is not None:
+            reflection = self.profiling_sampler.sample(
+                self._observed_reflect,
+                message,
+                deadline_ms,
+                builder,
+                # profile the slow call again without the hooks and the deadline
+                replay=lambda message: self._replay(message, builder),
+                prepare_replay=self._prepare_replay,
+            )
+        else:
+            reflection = self._observed_reflect(message, deadline_ms, builder)
+        self._watch_vocab(1)
+        return reflection
+
+    def _prepare_replay(self) -> None:
+        # the tokenizer can not be shared with the threads reflecting the messages
+        if self._replay_nlp is None:
+            self._replay_nlp = self.load_fresh_nlp()
+
+    def _replay(self, message: str, builder: ISpacyReflectionTextBuilder) -> str:
+        assert self._replay_nlp is not None
+        return builder.safe_build(self._replay_nlp(message))
+
+    def _observed_reflect(
+        self,
+        message: str,
+        deadline_ms: Optional[float],
+        builder: ISpacyReflectionTextBuilder,
+    ) -> str:
+        return observe_stages(
+            self.stage_hooks, self._reflect, message, deadline_ms, builder
+        )
+
+    def _reflect(
+        self,
+        message: str,
+        deadline_ms: Optional[float],
+        builder: ISpacyReflectionTextBuilder,
+    ) -> str:
+        if deadline_ms is None or deadline_ms == math.inf:
+            doc = self._parse(message)
+            return builder.safe_build(doc)
+
+        deadline = Deadline.after(deadline_ms)
+        if self._estimate_parse_ms(message) > deadline.remaining_ms():
+            # skip parsing which would exceed the deadline
+            self._count_deadline_missed()
+            e = deadline.miss("nlp")
+            record_error(e)
+            return builder.build_instead_of_error(e)
+
+        doc = self._parse(message)
+        token = current_deadline.set(deadline)
+        try:
+            reflection = builder.safe_build(doc)
+        finally:
+            current_deadline.reset(token)
+        if deadline.missed:
+            self._count_deadline_missed()
+        return reflection
+
+    def _count_deadline_missed(self) -> None:
+        with self._deadline_lock:
+            self.deadline_missed_count += 1
+
+    def reflect_many(
+        self,
+        messages: Iterable[str],
+        batch_size: Optional[int] = None,
+        builders: Optional[Sequence[ISpacyReflectionTextBuilder]] = None,
+        sort_window: Optional[int] = None,
+    ) -> List[str]:
+        """
+        reflect the messages in batches of `nlp.pipe`.
+        `builders` are the builders per message, e.g. of the mixed tenants.
+        `sort_window` sorts the messages by length within the windows of the size
+        to batch the messages of similar lengths, e.g. for the transformer models
+        padding the batch. the reflections are in the order of the messages.
+        **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
+        """
+        messages = list(messages)
+        if builders is None:
+            builders = [self.builder] * len(messages)
+        elif len(builders) != len(messages):
+            raise ValueError(
+                f"builders must be per message: {len(builders)} builders "
+                f"for {len(messages)} messages"
+            )
+        order = (
+            range(len(messages))
+            if sort_window is None
+            else order_by_length(messages, sort_window)
+        )
+
+        reflections = [""] * len(messages)
+        docs = self.nlp.pipe((messages[i] for i in order), batch_size=batch_size)
+        for i, doc in zip(order, docs):
+            # "nlp" is not timed since it runs in batches
+            reflections[i] = observe_stages(
+                self.stage_hooks, builders[i].safe_build, doc
+            )
+        self._watch_vocab(len(reflections))
+        return reflections
+
+    def reflect_variants(
+        self, message: str, builders: Sequence[ISpacyReflectionTextBuilder]
+    ) -> List[str]:
+        """
+        parse the message once and reflect it with each builder, e.g. per tone.
+        the stages are shared between the builders with the same `stage_key`.
+        **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
+        """
+        doc = self._parse(message)
+        reflections = safe_build_variants(builders, doc)
+        self._watch_vocab(1)
+        return reflections
+
+    def _parse(self, message: str) -> spacy.tokens.Doc:
+        timings = current_timings.get()
+        if timings is None and len(message) < self.parse_cost_min_chars:
+            return self.nlp(message)
+
+        start = time.monotonic_ns()
         doc = self.nlp(message)
-        return self.builder.safe_build(doc)
+        duration_ns = time.monotonic_ns() - start
+        if timings is not None:
+            timings.add("nlp", duration_ns)
+        if len(message) < self.parse_cost_min_chars:
+            return doc
+
+        ns_per_char = duration_ns / len(message)
+        self._parse_ns_per_char = (
+            ns_per_char
+            if self._parse_ns_per_char is None
+            else (1 - self.parse_cost_smoothing) * self._parse_ns_per_char
+            + self.parse_cost_smoothing * ns_per_char  # noqa: W503
+        )
+        return doc
+
+    def _estimate_parse_ms(self, message: str) -> float:
+        if self._parse_ns_per_char is None or len(message) < self.parse_cost_min_chars:
+            return 0.0
+        return len(message) * self._parse_ns_per_char / 1_000_000
+
+    def _watch_vocab(self, calls: int) -> None:
+        policy = self.vocab_growth_policy
+        if policy is None:
+            return
+        with self._vocab_lock:
+            self._calls_since_vocab_check += calls
+            if self._calls_since_vocab_check < policy.check_every:
+                return
+            self._calls_since_vocab_check = 0
+            if self._renewing_nlp or not policy.exceeded(
+                VocabSize.of(self.nlp), self._vocab_baseline
+            ):
+                return
+            self._renewing_nlp = True
+
+        if policy.background:
+            threading.Thread(
+                target=self.renew_nlp, name="SpacyReflector.renew_nlp", daemon=True
+            ).start()
+        else:
+            self.renew_nlp()
+
+    def renew_nlp(self) -> None:
+        """
+        load and warm up a fresh pipeline, then swap it in.
+        the reflections running on the old pipeline finish with it,
+        and the results do not change since the model is the same.
+        **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
+        """
+        try:
+            nlp = self.load_fresh_nlp()
+            # 初回呼び出しのコストを入れ替え前に払う
+            for _ in nlp.pipe(self.warm_up_corpus):
+                pass
+            baseline = VocabSize.of(nlp)
+            with self._vocab_lock:
+                self.nlp = nlp
+                self._vocab_baseline = baseline
+                self.nlp_renewed_count += 1
+        except Exception:
+            type_, value, traceback_ = sys.exc_info()
+            warnings.warn(
+                "\n".join(traceback.format_exception(type_, value, traceback_)),
+                UserWarning,
+            )
+        finally:
+            with self._vocab_lock:
+                self._renewing_nlp = False
+
+    def load_fresh_nlp(self) -> spacy.Language:
+        """
+        load another pipeline of the same model, e.g. for another thread
+        since the tokenizer can not be shared between threads.
+        """
+        if self.nlp_factory is not None:
+            return self.nlp_factory()
+        if self.nlp.path is None:
+            raise ValueError(
+                "the pipeline is not loaded from a path, set `nlp_factory` to load it"
+            )
+        return spacy.load(self.nlp.path)
+
+    def warm_up(self, corpus: Optional[Iterable[str]] = None) -> StartupReport:
+        """
+        reflect representative messages to pay the cost of the first calls in advance,
+        e.g. lazy initialization, memory allocation and page faults of the dictionary.
+        """
+        if corpus is None:
+            corpus = self.warm_up_corpus
+
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            # cancelled reflections are expected in the corpus
+            warnings.simplefilter("ignore")
+            for message in corpus:
+                self.reflect(message)
+        self.startup_report.warm_up_sec = time.perf_counter() - start
+
+        self.is_ready = True
+        return self.startup_report
+
+
+def order_by_length(messages: Sequence[str], window: int) -> List[int]:
+    """
+    the indices of the messages sorted by length within each window.
+    """
+    if window <= 0:
+        raise ValueError(f"window must be positive: {window}")
+    order: List[int] = []
+    for start in range(0, len(messages), window):
+        order += sorted(
+            range(start, min(start + window, len(messages))),
+            key=lambda i: len(messages[i]),
+        )
+    return order
@@ -0,0 +1,178 @@
+from typing import Dict, List, Optional, Set
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dialog_reflection.reflector import SpacyReflector
+import asyncio
+import attr
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@attr.define(frozen=True)
+class BurstCoalescingOption:
+    # reflect the burst when no message came for the period
+    quiet_period_sec: float = 0.8
+    # reflect the burst even if the messages keep coming (None: not limited)
+    max_wait_sec: Optional[float] = 3.0
+    max_messages: int = 8
+    # joins the messages not ending with the punctuations
+    # e.g. "今日さ" / "会社で" / "怒られた" -> "今日さ、会社で、怒られた"
+    separator: str = "、"
+    punctuations: str = "。、．，！？!?,.…"
+
+
+@attr.define
+class BurstCoalescingMetrics:
+    messages_total: int = 0
+    # the messages answered None since a later message of the session came
+    coalesced_total: int = 0
+    reflections_total: int = 0
+    # the reflections discarded since a message came while reflecting
+    superseded_total: int = 0
+
+
+@attr.define(eq=False)
+class _Burst:
+    messages: List[str] = attr.Factory(list)
+    futures: List[asyncio.Future] = attr.Factory(list)
+    started_at: float = 0.0
+    timer: Optional[asyncio.TimerHandle] = None
+    task: Optional[asyncio.Task] = None
+
+
+class BurstCoalescer:
+    """
+    coalesce the messages sent in a burst per session, e.g. a chat user,
+    and reflect the joined text once.
+    the reflection is answered to the last message and None to the others.
+    a message coming while reflecting the burst supersedes the reflection,
+    and the burst is reflected again with the message.
+    once the burst reaches `max_messages` or `max_wait_sec`, it is reflected
+    as it is and the later messages start the next burst.
+    """
+
+    def __init__(
+        self,
+        reflector: SpacyReflector,
+        op: BurstCoalescingOption = BurstCoalescingOption(),
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.reflector = reflector
+        self.op = op
+        self.metrics = BurstCoalescingMetrics()
+        self._bursts: Dict[str, _Burst] = {}
+        # the full bursts reflected apart from the next bursts of the sessions
+        self._full_bursts: Set[_Burst] = set()
+        # the reflector runs in a single thread apart from the event loop
+        self._executor = (
+            ThreadPoolExecutor(max_workers=1) if executor is None else executor
+        )
+        self._owns_executor = executor is None
+
+    async def reflect(self, session: str, message: str) -> Optional[str]:
+        """
+        return the reflection of the burst, or None if a later message of
+        the session is answered instead.
+        """
+        loop = asyncio.get_running_loop()
+        burst = self._bursts.get(session)
+        if burst is not None and self._is_full(burst, loop.time()):
+            # not superseded to answer within the limits even if the messages keep coming
+            del self._bursts[session]
+            self._full_bursts.add(burst)
+            burst = None
+        if burst is None:
+            burst = self._bursts[session] = _Burst(started_at=loop.time())
+        if burst.task is not None:
+            burst.task.cancel()
+            burst.task = None
+            self.metrics.superseded_total += 1
+
+        future = loop.create_future()
+        burst.messages.append(message)
+        burst.futures.append(future)
+        self.metrics.messages_total += 1
+        self._schedule(session, burst)
+        return await future
+
+    def join(self, messages: List[str]) -> str:
+        texts = [
+            message
+            if i == len(messages) - 1 or message.endswith(tuple(self.op.punctuations))
+            else message + self.op.separator
+            for i, message in enumerate(messages)
+        ]
+        return "".join(texts)
+
+    async def close(self) -> None:
+        for burst in [*self._bursts.values(), *self._full_bursts]:
+            if burst.timer is not None:
+                burst.timer.cancel()
+            if burst.task is not None:
+                burst.task.cancel()
+            for future in burst.futures:
+                if not future.done():
+                    future.cancel()
+        self._bursts = {}
+        self._full_bursts = set()
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    def _is_full(self, burst: _Burst, now: float) -> bool:
+        if len(burst.messages) >= self.op.max_messages:
+            return True
+        return (
+            self.op.max_wait_sec is not None
+            and now - burst.started_at >= self.op.max_wait_sec  # noqa: W503
+        )
+
+    def _forget(self, session: str, burst: _Burst) -> None:
+        if self._bursts.get(session) is burst:
+            del self._bursts[session]
+        self._full_bursts.discard(burst)
+
+    def _schedule(self, session: str, burst: _Burst) -> None:
+        loop = asyncio.get_running_loop()
+        if burst.timer is not None:
+            burst.timer.cancel()
+
+        delay = self.op.quiet_period_sec
+        if self.op.max_wait_sec is not None:
+            delay = min(delay, burst.started_at + self.op.max_wait_sec - loop.time())
+        if len(burst.messages) >= self.op.max_messages:
+            delay = 0.0
+        burst.timer = loop.call_later(max(0.0, delay), self._flush, session, burst)
+
+    def _flush(self, session: str, burst: _Burst) -> None:
+        burst.timer = None
+        burst.task = asyncio.get_running_loop().create_task(
+            self._reflect_burst(session, burst)
+        )
+
+    async def _reflect_burst(self, session: str, burst: _Burst) -> None:
+        loop = asyncio.get_running_loop()
+        text = self.join(burst.messages)
+        try:
+            reflection = await loop.run_in_executor(
+                self._executor, self.reflector.reflect, text
+            )
+        except asyncio.CancelledError:
+            # superseded by a later message, the burst goes on
+            return
+        except Exception as e:
+            logger.exception("failed to reflect a burst")
+            self._forget(session, burst)
+            for future in burst.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._forget(session, burst)
+        self.metrics.reflections_total += 1
+        self.metrics.coalesced_total += len(burst.futures) - 1
+        *earlier, last = burst.futures
+        for future in earlier:
+            if not future.done():
+                future.set_result(None)
+        if not last.done():
+            last.set_result(reflection)
@@ -0,0 +1,317 @@
+from typing import Dict, IO, List, Optional, Sequence, Tuple
+from dialog_reflection.reflector import SpacyReflector
+import argparse
+import attr
+import gc
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@attr.define(frozen=True)
+class PreforkOption:
+    num_workers: int = os.cpu_count() or 1
+    # restart the worker when the threshold is crossed (None: unlimited)
+    max_requests_per_worker: Optional[int] = None
+    # the memory not shared with the parent, i.e. excluding the pipeline
+    # shared by copy-on-write which every worker maps
+    max_private_bytes_per_worker: Optional[int] = None
+    # read the memory every N requests since smaps_rollup walks the mappings
+    memory_check_every: int = attr.field(default=100, validator=attr.validators.gt(0))
+    # keep answering the connection for the period after the threshold is crossed
+    # so that the requests in flight are not dropped
+    recycle_grace_sec: float = 5.0
+    check_interval_sec: float = 0.5
+    report_interval_sec: float = 60.0
+    backlog: int = 128
+
+
+@attr.define(frozen=True)
+class MemoryUsage:
+    rss_bytes: int
+    # pages mapped by other processes too, e.g. copy-on-write pages not yet copied
+    shared_bytes: int
+    # pages mapped only by the process
+    private_bytes: int = 0
+
+    @property
+    def shared_fraction(self) -> float:
+        if self.rss_bytes == 0:
+            return 0.0
+        return self.shared_bytes / self.rss_bytes
+
+    def __str__(self):
+        return (
+            f"rss: {self.rss_bytes / 2**20:.1f} MiB "
+            f"private: {self.private_bytes / 2**20:.1f} MiB "
+            f"shared: {self.shared_fraction:.1%}"
+        )
+
+
+def read_memory_usage(pid: int) -> Optional[MemoryUsage]:
+    """
+    read the memory usage of the process from /proc (Linux only).
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    fields: Dict[str, int] = {}
+    for line in lines:
+        key, _, value = line.partition(":")
+        values = value.split()
+        if len(values) == 2 and values[1] == "kB":
+            fields[key] = int(values[0]) * 1024
+
+    return MemoryUsage(
+        rss_bytes=fields.get("Rss", 0),
+        shared_bytes=fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        private_bytes=fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    )
+
+
+def _handle_line(reflector: SpacyReflector, line: bytes) -> bytes:
+    """
+    reflect a JSON line `{"message": "..."}` into `{"reflection": "..."}`.
+    """
+    try:
+        message = json.loads(line)["message"]
+        if not isinstance(message, str):
+            raise TypeError(f"message must be str, not {type(message).__name__}")
+        response = {"reflection": reflector.reflect(message)}
+    except (ValueError, KeyError, TypeError) as e:
+        response = {"error": f"{type(e).__name__}: {e}"}
+    return json.dumps(response, ensure_ascii=False).encode() + b"\n"
+
+
+def serve_lines(reflector: SpacyReflector, rfile: IO[bytes], wfile: IO[bytes]) -> int:
+    """
+    serve JSON lines until EOF in the current process.
+    return the number of handled requests.
+    """
+    handled = 0
+    for line in rfile:
+        if not line.strip():
+            continue
+        wfile.write(_handle_line(reflector, line))
+        wfile.flush()
+        handled += 1
+    return handled
+
+
+class PreforkSupervisor:
+    """
+    fork workers after loading the pipeline in the parent process
+    so that the workers share the memory of the pipeline by copy-on-write.
+    """
+
+    def __init__(
+        self,
+        reflector: SpacyReflector,
+        op: PreforkOption = PreforkOption(),
+    ) -> None:
+        self.reflector = reflector
+        self.op = op
+        self.worker_pids: List[int] = []
+        self.restart_count = 0
+        self._running = False
+
+    def serve_unix_socket(self, path: str) -> None:
+        if os.path.exists(path):
+            os.unlink(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(self.op.backlog)
+
+        # keep the objects loaded so far out of gc
+        # otherwise gc touches their headers and copies the shared pages
+        gc.collect()
+        gc.freeze()
+
+        try:
+            for _ in range(self.op.num_workers):
+                self._spawn_worker(listener)
+            self._supervise(listener)
+        finally:
+            self._stop_workers()
+            listener.close()
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def memory_report(self) -> Dict[int, Optional[MemoryUsage]]:
+        return {pid: read_memory_usage(pid) for pid in self.worker_pids}
+
+    def _spawn_worker(self, listener: socket.socket) -> None:
+        pid = os.fork()
+        if pid != 0:
+            self.worker_pids.append(pid)
+            return
+
+        # worker process
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            self._run_worker(listener)
+        except BaseException:
+            logger.exception("worker %d failed", os.getpid())
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _run_worker(self, listener: socket.socket) -> None:
+        handled = 0
+        while True:
+            conn, _ = listener.accept()
+            with conn:
+                handled, recycle = self._serve_connection(conn, handled)
+            if recycle:
+                return
+
+    def _serve_connection(self, conn: socket.socket, handled: int) -> Tuple[int, bool]:
+        """
+        serve the connection until EOF, or until the grace period ends
+        after the threshold to recycle the worker is crossed.
+        return the number of handled requests and if the worker should exit.
+        """
+        recycle_at: Optional[float] = None
+        try:
+            with conn.makefile("rb") as rfile, conn.makefile("wb") as wfile:
+                try:
+                    for line in rfile:
+                        if line.strip():
+                            response = _handle_line(self.reflector, line)
+                            handled += 1
+                            # checked only when the count changes, not on blank lines
+                            if recycle_at is None and self._should_recycle(handled):
+                                recycle_at = (
+                                    time.monotonic() + self.op.recycle_grace_sec
+                                )
+                            wfile.write(response)
+                            wfile.flush()
+                        if recycle_at is not None:
+                            remaining = recycle_at - time.monotonic()
+                            if remaining <= 0:
+                                break
+                            conn.settimeout(remaining)
+                except TimeoutError:
+                    pass
+        except ConnectionError as e:
+            # the client went away, e.g. before reading the response
+            # the worker keeps its warmed model for the next connection
+            logger.info("connection lost: %r", e)
+        if recycle_at is not None:
+            # the client reads EOF after the answered requests and reconnects
+            try:
+                conn.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+        return handled, recycle_at is not None
+
+    def _should_recycle(self, handled: int) -> bool:
+        max_requests = self.op.max_requests_per_worker
+        if max_requests is not None and handled >= max_requests:
+            return True
+        max_private_bytes = self.op.max_private_bytes_per_worker
+        if max_private_bytes is None or handled % self.op.memory_check_every != 0:
+            return False
+        usage = read_memory_usage(os.getpid())
+        return usage is not None and usage.private_bytes > max_private_bytes
+
+    def _supervise(self, listener: socket.socket) -> None:
+        def _stop(signum, frame):
+            self._running = False
+
+        signal.signal(signal.SIGTERM, _stop)
+
+        self._running = True
+        last_reported = time.monotonic()
+        while self._running:
+            time.sleep(self.op.check_interval_sec)
+            self._restart_exited_workers(listener)
+            if time.monotonic() - last_reported >= self.op.report_interval_sec:
+                last_reported = time.monotonic()
+                for pid, usage in self.memory_report().items():
+                    logger.info("worker %d %s", pid, usage)
+
+    def _restart_exited_workers(self, listener: socket.socket) -> None:
+        while self._running:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid == 0:
+                return
+            if pid in self.worker_pids:
+                self.worker_pids.remove(pid)
+                self.restart_count += 1
+                self._spawn_worker(listener)
+
+    def _stop_workers(self) -> None:
+        for pid in self.worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.worker_pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.worker_pids.clear()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="serve reflections as JSON lines from prefork workers"
+    )
+    parser.add_argument("--model", default="ja_ginza")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--socket", help="path of the unix socket to listen")
+    group.add_argument(
+        "--stdio", action="store_true", help="serve stdin/stdout in a single process"
+    )
+    parser.add_argument("--workers", type=int, default=PreforkOption().num_workers)
+    parser.add_argument("--max-requests", type=int, default=None)
+    parser.add_argument(
+        "--max-private-mb",
+        type=int,
+        default=None,
+        help="restart the worker over the memory not shared with the parent",
+    )
+    parser.add_argument("--report-interval", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    from dialog_reflection.lang.ja.reflector import JaSpacyReflector
+
+    reflector = JaSpacyReflector(model=args.model)
+    reflector.warm_up()
+    logger.info("startup %s", reflector.startup_report)
+
+    if args.stdio:
+        serve_lines(reflector, sys.stdin.buffer, sys.stdout.buffer)
+        return
+
+    op = PreforkOption(
+        num_workers=args.workers,
+        max_requests_per_worker=args.max_requests,
+        max_private_bytes_per_worker=None
+        if args.max_private_mb is None
+        else args.max_private_mb * 2**20,
+        report_interval_sec=args.report_interval,
+    )
+    PreforkSupervisor(reflector, op).serve_unix_socket(args.socket)
+
+
+if __name__ == "__main__":
+    main()
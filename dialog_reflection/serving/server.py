@@ -0,0 +1,462 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.reflection_text_builder import ISpacyReflectionTextBuilder
+from dialog_reflection.reflection_cancelled import ReflectionCancelled
+from dialog_reflection.cancelled_reason import DeadlineExceeded
+from dialog_reflection.tenant_registry import TenantRegistry, UnknownTenant
+from dialog_reflection.outcome_counter import OutcomeCounter
+import argparse
+import asyncio
+import attr
+import json
+import logging
+import math
+import struct
+
+logger = logging.getLogger(__name__)
+
+_LENGTH_PREFIX = struct.Struct(">I")
+
+_HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class ServerOverloaded(Exception):
+    def __str__(self):
+        return "Server Overloaded. the request queue is full"
+
+
+class ServerClosed(Exception):
+    def __str__(self):
+        return "Server Closed. the request was not reflected before closing"
+
+
+@attr.define(frozen=True)
+class ServerOption:
+    # requests over the size are rejected instead of waiting in the queue
+    max_queue_size: int = 1024
+    max_batch_size: int = 32
+    # time to wait for more requests to fill a batch
+    max_batch_wait_sec: float = 0.002
+    # parse the batch in the order of length, e.g. for the transformer models
+    sort_by_length: bool = False
+    # used when the request has no deadline (None: no deadline)
+    default_deadline_ms: Optional[float] = 1000.0
+    max_body_bytes: int = 2**20
+
+
+@attr.define
+class ServerMetrics:
+    requests_total: int = 0
+    rejected_total: int = 0
+    deadline_exceeded_total: int = 0
+    batches_total: int = 0
+    batched_requests_total: int = 0
+
+    def to_text(self, queue_size: int) -> str:
+        """
+        render the metrics in Prometheus text format.
+        """
+        lines: List[str] = []
+        for name, type_, value in [
+            ("requests_total", "counter", self.requests_total),
+            ("rejected_total", "counter", self.rejected_total),
+            ("deadline_exceeded_total", "counter", self.deadline_exceeded_total),
+            ("batches_total", "counter", self.batches_total),
+            ("batched_requests_total", "counter", self.batched_requests_total),
+            ("queue_size", "gauge", queue_size),
+        ]:
+            lines.append(f"# TYPE dialog_reflection_server_{name} {type_}")
+            lines.append(f"dialog_reflection_server_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+@attr.define
+class _PendingReflection:
+    message: str
+    deadline: Optional[float]
+    future: asyncio.Future
+    builder: ISpacyReflectionTextBuilder
+
+
+class ReflectionServer:
+    """
+    serve reflections in batches of `nlp.pipe` with a bounded queue.
+    the reflector runs in a single thread apart from the event loop.
+    the requests of the tenants in `tenants` are batched together.
+    """
+
+    def __init__(
+        self,
+        reflector: SpacyReflector,
+        op: ServerOption = ServerOption(),
+        tenants: Optional[TenantRegistry] = None,
+    ) -> None:
+        self.reflector = reflector
+        self.op = op
+        self.tenants = tenants
+        self.metrics = ServerMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def start(self) -> None:
+        if self._batch_task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.op.max_queue_size)
+        self._batch_task = asyncio.create_task(self._run_batches())
+
+    async def close(self) -> None:
+        """
+        fail the requests not reflected yet with `ServerClosed`.
+        """
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+            try:
+                await self._batch_task
+            except asyncio.CancelledError:
+                pass
+            self._batch_task = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._fail([self._queue.get_nowait()], ServerClosed())
+            self._queue = None
+        self._executor.shutdown(wait=True)
+
+    async def reflect(
+        self,
+        message: str,
+        deadline_ms: Optional[float] = None,
+        tenant: Optional[str] = None,
+    ) -> str:
+        """
+        return the fallback text of the builder if the deadline passed
+        before the reflection, as `SpacyReflector.reflect` does.
+        raise `ServerOverloaded` if the queue is full,
+        `UnknownTenant` if the tenant is not in `tenants`
+        and `ServerClosed` if the server is closed before the reflection.
+        """
+        assert self._queue is not None, "call start() before reflect()"
+        if deadline_ms is None:
+            deadline_ms = self.op.default_deadline_ms
+        # the builder is fixed here even if the option of the tenant is replaced
+        builder = self._builder_of(tenant)
+
+        loop = asyncio.get_running_loop()
+        deadline = None if deadline_ms is None else loop.time() + deadline_ms / 1000
+        pending = _PendingReflection(message, deadline, loop.create_future(), builder)
+
+        self.metrics.requests_total += 1
+        try:
+            self._queue.put_nowait(pending)
+        except asyncio.QueueFull:
+            self.metrics.rejected_total += 1
+            raise ServerOverloaded()
+
+        if deadline_ms is None:
+            return await pending.future
+        try:
+            return await asyncio.wait_for(pending.future, deadline_ms / 1000)
+        except asyncio.TimeoutError:
+            self.metrics.deadline_exceeded_total += 1
+            e = ReflectionCancelled(
+                reason=DeadlineExceeded(deadline_ms=deadline_ms, stage="queue")
+            )
+            return builder.build_instead_of_error(e)
+
+    def _builder_of(self, tenant: Optional[str]) -> ISpacyReflectionTextBuilder:
+        if tenant is None:
+            return self.reflector.builder
+        if self.tenants is None:
+            raise UnknownTenant(tenant)
+        return self.tenants.builder(tenant)
+
+    def metrics_text(self) -> str:
+        queue_size = 0 if self._queue is None else self._queue.qsize()
+        texts = [self.metrics.to_text(queue_size)]
+        builders = [self.reflector.builder]
+        if self.tenants is not None:
+            builders += self.tenants.builders.values()
+        hooks = [*self.reflector.stage_hooks]
+        for builder in builders:
+            hooks += [h for h in builder.stage_hooks if h not in hooks]
+        for hook in hooks:
+            if isinstance(hook, OutcomeCounter):
+                texts.append(hook.to_prometheus())
+        return "".join(texts)
+
+    async def _run_batches(self) -> None:
+        assert self._queue is not None
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                await self._run_batch(batch)
+            except asyncio.CancelledError:
+                self._fail(batch, ServerClosed())
+                raise
+
+    async def _run_batch(self, batch: List[_PendingReflection]) -> None:
+        """
+        fill the batch from the queue and reflect it.
+        """
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        if self._queue.qsize() < self.op.max_batch_size - 1:
+            await asyncio.sleep(self.op.max_batch_wait_sec)
+        while len(batch) < self.op.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        # skip the requests already timed out
+        now = loop.time()
+        batch[:] = [
+            pending
+            for pending in batch
+            if not pending.future.done()
+            and (pending.deadline is None or pending.deadline > now)  # noqa: W503
+        ]
+        if not batch:
+            return
+
+        self.metrics.batches_total += 1
+        self.metrics.batched_requests_total += len(batch)
+        try:
+            reflections = await loop.run_in_executor(
+                self._executor,
+                self.reflector.reflect_many,
+                [pending.message for pending in batch],
+                None,
+                [pending.builder for pending in batch],
+                len(batch) if self.op.sort_by_length else None,
+            )
+        except Exception as e:
+            logger.exception("failed to reflect a batch")
+            self._fail(batch, e)
+            return
+
+        for pending, reflection in zip(batch, reflections):
+            if not pending.future.done():
+                pending.future.set_result(reflection)
+
+    @staticmethod
+    def _fail(batch: List[_PendingReflection], e: BaseException) -> None:
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_exception(e)
+
+    async def _reflect_payload(self, payload: bytes) -> Tuple[int, Dict[str, Any]]:
+        """
+        reflect `{"message": "...", "deadline_ms": 100, "tenant": "..."}`
+        into `{"reflection": "..."}`. return the HTTP status code with the response.
+        """
+        try:
+            request = json.loads(payload)
+            message = request["message"]
+            deadline_ms = request.get("deadline_ms")
+            tenant = request.get("tenant")
+            if not isinstance(message, str):
+                raise TypeError(f"message must be str, not {type(message).__name__}")
+            if deadline_ms is not None:
+                # bool is an int, and json accepts Infinity and NaN
+                if isinstance(deadline_ms, bool) or not isinstance(
+                    deadline_ms, (int, float)
+                ):
+                    raise TypeError("deadline_ms must be number")
+                if not math.isfinite(deadline_ms):
+                    raise ValueError("deadline_ms must be finite")
+            if tenant is not None and not isinstance(tenant, str):
+                raise TypeError("tenant must be str")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+
+        try:
+            return 200, {"reflection": await self.reflect(message, deadline_ms, tenant)}
+        except UnknownTenant as e:
+            return 400, {"error": str(e)}
+        except (ServerOverloaded, ServerClosed) as e:
+            return 503, {"error": str(e)}
+        except Exception as e:
+            # the connection is kept for the next requests
+            logger.exception("failed to reflect a payload")
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    # ========================================================================
+    # Unix Socket (length-prefixed JSON)
+    # ========================================================================
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        """
+        each frame is a 4-byte big-endian length followed by the JSON body.
+        """
+        await self.start()
+        return await asyncio.start_unix_server(self._handle_unix, path=path)
+
+    async def _handle_unix(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_LENGTH_PREFIX.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (length,) = _LENGTH_PREFIX.unpack(header)
+                if length > self.op.max_body_bytes:
+                    body = json.dumps({"error": "payload too large"}).encode()
+                    writer.write(_LENGTH_PREFIX.pack(len(body)) + body)
+                    await writer.drain()
+                    break
+                _, response = await self._reflect_payload(
+                    await reader.readexactly(length)
+                )
+                body = json.dumps(response, ensure_ascii=False).encode()
+                writer.write(_LENGTH_PREFIX.pack(len(body)) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    # ========================================================================
+    # HTTP
+    # ========================================================================
+
+    async def serve_http(self, host: str, port: int) -> asyncio.AbstractServer:
+        """
+        POST /reflect, GET /metrics and GET /ready (200 after `warm_up`).
+        """
+        await self.start()
+        return await asyncio.start_server(self._handle_http, host=host, port=port)
+
+    async def _handle_http(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                try:
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                    content_length = int(headers.get("content-length", 0))
+                    if content_length < 0:
+                        raise ValueError("negative content-length")
+                except ValueError:
+                    self._write_http(writer, 400, "text/plain", b"Bad Request\n")
+                    break
+                if content_length > self.op.max_body_bytes:
+                    self._write_http(writer, 413, "text/plain", b"Payload Too Large\n")
+                    break
+
+                body = await reader.readexactly(content_length)
+                status, content_type, content = await self._route_http(
+                    method, target, body
+                )
+                self._write_http(writer, status, content_type, content)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route_http(
+        self, method: str, target: str, body: bytes
+    ) -> Tuple[int, str, bytes]:
+        path = target.split("?", 1)[0]
+        match (method, path):
+            case ("POST", "/reflect"):
+                status, response = await self._reflect_payload(body)
+                content = json.dumps(response, ensure_ascii=False).encode()
+                return status, "application/json; charset=utf-8", content
+            case ("GET", "/metrics"):
+                return 200, "text/plain; version=0.0.4", self.metrics_text().encode()
+            case ("GET", "/ready"):
+                if self.reflector.is_ready:
+                    return 200, "text/plain", b"ready\n"
+                return 503, "text/plain", b"not ready\n"
+        return 404, "text/plain", b"Not Found\n"
+
+    @staticmethod
+    def _write_http(
+        writer: asyncio.StreamWriter, status: int, content_type: str, content: bytes
+    ) -> None:
+        header = (
+            f"HTTP/1.1 {status} {_HTTP_REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "\r\n"
+        )
+        writer.write(header.encode("latin-1") + content)
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    from dialog_reflection.lang.ja.reflector import JaSpacyReflector
+
+    reflector = JaSpacyReflector(model=args.model)
+    reflector.warm_up()
+    logger.info("startup %s", reflector.startup_report)
+    reflector.add_stage_hook(OutcomeCounter())
+
+    server = ReflectionServer(
+        reflector,
+        ServerOption(
+            max_queue_size=args.max_queue_size,
+            max_batch_size=args.max_batch_size,
+            default_deadline_ms=args.deadline_ms,
+            sort_by_length=args.sort_by_length,
+        ),
+    )
+    if args.unix:
+        listener = await server.serve_unix(args.unix)
+    else:
+        host, _, port = args.http.rpartition(":")
+        listener = await server.serve_http(host or "127.0.0.1", int(port))
+
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="serve reflections with asyncio")
+    parser.add_argument("--model", default="ja_ginza")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--http", help="HOST:PORT to listen HTTP")
+    group.add_argument("--unix", help="path of the unix socket to listen")
+    parser.add_argument("--max-queue-size", type=int, default=1024)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--deadline-ms", type=float, default=1000.0)
+    parser.add_argument(
+        "--sort-by-length",
+        action="store_true",
+        help="parse the batches in the order of length, e.g. for ja_ginza_electra",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
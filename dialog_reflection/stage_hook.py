@@ -0,0 +1,219 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+from contextvars import ContextVar
+from collections import Counter
+from dialog_reflection.reflection_cancelled import (
+    ReflectionCancelled,
+)
+import abc
+import attr
+import math
+import sys
+import threading
+import time
+import traceback
+import warnings
+
+T = TypeVar("T")
+
+# durations of the whole reflection
+TOTAL_STAGE = "total"
+
+
+@attr.define
+class StageTimings:
+    """
+    durations (ns) of the stages in a reflection.
+    the stages may be nested, e.g. "finalize" includes "exclude_keigo".
+    """
+
+    durations_ns: Dict[str, int] = attr.Factory(dict)
+    total_ns: int = 0
+    error: Optional[BaseException] = None
+    # hooks of the inner calls, called after the outer reflection
+    nested_hooks: List["IStageHook"] = attr.Factory(list)
+
+    def add(self, stage: str, duration_ns: int) -> None:
+        self.durations_ns[stage] = self.durations_ns.get(stage, 0) + duration_ns
+
+    @property
+    def outcome(self) -> str:
+        """
+        "success", the name of the cancelled reason, or the name of the exception.
+        """
+        if self.error is None:
+            return "success"
+        if isinstance(self.error, ReflectionCancelled):
+            return type(self.error.reason).__name__
+        return type(self.error).__name__
+
+
+class IStageHook(abc.ABC):
+    @abc.abstractmethod
+    def on_reflection(self, timings: StageTimings) -> None:
+        """
+        called after each reflection.
+        **NEVER THROW THE EXCEPTION TO CONTINUE THE DIALOG**
+        """
+        raise NotImplementedError()
+
+
+# the timings of the reflection running in the current context
+# None when no hook is installed so that stages are not timed
+current_timings: ContextVar[Optional[StageTimings]] = ContextVar(
+    "current_timings", default=None
+)
+
+
+def observe_stages(hooks: Sequence[IStageHook], fn: Callable[..., T], *args) -> T:
+    """
+    run `fn` timing its stages, then pass the timings to the hooks.
+    the timings are shared with the outer reflection if any,
+    and a hook shared with the outer reflection is called once.
+    """
+    if not hooks:
+        return fn(*args)
+
+    timings = current_timings.get()
+    if timings is not None:
+        timings.nested_hooks.extend(hooks)
+        return fn(*args)
+
+    timings = StageTimings()
+    token = current_timings.set(timings)
+    start = time.monotonic_ns()
+    try:
+        result = fn(*args)
+    finally:
+        timings.total_ns = time.monotonic_ns() - start
+        current_timings.reset(token)
+
+    called: List[IStageHook] = []
+    for hook in [*hooks, *timings.nested_hooks]:
+        if any(hook is h for h in called):
+            continue
+        called.append(hook)
+        try:
+            hook.on_reflection(timings)
+        except Exception:
+            # a broken hook should not break the dialog
+            type_, value, traceback_ = sys.exc_info()
+            warnings.warn(
+                "\n".join(traceback.format_exception(type_, value, traceback_)),
+                UserWarning,
+            )
+    return result
+
+
+def record_error(e: BaseException) -> None:
+    timings = current_timings.get()
+    if timings is not None:
+        timings.error = e
+
+
+class LatencyHistogram:
+    """
+    log-scaled histogram of durations (ns).
+    the relative error of percentiles is less than 2 ** (1 / sub_buckets) - 1.
+    """
+
+    def __init__(self, sub_buckets: int = 8) -> None:
+        self.sub_buckets = sub_buckets
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+        self._buckets: Counter = Counter()
+
+    def add(self, duration_ns: int) -> None:
+        self.count += 1
+        self.sum_ns += duration_ns
+        self.max_ns = max(self.max_ns, duration_ns)
+        self._buckets[self._index(duration_ns)] += 1
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        assert self.sub_buckets == other.sub_buckets
+        self.count += other.count
+        self.sum_ns += other.sum_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+        self._buckets.update(other._buckets)
+
+    def percentile(self, q: float) -> float:
+        """
+        return the upper bound (ns) of the bucket including the q-quantile (0 <= q <= 1).
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return min(2 ** ((index + 1) / self.sub_buckets), float(self.max_ns))
+        return float(self.max_ns)
+
+    def _index(self, duration_ns: int) -> int:
+        if duration_ns <= 1:
+            return 0
+        return math.floor(math.log2(duration_ns) * self.sub_buckets)
+
+
+class StageTimingAggregator(IStageHook):
+    """
+    keep histograms of durations per stage and per outcome in the process.
+    """
+
+    def __init__(self, sub_buckets: int = 8) -> None:
+        self.sub_buckets = sub_buckets
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def on_reflection(self, timings: StageTimings) -> None:
+        outcome = timings.outcome
+        durations = [(TOTAL_STAGE, timings.total_ns), *timings.durations_ns.items()]
+        with self._lock:
+            for stage, duration_ns in durations:
+                key = (stage, outcome)
+                if key not in self._histograms:
+                    self._histograms[key] = LatencyHistogram(self.sub_buckets)
+                self._histograms[key].add(duration_ns)
+
+    def stages(self) -> List[str]:
+        with self._lock:
+            return sorted({stage for stage, _ in self._histograms})
+
+    def outcomes(self) -> List[str]:
+        with self._lock:
+            return sorted({outcome for _, outcome in self._histograms})
+
+    def histogram(self, stage: str, outcome: Optional[str] = None) -> LatencyHistogram:
+        """
+        return the histogram of the stage, merged over outcomes if `outcome` is None.
+        """
+        merged = LatencyHistogram(self.sub_buckets)
+        with self._lock:
+            for (_stage, _outcome), histogram in self._histograms.items():
+                if _stage == stage and outcome in (None, _outcome):
+                    merged.merge(histogram)
+        return merged
+
+    def summary(
+        self,
+        outcome: Optional[str] = None,
+        qs: Iterable[float] = (0.5, 0.9, 0.99),
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        return count, mean and percentiles (ms) per stage.
+        """
+        qs = list(qs)
+        summary = {}
+        for stage in self.stages():
+            histogram = self.histogram(stage, outcome)
+            if histogram.count == 0:
+                continue
+            stats = {
+                "count": float(histogram.count),
+                "mean_ms": histogram.sum_ns / histogram.count / 1e6,
+            }
+            for q in qs:
+                stats[f"p{q * 100:g}_ms"] = histogram.percentile(q) / 1e6
+            summary[stage] = stats
+        return summary
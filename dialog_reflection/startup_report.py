@@ -0,0 +1,27 @@
+from typing import Optional
+import attr
+
+
+@attr.define
+class StartupReport:
+    """
+    time (sec) spent until the reflector gets ready.
+    `None` means that the step has not been measured,
+    e.g. the builder was constructed outside of the reflector.
+    """
+
+    import_sec: Optional[float] = None
+    model_load_sec: Optional[float] = None
+    builder_construction_sec: Optional[float] = None
+    warm_up_sec: Optional[float] = None
+
+    def __str__(self):
+        def _format(sec: Optional[float]) -> str:
+            return "-" if sec is None else f"{sec:.3f} sec"
+
+        return (
+            f"import: {_format(self.import_sec)}, "
+            f"model load: {_format(self.model_load_sec)}, "
+            f"builder construction: {_format(self.builder_construction_sec)}, "
+            f"warm up: {_format(self.warm_up_sec)}"
+        )
@@ -0,0 +1,85 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dialog_reflection.reflection_text_builder import (
+    ISpacyReflectionTextBuilder,
+)
+import threading
+
+
+class UnknownTenant(KeyError):
+    def __init__(self, tenant: str) -> None:
+        self.tenant = tenant
+
+    def __str__(self):
+        return f"Unknown Tenant. tenant: {self.tenant}"
+
+
+class TenantRegistry:
+    """
+    the builders per tenant sharing the pipeline of a reflector,
+    e.g. `TenantRegistry(JaSpacyPlainReflectionTextBuilder)`.
+    the builder is built once when the option is set, and the options are
+    replaced atomically: the reflections in flight finish with the old builder.
+    """
+
+    def __init__(
+        self, builder_factory: Callable[[Any], ISpacyReflectionTextBuilder]
+    ) -> None:
+        self.builder_factory = builder_factory
+        # tenant -> (option, builder)
+        # replace the dict not to lock the readers
+        self._entries: Dict[str, Tuple[Any, ISpacyReflectionTextBuilder]] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, tenant: str) -> bool:
+        return tenant in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def tenants(self) -> List[str]:
+        return list(self._entries)
+
+    @property
+    def builders(self) -> Dict[str, ISpacyReflectionTextBuilder]:
+        return {tenant: builder for tenant, (_, builder) in self._entries.items()}
+
+    def set_option(self, tenant: str, op: Any) -> ISpacyReflectionTextBuilder:
+        """
+        build the builder of the option for the tenant, or reuse the builder
+        of an equal option, e.g. set again by reloading the configuration.
+        """
+        with self._lock:
+            builder = next(
+                (b for _op, b in self._entries.values() if _op == op),
+                None,
+            )
+            if builder is None:
+                builder = self.builder_factory(op)
+            self._entries = {**self._entries, tenant: (op, builder)}
+        return builder
+
+    def set_builder(self, tenant: str, builder: ISpacyReflectionTextBuilder) -> None:
+        with self._lock:
+            self._entries = {
+                **self._entries,
+                tenant: (getattr(builder, "op", None), builder),
+            }
+
+    def remove(self, tenant: str) -> None:
+        with self._lock:
+            if tenant not in self._entries:
+                raise UnknownTenant(tenant)
+            self._entries = {k: v for k, v in self._entries.items() if k != tenant}
+
+    def option(self, tenant: str) -> Optional[Any]:
+        return self._entry(tenant)[0]
+
+    def builder(self, tenant: str) -> ISpacyReflectionTextBuilder:
+        return self._entry(tenant)[1]
+
+    def _entry(self, tenant: str) -> Tuple[Any, ISpacyReflectionTextBuilder]:
+        try:
+            return self._entries[tenant]
+        except KeyError:
+            raise UnknownTenant(tenant) from None
@@ -0,0 +1,280 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from dialog_reflection.reflector import SpacyReflector
+import argparse
+import attr
+import json
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+import warnings
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+@attr.define(frozen=True)
+class BulkJobOption:
+    # the input is split at the first newline after every `chunk_bytes`
+    chunk_bytes: int = attr.field(default=8 * 2**20, validator=attr.validators.gt(0))
+    # forked processes sharing the loaded pipeline (Linux only)
+    workers: int = 1
+    batch_size: int = 256
+    # sort the lines by length within the windows of the size (None: not sorted)
+    sort_window: Optional[int] = None
+
+
+@attr.define
+class BulkJobReport:
+    chunks_total: int = 0
+    # chunks done by the previous runs
+    chunks_skipped: int = 0
+    chunks_processed: int = 0
+    lines: int = 0
+    # lines reflected after the deduplication within the chunks
+    reflected: int = 0
+    elapsed_sec: float = 0.0
+
+    def __str__(self):
+        return (
+            f"chunks: {self.chunks_processed} processed, "
+            f"{self.chunks_skipped} skipped / {self.chunks_total}, "
+            f"lines: {self.lines}, reflected: {self.reflected}, "
+            f"elapsed: {self.elapsed_sec:.1f} sec"
+        )
+
+
+def split_chunks(path: str, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """
+    return (start, end) byte offsets of the chunks ending with a newline.
+    """
+    if chunk_bytes <= 0:
+        raise ValueError(f"chunk_bytes must be positive: {chunk_bytes}")
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    chunks = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        start = 0
+        while start < size:
+            newline = m.find(b"\n", min(start + chunk_bytes, size) - 1)
+            end = size if newline == -1 else newline + 1
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def read_chunk(path: str, start: int, end: int) -> List[str]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        data = m[start:end]
+    # a broken byte should not abort the whole job
+    lines = data.decode("utf-8", errors="replace").split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return [line.rstrip("\r") for line in lines]
+
+
+def shard_path(output_dir: str, index: int) -> str:
+    return os.path.join(output_dir, f"part-{index:06d}.jsonl")
+
+
+def _write_atomically(path: str, text: str) -> None:
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _Checkpoint:
+    """
+    the done chunks of the job, valid only for the same input and chunking.
+    """
+
+    def __init__(self, output_dir: str, manifest: Dict) -> None:
+        self.path = os.path.join(output_dir, CHECKPOINT_FILE)
+        self.manifest = manifest
+        self.done: Set[int] = set()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint["manifest"] != manifest:
+            raise ValueError(
+                f"the checkpoint is of another input or option: {self.path} "
+                f"expected: {manifest} actual: {checkpoint['manifest']}"
+            )
+        # the shard may be lost after the checkpoint, e.g. by hand
+        self.done = {
+            index
+            for index in checkpoint["done"]
+            if os.path.exists(shard_path(output_dir, index))
+        }
+
+    def mark_done(self, index: int) -> None:
+        self.done.add(index)
+        _write_atomically(
+            self.path,
+            json.dumps({"manifest": self.manifest, "done": sorted(self.done)}),
+        )
+
+
+def reflect_chunk(
+    reflector: SpacyReflector,
+    lines: Sequence[str],
+    batch_size: int,
+    sort_window: Optional[int] = None,
+) -> Tuple[List[str], int]:
+    """
+    reflect the lines deduplicated, return the reflections per line
+    with the number of the reflected messages.
+    """
+    unique = list(dict.fromkeys(lines))
+    reflections = dict(
+        zip(
+            unique,
+            reflector.reflect_many(
+                unique, batch_size=batch_size, sort_window=sort_window
+            ),
+        )
+    )
+    return [reflections[line] for line in lines], len(unique)
+
+
+def _process_chunk(
+    reflector: SpacyReflector,
+    input_path: str,
+    output_dir: str,
+    op: BulkJobOption,
+    index: int,
+    start: int,
+    end: int,
+) -> Tuple[int, int, int]:
+    lines = read_chunk(input_path, start, end)
+    with warnings.catch_warnings():
+        # cancelled reflections are expected in the archive
+        warnings.simplefilter("ignore")
+        reflections, reflected = reflect_chunk(
+            reflector, lines, op.batch_size, op.sort_window
+        )
+    _write_atomically(
+        shard_path(output_dir, index),
+        "".join(
+            f"{json.dumps({'message': line, 'reflection': reflection}, ensure_ascii=False)}\n"
+            for line, reflection in zip(lines, reflections)
+        ),
+    )
+    return index, len(lines), reflected
+
+
+# inherited by the forked workers
+_job: Optional[Tuple[SpacyReflector, str, str, BulkJobOption]] = None
+
+
+def _process_chunk_in_worker(chunk: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    assert _job is not None
+    return _process_chunk(*_job, *chunk)
+
+
+def run_bulk_job(
+    reflector: SpacyReflector,
+    input_path: str,
+    output_dir: str,
+    op: BulkJobOption = BulkJobOption(),
+) -> BulkJobReport:
+    """
+    reflect the lines of the input into `part-NNNNNN.jsonl` shards per chunk.
+    the job resumes from the checkpoint in `output_dir` if rerun after a crash.
+    """
+    start_time = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    stat = os.stat(input_path)
+    manifest = {
+        "input": os.path.abspath(input_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "chunk_bytes": op.chunk_bytes,
+    }
+    checkpoint = _Checkpoint(output_dir, manifest)
+
+    chunks = split_chunks(input_path, op.chunk_bytes)
+    pending = [
+        (index, start, end)
+        for index, (start, end) in enumerate(chunks)
+        if index not in checkpoint.done
+    ]
+    report = BulkJobReport(
+        chunks_total=len(chunks), chunks_skipped=len(chunks) - len(pending)
+    )
+
+    def _results() -> Iterator[Tuple[int, int, int]]:
+        global _job
+        if op.workers <= 1:
+            for chunk in pending:
+                yield _process_chunk(reflector, input_path, output_dir, op, *chunk)
+            return
+        _job = (reflector, input_path, output_dir, op)
+        try:
+            with multiprocessing.get_context("fork").Pool(op.workers) as pool:
+                yield from pool.imap_unordered(_process_chunk_in_worker, pending)
+        finally:
+            _job = None
+
+    for index, lines, reflected in _results():
+        checkpoint.mark_done(index)
+        report.chunks_processed += 1
+        report.lines += lines
+        report.reflected += reflected
+
+    report.elapsed_sec = time.perf_counter() - start_time
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="reflect a large file of messages (a message per line)"
+        " into JSON lines shards, resuming from the checkpoint"
+    )
+    parser.add_argument("input")
+    parser.add_argument("output_dir")
+    parser.add_argument("--model", default="ja_ginza")
+    parser.add_argument("--pipeline", choices=["full", "pruned"], default="pruned")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-mb", type=float, default=8.0)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument(
+        "--sort-window",
+        type=int,
+        help="sort the lines by length within the window, e.g. for ja_ginza_electra",
+    )
+    args = parser.parse_args(argv)
+    chunk_bytes = int(args.chunk_mb * 2**20)
+    if chunk_bytes <= 0:
+        parser.error(f"--chunk-mb must be positive: {args.chunk_mb}")
+
+    from dialog_reflection.lang.ja.reflector import (
+        JaSpacyReflector,
+        PRUNABLE_COMPONENTS,
+    )
+
+    reflector = JaSpacyReflector(
+        model=args.model,
+        exclude=PRUNABLE_COMPONENTS if args.pipeline == "pruned" else (),
+    )
+    report = run_bulk_job(
+        reflector,
+        args.input,
+        args.output_dir,
+        BulkJobOption(
+            chunk_bytes=chunk_bytes,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            sort_window=args.sort_window,
+        ),
+    )
+    print(report, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
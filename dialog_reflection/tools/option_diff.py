@@ -0,0 +1,237 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dialog_reflection.parse_cache import ParseCache
+from dialog_reflection.stage_hook import IStageHook, StageTimings
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.reflection_text_builder_option import (
+    JaSpacyPlainRelflectionTextBuilderOption,
+)
+import argparse
+import attr
+import importlib
+import json
+import sys
+import time
+import warnings
+
+
+def evolve_option(
+    op: JaSpacyPlainRelflectionTextBuilderOption, overrides: Dict[str, Any]
+) -> JaSpacyPlainRelflectionTextBuilderOption:
+    """
+    replace the fields of the option, e.g. `{"allowed_root_pos_tags": ["VERB"]}`.
+    the set fields accept "+name" to add and "-name" to remove the values.
+    """
+    changes = {}
+    for key, value in overrides.items():
+        mode, name = (key[0], key[1:]) if key[0] in "+-" else ("=", key)
+        if not hasattr(op, name):
+            raise ValueError(f"unknown option: {name}")
+        current = getattr(op, name)
+        if isinstance(current, (set, frozenset)):
+            value = set(value)
+            if mode == "+":
+                value = set(current) | value
+            elif mode == "-":
+                value = set(current) - value
+        elif mode != "=":
+            raise ValueError(f"{name} is not a set to add or remove the values")
+        changes[name] = value
+    return attr.evolve(op, **changes)
+
+
+def load_builder(spec: Optional[str]) -> JaSpacyPlainReflectionTextBuilder:
+    """
+    build the builder from the spec.
+    - None: the default option
+    - "path/to/overrides.json": the default option evolved by the JSON
+    - "module:attribute": an option, a builder, or a callable returning either
+    """
+    if spec is None:
+        return JaSpacyPlainReflectionTextBuilder()
+    if spec.endswith(".json"):
+        with open(spec, encoding="utf-8") as f:
+            overrides = json.load(f)
+        return JaSpacyPlainReflectionTextBuilder(
+            evolve_option(JaSpacyPlainRelflectionTextBuilderOption(), overrides)
+        )
+
+    module_name, _, name = spec.partition(":")
+    value = getattr(importlib.import_module(module_name), name)
+    if callable(value) and not isinstance(value, JaSpacyPlainReflectionTextBuilder):
+        value = value()
+    if isinstance(value, JaSpacyPlainRelflectionTextBuilderOption):
+        return JaSpacyPlainReflectionTextBuilder(value)
+    if isinstance(value, JaSpacyPlainReflectionTextBuilder):
+        return value
+    raise TypeError(f"not an option nor a builder: {spec}")
+
+
+class _OutcomeRecorder(IStageHook):
+    def __init__(self) -> None:
+        self.outcomes: List[str] = []
+
+    def on_reflection(self, timings: StageTimings) -> None:
+        self.outcomes.append(timings.outcome)
+
+
+def _build_shard(
+    cache_dir: str, spec: Optional[str], shard: int
+) -> Tuple[List[str], List[str], List[str], float]:
+    """
+    return the texts, the reflections, the outcomes and the time to build (sec).
+    """
+    builder = load_builder(spec)
+    recorder = _OutcomeRecorder()
+    builder.add_stage_hook(recorder)
+    docs = ParseCache(cache_dir).read_shard(shard)
+    with warnings.catch_warnings():
+        # the cancelled reflections are compared as the outcomes
+        warnings.simplefilter("ignore")
+        start = time.perf_counter()
+        reflections = builder.build_many(docs)
+        elapsed_sec = time.perf_counter() - start
+    return [doc.text for doc in docs], reflections, recorder.outcomes, elapsed_sec
+
+
+@attr.define
+class ChangedReflection:
+    text: str
+    base: str
+    candidate: str
+    base_outcome: str
+    candidate_outcome: str
+
+
+@attr.define
+class OptionDiff:
+    docs: int = 0
+    changed: List[ChangedReflection] = attr.Factory(list)
+    # (base outcome, candidate outcome) -> count, only the changed outcomes
+    outcome_changes: Counter = attr.Factory(Counter)
+    base_build_sec: float = 0.0
+    candidate_build_sec: float = 0.0
+
+    @property
+    def base_docs_per_sec(self) -> float:
+        return self.docs / self.base_build_sec if self.base_build_sec > 0 else 0.0
+
+    @property
+    def candidate_docs_per_sec(self) -> float:
+        return (
+            self.docs / self.candidate_build_sec
+            if self.candidate_build_sec > 0
+            else 0.0
+        )
+
+    def to_dict(self, show: int) -> Dict[str, Any]:
+        return {
+            "docs": self.docs,
+            "changed": len(self.changed),
+            "outcome_changes": {
+                f"{base} -> {candidate}": count
+                for (base, candidate), count in self.outcome_changes.most_common()
+            },
+            "base_docs_per_sec": self.base_docs_per_sec,
+            "candidate_docs_per_sec": self.candidate_docs_per_sec,
+            "examples": [attr.asdict(c) for c in self.changed[:show]],
+        }
+
+    def format(self, show: int) -> str:
+        ratio = (
+            self.candidate_docs_per_sec / self.base_docs_per_sec
+            if self.base_docs_per_sec > 0
+            else 0.0
+        )
+        lines = [
+            f"docs: {self.docs}, changed: {len(self.changed)} "
+            f"({len(self.changed) / max(1, self.docs):.2%})",
+            f"throughput: base {self.base_docs_per_sec:.1f} docs/sec, "
+            f"candidate {self.candidate_docs_per_sec:.1f} docs/sec ({ratio:.2f}x)",
+        ]
+        if self.outcome_changes:
+            lines.append("outcome changes")
+            for (base, candidate), count in self.outcome_changes.most_common():
+                lines.append(f"  {base} -> {candidate}: {count}")
+        if self.changed:
+            lines.append("examples")
+            for c in self.changed[:show]:
+                lines.append(f"  {c.text}")
+                lines.append(f"    - {c.base} ({c.base_outcome})")
+                lines.append(f"    + {c.candidate} ({c.candidate_outcome})")
+        return "\n".join(lines)
+
+
+def diff_options(
+    cache_dir: str,
+    base: Optional[str],
+    candidate: Optional[str],
+    workers: int = 2,
+) -> OptionDiff:
+    """
+    build the cached docs with both builders in parallel processes per shard,
+    then compare the reflections and the outcomes.
+    """
+    shards = range(ParseCache(cache_dir).meta["shards"])
+    tasks = [(cache_dir, spec, shard) for spec in (base, candidate) for shard in shards]
+    if workers <= 1:
+        results = [_build_shard(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_build_shard, *zip(*tasks)))
+
+    diff = OptionDiff()
+    base_results, candidate_results = results[: len(shards)], results[len(shards) :]
+    for (texts, base_reflections, base_outcomes, base_sec), (
+        _,
+        candidate_reflections,
+        candidate_outcomes,
+        candidate_sec,
+    ) in zip(base_results, candidate_results):
+        diff.docs += len(texts)
+        diff.base_build_sec += base_sec
+        diff.candidate_build_sec += candidate_sec
+        for text, b, c, b_outcome, c_outcome in zip(
+            texts,
+            base_reflections,
+            candidate_reflections,
+            base_outcomes,
+            candidate_outcomes,
+        ):
+            if b_outcome != c_outcome:
+                diff.outcome_changes[(b_outcome, c_outcome)] += 1
+            if b != c:
+                diff.changed.append(ChangedReflection(text, b, c, b_outcome, c_outcome))
+    return diff
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="compare the reflections of two builder options over a parse cache"
+    )
+    parser.add_argument("cache_dir", help="written by dialog_reflection.parse_cache")
+    parser.add_argument(
+        "--base", help="overrides.json or module:attribute (default: default option)"
+    )
+    parser.add_argument("--candidate", required=True)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--show", type=int, default=20, help="examples to show")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument(
+        "--fail-on-change", action="store_true", help="exit 1 if any reflection changed"
+    )
+    args = parser.parse_args(argv)
+
+    diff = diff_options(args.cache_dir, args.base, args.candidate, args.workers)
+    if args.json:
+        print(json.dumps(diff.to_dict(args.show), ensure_ascii=False, indent=2))
+    else:
+        print(diff.format(args.show))
+    return 1 if args.fail_on_change and diff.changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
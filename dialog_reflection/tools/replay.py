@@ -0,0 +1,308 @@
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.stage_hook import IStageHook, StageTimings
+import argparse
+import contextlib
+import json
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+import warnings
+
+# (latency_ns, durations_ns of the stages, outcome) of a message
+_Record = Tuple[int, Dict[str, int], str]
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def read_corpus(
+    path: str, field: str = "message", limit: Optional[int] = None
+) -> List[str]:
+    """
+    read messages from a text file (a message per line), JSON lines
+    (`{"message": "..."}` or a string per line) or a Parquet file (needs pyarrow).
+    """
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("pyarrow is required to read Parquet files") from e
+        column = pyarrow.parquet.read_table(path, columns=[field]).column(field)
+        return [m for m in column.to_pylist()[:limit] if isinstance(m, str)]
+
+    messages: List[str] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if limit is not None and len(messages) >= limit:
+                break
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            if path.endswith((".jsonl", ".ndjson")):
+                value = json.loads(line)
+                if isinstance(value, dict):
+                    value = value.get(field)
+                if not isinstance(value, str):
+                    continue
+                line = value
+            messages.append(line)
+    return messages
+
+
+class _RecordingHook(IStageHook):
+    """
+    keep the stage durations and the outcome of the reflections per thread.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    def on_reflection(self, timings: StageTimings) -> None:
+        self._local.timings.append((dict(timings.durations_ns), timings.outcome))
+
+    def start(self) -> None:
+        self._local.timings = []
+
+    def pop(self) -> List[Tuple[Dict[str, int], str]]:
+        timings, self._local.timings = self._local.timings, []
+        return timings
+
+
+class _Replayer:
+    def __init__(self, reflector: SpacyReflector, batch_size: Optional[int]) -> None:
+        self.reflector = reflector
+        self.batch_size = batch_size
+        self.hook = _RecordingHook()
+        self._original_hooks = reflector.stage_hooks
+        reflector.add_stage_hook(self.hook)
+
+    def close(self) -> None:
+        self.reflector.stage_hooks = self._original_hooks
+
+    def replay(self, messages: Sequence[str]) -> List[_Record]:
+        """
+        reflect the messages one by one, or in batches if `batch_size` is set.
+        the latency of a batched message is that of its batch.
+        """
+        records: List[_Record] = []
+        self.hook.start()
+        if self.batch_size is None:
+            for message in messages:
+                start = time.perf_counter_ns()
+                self.reflector.reflect(message)
+                latency_ns = time.perf_counter_ns() - start
+                records.extend((latency_ns, *t) for t in self.hook.pop())
+        else:
+            for i in range(0, len(messages), self.batch_size):
+                start = time.perf_counter_ns()
+                self.reflector.reflect_many(messages[i : i + self.batch_size])
+                latency_ns = time.perf_counter_ns() - start
+                records.extend((latency_ns, *t) for t in self.hook.pop())
+        return records
+
+
+@contextlib.contextmanager
+def _closing(replayers: "queue.Queue[_Replayer]") -> Iterator[None]:
+    try:
+        yield
+    finally:
+        while not replayers.empty():
+            replayers.get_nowait().close()
+
+
+# inherited by the forked workers
+_replayer: Optional[_Replayer] = None
+
+
+def _replay_in_process(messages: Sequence[str]) -> List[_Record]:
+    assert _replayer is not None
+    return _replayer.replay(messages)
+
+
+def _fresh_reflector(reflector: SpacyReflector) -> SpacyReflector:
+    """
+    a reflector on a fresh pipeline for a thread, warmed up as the original
+    so that the first calls do not skew the latencies.
+    """
+    fresh = SpacyReflector(reflector.load_fresh_nlp(), reflector.builder)
+    if reflector.is_ready:
+        fresh.warm_up(reflector.warm_up_corpus)
+    return fresh
+
+
+def replay(
+    reflector: SpacyReflector,
+    messages: Sequence[str],
+    batch_size: Optional[int] = None,
+    workers: int = 1,
+    parallel: str = "thread",
+    chunk_size: int = 256,
+) -> Dict[str, Any]:
+    """
+    replay the messages and summarize throughput, latency, stages and outcomes.
+    the threads load their own pipelines since the tokenizer can not be shared,
+    and the processes are forked to share the loaded pipeline (Linux only).
+    """
+    if parallel not in ("thread", "process"):
+        raise ValueError(f"unknown parallel: {parallel}")
+    chunks = [messages[i : i + chunk_size] for i in range(0, len(messages), chunk_size)]
+
+    replayers: "queue.Queue[_Replayer]" = queue.Queue()
+    replayers.put(_Replayer(reflector, batch_size))
+    if workers > 1 and parallel == "thread":
+        for _ in range(workers - 1):
+            replayers.put(_Replayer(_fresh_reflector(reflector), batch_size))
+
+    def _replay(chunk: Sequence[str]) -> List[_Record]:
+        replayer = replayers.get()
+        try:
+            return replayer.replay(chunk)
+        finally:
+            replayers.put(replayer)
+
+    records: List[_Record] = []
+    with _closing(replayers), warnings.catch_warnings():
+        # the cancelled reflections are counted as the outcomes
+        warnings.simplefilter("ignore")
+        start = time.perf_counter()
+        if workers <= 1:
+            for chunk in chunks:
+                records.extend(_replay(chunk))
+        elif parallel == "thread":
+            with ThreadPoolExecutor(max_workers=workers) as thread_executor:
+                for _records in thread_executor.map(_replay, chunks):
+                    records.extend(_records)
+        else:
+            global _replayer
+            _replayer = replayers.get()
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("fork")
+                ) as process_executor:
+                    for _records in process_executor.map(_replay_in_process, chunks):
+                        records.extend(_records)
+            finally:
+                replayers.put(_replayer)
+                _replayer = None
+        wall_sec = time.perf_counter() - start
+
+    return summarize(records, wall_sec)
+
+
+def _percentiles_ms(durations_ns: List[int]) -> Dict[str, float]:
+    durations_ns = sorted(durations_ns)
+    stats = {"mean_ms": sum(durations_ns) / len(durations_ns) / 1e6}
+    for q in PERCENTILES:
+        index = min(len(durations_ns) - 1, int(q * len(durations_ns)))
+        stats[f"p{q * 100:g}_ms"] = durations_ns[index] / 1e6
+    return stats
+
+
+def summarize(records: List[_Record], wall_sec: float) -> Dict[str, Any]:
+    if not records:
+        return {"messages": 0, "wall_sec": wall_sec}
+
+    stages: Dict[str, List[int]] = {}
+    for _, durations_ns, _ in records:
+        for stage, duration_ns in durations_ns.items():
+            stages.setdefault(stage, []).append(duration_ns)
+    outcomes = Counter(outcome for _, _, outcome in records)
+
+    return {
+        "messages": len(records),
+        "wall_sec": wall_sec,
+        "messages_per_sec": len(records) / wall_sec if wall_sec > 0 else 0.0,
+        "latency": _percentiles_ms([latency_ns for latency_ns, _, _ in records]),
+        "stages": {
+            stage: _percentiles_ms(durations) for stage, durations in stages.items()
+        },
+        "outcomes": {
+            outcome: {"count": count, "fraction": count / len(records)}
+            for outcome, count in outcomes.most_common()
+        },
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    lines = [
+        f"messages: {summary['messages']}, wall: {summary['wall_sec']:.3f} sec, "
+        f"throughput: {summary.get('messages_per_sec', 0.0):.1f} messages/sec"
+    ]
+
+    def _format(name: str, stats: Dict[str, float]) -> str:
+        return f"  {name:<16}" + " ".join(
+            f"{key[:-3]}: {value:8.3f} ms" for key, value in stats.items()
+        )
+
+    if "latency" in summary:
+        lines.append("latency")
+        lines.append(_format("reflect", summary["latency"]))
+        lines.append("stages")
+        for stage, stats in summary["stages"].items():
+            lines.append(_format(stage, stats))
+        lines.append("outcomes")
+        for outcome, stats in summary["outcomes"].items():
+            lines.append(
+                f"  {outcome:<24}{stats['count']:>8} ({stats['fraction']:.1%})"
+            )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="replay a corpus and report throughput, latency and outcomes"
+    )
+    parser.add_argument("corpus", help="path of .txt, .jsonl or .parquet")
+    parser.add_argument("--field", default="message", help="field of the message")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--model", default="ja_ginza")
+    parser.add_argument(
+        "--pipeline",
+        choices=["full", "pruned"],
+        default="full",
+        help="'pruned' excludes the components not used by the builder",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, help="reflect in batches of nlp.pipe if set"
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--parallel", choices=["thread", "process"], default="thread")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--no-warm-up", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    from dialog_reflection.lang.ja.reflector import (
+        JaSpacyReflector,
+        PRUNABLE_COMPONENTS,
+    )
+
+    messages = read_corpus(args.corpus, args.field, args.limit)
+    reflector = JaSpacyReflector(
+        model=args.model,
+        exclude=PRUNABLE_COMPONENTS if args.pipeline == "pruned" else (),
+    )
+    if not args.no_warm_up:
+        reflector.warm_up()
+    print(f"startup {reflector.startup_report}", file=sys.stderr)
+
+    summary = replay(
+        reflector,
+        messages,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        parallel=args.parallel,
+        chunk_size=args.chunk_size,
+    )
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
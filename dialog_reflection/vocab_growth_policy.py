@@ -0,0 +1,39 @@
+from typing import Optional
+import attr
+import spacy
+
+
+@attr.define(frozen=True)
+class VocabSize:
+    strings: int
+    lexemes: int
+
+    @classmethod
+    def of(cls, nlp: spacy.Language) -> "VocabSize":
+        return cls(strings=len(nlp.vocab.strings), lexemes=len(nlp.vocab))
+
+
+@attr.define(frozen=True)
+class VocabGrowthPolicy:
+    """
+    swap in a freshly loaded pipeline when the vocab grew over the limits,
+    since `StringStore` and the lexemes keep every surface form seen, e.g. typos.
+    the limits are the growth since loading, not the size including the model.
+    """
+
+    # None: not limited
+    max_new_strings: Optional[int] = 200_000
+    max_new_lexemes: Optional[int] = None
+    # check the size once in N reflections
+    check_every: int = attr.field(default=1000, validator=attr.validators.gt(0))
+    # load the pipeline in a background thread not to block the reflections
+    background: bool = True
+
+    def exceeded(self, size: VocabSize, baseline: VocabSize) -> bool:
+        return (
+            self.max_new_strings is not None
+            and size.strings - baseline.strings > self.max_new_strings  # noqa: W503
+        ) or (
+            self.max_new_lexemes is not None
+            and size.lexemes - baseline.lexemes > self.max_new_lexemes  # noqa: W503
+        )
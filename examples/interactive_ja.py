@@ -3,7 +3,9 @@ import time
 from dialog_reflection.lang.ja.reflector import JaSpacyReflector  # noqa: E402,E261
 
 refactor = JaSpacyReflector(model="ja_ginza")
+report = refactor.warm_up()
 
+print(f"起動時間: {report}")
 print("Ctrl+C to exit")
 print()
 print("システム: あなたの言葉に対して、おうむ返しをします。")
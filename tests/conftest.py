@@ -1,3 +1,7 @@
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
 import pytest
 import spacy
 
@@ -5,3 +9,13 @@ import spacy
 @pytest.fixture(scope="session")
 def nlp_ja():
     return spacy.load("ja_ginza")
+
+
+@pytest.fixture(scope="session")
+def builder():
+    return JaSpacyPlainReflectionTextBuilder()
+
+
+@pytest.fixture(scope="session")
+def reflector(nlp_ja, builder):
+    return SpacyReflector(nlp_ja, builder)
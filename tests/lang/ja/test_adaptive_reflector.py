@@ -0,0 +1,95 @@
+from dialog_reflection.stage_hook import StageTimingAggregator
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.reflection_text_builder import (
+    ISpacyReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.reflection_text_builder_option import (
+    JaSpacyPlainRelflectionTextBuilderOption,
+)
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.adaptive_reflector import (
+    AdaptiveReflectionOption,
+    AdaptiveReflector,
+)
+import pytest
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.filterwarnings("ignore:sent has wh_word")
+def test_escalate_on_low_confidence(reflector):
+    adaptive = AdaptiveReflector(reflector)
+    messages = [
+        "今日は旅行へ行く",
+        "友達の料理を食べた",
+        "美味しいご飯を食べて寝た",
+        "今日は旅行に行く。どう思う？",
+        "どこに行く？",
+        "",
+    ]
+
+    reflections = [adaptive.reflect(message) for message in messages]
+
+    assert reflections == [reflector.reflect(message) for message in messages]
+    assert adaptive.fast_count == 2
+    assert adaptive.escalated_count == 4
+    assert adaptive.escalation_fraction == 4 / 6
+    assert adaptive.escalation_reasons == {
+        "predicates": 1,
+        "conjunction": 1,
+        "skipped_sentence": 1,
+        "cancelled": 2,
+    }
+
+
+@pytest.mark.filterwarnings("ignore:sent has wh_word")
+def test_escalate_on_option(reflector):
+    adaptive = AdaptiveReflector(
+        reflector, AdaptiveReflectionOption(escalate_on=frozenset())
+    )
+
+    # 構文解析せずに高速モードの応答を返す
+    assert adaptive.reflect("美味しいご飯を食べて寝た") == "美味しいご飯を食べて寝たんですね。"
+    assert adaptive.reflect("どこに行く？") == "んー。"
+    assert adaptive.escalation_fraction == 0.0
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.filterwarnings("ignore:sent has wh_word")
+def test_stage_hook(nlp_ja):
+    reflector = SpacyReflector(nlp_ja, JaSpacyPlainReflectionTextBuilder())
+    aggregator = StageTimingAggregator()
+    reflector.add_stage_hook(aggregator)
+    adaptive = AdaptiveReflector(reflector)
+
+    adaptive.reflect("今日は旅行へ行く")
+    adaptive.reflect("どこに行く？")
+
+    # 構文解析した応答も1回として数える
+    assert aggregator.histogram("total").count == 2
+    assert aggregator.histogram("tokenize").count == 2
+    assert aggregator.histogram("nlp").count == 1
+    assert aggregator.outcomes() == ["WhTokenNotSupported", "success"]
+
+
+class _EchoBuilder(ISpacyReflectionTextBuilder):
+    def extract_tokens(self, doc):
+        return doc[:]
+
+    def build_text(self, doc):
+        return doc.text
+
+    def build_instead_of_error(self, e):
+        return "..."
+
+
+def test_fast_builder_option(nlp_ja):
+    op = JaSpacyPlainRelflectionTextBuilderOption(allowed_root_pos_tags={"NOUN"})
+    reflector = SpacyReflector(nlp_ja, JaSpacyPlainReflectionTextBuilder(op))
+    assert AdaptiveReflector(reflector).fast_builder.op == op
+
+    # Ja以外のbuilderでも高速モードは既定の設定で作れる
+    reflector = SpacyReflector(nlp_ja, _EchoBuilder())
+    adaptive = AdaptiveReflector(reflector)
+    assert adaptive.fast_builder.op == JaSpacyPlainRelflectionTextBuilderOption()
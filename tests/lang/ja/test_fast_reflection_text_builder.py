@@ -0,0 +1,76 @@
+import pytest
+import spacy
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.fast_reflection_text_builder import (
+    JaSpacyFastReflectionTextBuilder,
+    TOKENIZER_ONLY_EXCLUDE,
+)
+from dialog_reflection.lang.ja.warm_up_corpus import WARM_UP_CORPUS
+
+
+@pytest.fixture(scope="module")
+def nlp_ja_fast():
+    return spacy.load("ja_ginza", exclude=TOKENIZER_ONLY_EXCLUDE)
+
+
+@pytest.fixture(scope="module")
+def fast_builder():
+    return JaSpacyFastReflectionTextBuilder()
+
+
+def test_tokenizer_only(nlp_ja_fast):
+    assert nlp_ja_fast.pipe_names == []
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("今日は旅行へ行く", "旅行へ行くんですね。"),
+        ("今日は旅行へ行きました", "旅行へ行ったんですね。"),
+        ("友達の料理を食べた", "友達の料理を食べたんですね。"),
+        ("静かな海", "静かな海なんですね。"),
+        ("私は彼女を愛している。私は幸せだ。", "私は幸せなんですね。"),
+        ("見た", "見たんですね。"),
+    ],
+)
+def test_build(nlp_ja_fast, fast_builder, text, expected):
+    assert fast_builder.build(nlp_ja_fast(text)) == expected
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.filterwarnings(r"ignore:sent has wh_word")
+def test_agreement_with_full_builder(nlp_ja, nlp_ja_fast, fast_builder):
+    full_builder = JaSpacyPlainReflectionTextBuilder()
+    agreed = [
+        full_builder.safe_build(nlp_ja(text))
+        == fast_builder.safe_build(nlp_ja_fast(text))  # noqa: W503
+        for text in WARM_UP_CORPUS
+    ]
+    assert sum(agreed) / len(agreed) >= 0.9
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+def test_build_candidates(nlp_ja_fast, fast_builder):
+    doc = nlp_ja_fast("今日は旅行へ行きました。明日は公園で本を読みます。")
+    assert fast_builder.build_candidates(doc, 2) == [
+        "本を読むんですね。",
+        "旅行へ行ったんですね。",
+    ]
+
+
+@pytest.mark.filterwarnings("ignore:sent has wh_word")
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("今日は旅行へ行く", []),
+        ("友達の料理を食べた", []),
+        ("今日は旅行に行く。どう思う？", ["skipped_sentence"]),
+        ("美味しいご飯を食べて寝た", ["predicates", "conjunction"]),
+        ("昨日買った本を読んだ", ["predicates", "compound"]),
+    ],
+)
+def test_low_confidence_reasons(nlp_ja_fast, fast_builder, text, expected):
+    tokens = fast_builder.extract_tokens(nlp_ja_fast(text))
+    assert fast_builder.low_confidence_reasons(tokens) == expected
@@ -0,0 +1,67 @@
+import pytest
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.incremental_session import IncrementalReflectionSession
+
+PARTIALS = [
+    "今日は",
+    "今日は旅行へ",
+    "今日は旅行へ行きました。",
+    "今日は旅行へ行きました。明日は",
+    "今日は旅行へ行きました。明日は本を読みます",
+]
+
+
+@pytest.mark.filterwarnings("ignore:.*Traceback")
+def test_update_parses_changed_pieces(reflector):
+    session = IncrementalReflectionSession(reflector)
+    reflections = [session.update(text) for text in PARTIALS]
+
+    assert reflections[2] == "旅行へ行ったんですね。"
+    assert reflections[-1] == "本を読むんですね。"
+    # "今日は旅行へ行きました。" は2回目以降再利用される
+    assert session.reused_pieces == 2
+    assert session.parsed_pieces == 5
+
+    assert session.finish() == reflector.reflect(PARTIALS[-1])
+    assert session.text == ""
+
+
+@pytest.mark.filterwarnings("ignore:.*Traceback")
+@pytest.mark.parametrize(
+    "text",
+    [
+        "今日は旅行へ行く",
+        # 文ごとの解析と全文の解析で結果が異なる
+        "それって。あらんのだ",
+        "それが。頑張ったが、",
+    ],
+)
+def test_finish_equals_reflect(reflector, text):
+    session = IncrementalReflectionSession(reflector)
+    for i in range(1, len(text) + 1):
+        session.update(text[:i])
+    assert session.finish() == reflector.reflect(text)
+
+
+@pytest.mark.filterwarnings("ignore:.*Traceback")
+def test_finish_not_exact(reflector):
+    session = IncrementalReflectionSession(reflector)
+    session.update("それって。あらんのだ")
+    speculative = session.speculative_reflection
+    assert session.finish(exact=False) == speculative
+    assert session.finish("今日は旅行へ行く") == "旅行へ行くんですね。"
+
+
+class _BrokenNlp:
+    def pipe(self, texts):
+        raise RuntimeError("broken pipeline")
+
+
+def test_update_parse_failed(nlp_ja, builder):
+    broken = SpacyReflector(nlp_ja, builder)
+    broken.nlp = _BrokenNlp()
+    session = IncrementalReflectionSession(broken)
+
+    # 解析の失敗もフォールバックの応答にとどめる
+    assert session.update("今日は旅行へ行く") == "そうなんですね。"
+    assert session._doc is None
@@ -0,0 +1,113 @@
+from dialog_reflection.load_shedding_reflector import (
+    LoadSheddingOption,
+    LoadSheddingReflector,
+)
+import pytest
+import time
+
+
+def test_shed_with_hysteresis(reflector):
+    queue_depth = 0
+    shedding = LoadSheddingReflector(
+        reflector,
+        LoadSheddingOption(high_queue_depth=10, low_queue_depth=5, probe_interval=None),
+        queue_depth=lambda: queue_depth,
+    )
+    message = "今日は旅行へ行く"
+
+    assert shedding.reflect(message) == "旅行へ行くんですね。"
+
+    queue_depth = 11
+    assert shedding.reflect(message) == "そうなんですね。"
+    assert shedding.is_shedding
+
+    # 閾値を下回っても low_queue_depth までは回復しない
+    queue_depth = 7
+    assert shedding.reflect(message) == "そうなんですね。"
+    assert shedding.is_shedding
+
+    queue_depth = 4
+    assert shedding.reflect(message) == "旅行へ行くんですね。"
+    assert not shedding.is_shedding
+    assert shedding.shed_count == 2
+
+
+def test_shed_by_latency_with_probe(reflector):
+    shedding = LoadSheddingReflector(
+        reflector,
+        LoadSheddingOption(
+            high_queue_depth=None,
+            high_latency_ms=0.0,
+            low_latency_ms=0.0,
+            probe_interval=3,
+        ),
+    )
+    message = "今日は旅行へ行く"
+
+    reflections = [shedding.reflect(message) for _ in range(7)]
+
+    # 初回以降は3回に1回だけ解析する
+    assert reflections == [
+        "旅行へ行くんですね。",
+        "そうなんですね。",
+        "そうなんですね。",
+        "旅行へ行くんですね。",
+        "そうなんですね。",
+        "そうなんですね。",
+        "旅行へ行くんですね。",
+    ]
+    assert shedding.shed_count == 4
+    assert shedding.in_flight == 0
+
+
+class _SleepingReflector:
+    def __init__(self, reflector):
+        self.builder = reflector.builder
+        self.stage_hooks = ()
+        self.sleep_sec = 0.0
+
+    def reflect(self, message):
+        time.sleep(self.sleep_sec)
+        return "ok"
+
+
+def test_recover_from_latency(reflector):
+    sleeping = _SleepingReflector(reflector)
+    shedding = LoadSheddingReflector(
+        sleeping,
+        LoadSheddingOption(
+            high_queue_depth=None,
+            high_latency_ms=20.0,
+            low_latency_ms=10.0,
+            latency_smoothing=1.0,
+            probe_interval=2,
+        ),
+    )
+
+    sleeping.sleep_sec = 0.05
+    assert shedding.reflect("") == "ok"
+    assert shedding.reflect("") == "そうなんですね。"
+    assert shedding.is_shedding
+
+    # 遅延が下がるとprobeで計測し直して回復する
+    sleeping.sleep_sec = 0.0
+    assert [shedding.reflect("") for _ in range(3)] == ["ok", "ok", "ok"]
+    assert not shedding.is_shedding
+
+
+def test_require_probe_to_watch_latency():
+    with pytest.raises(ValueError, match="probe_interval"):
+        LoadSheddingOption(high_latency_ms=100.0, probe_interval=None)
+    LoadSheddingOption(high_queue_depth=10, probe_interval=None)
+
+
+def test_broken_queue_depth(reflector):
+    def _queue_depth():
+        raise RuntimeError("broken")
+
+    shedding = LoadSheddingReflector(reflector, queue_depth=_queue_depth)
+
+    # 呼び出し元のコールバックが失敗しても処理中の件数で判定する
+    with pytest.warns(UserWarning, match="broken"):
+        assert shedding.reflect("今日は旅行へ行く") == "旅行へ行くんですね。"
+    assert not shedding.is_shedding
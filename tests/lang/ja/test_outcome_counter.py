@@ -0,0 +1,64 @@
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.outcome_counter import OutcomeCounter
+from dialog_reflection.load_shedding_reflector import (
+    LoadSheddingOption,
+    LoadSheddingReflector,
+)
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+import pytest
+
+
+@pytest.fixture
+def counted_reflector(nlp_ja):
+    reflector = SpacyReflector(nlp_ja, JaSpacyPlainReflectionTextBuilder())
+    reflector.add_stage_hook(OutcomeCounter())
+    return reflector
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.filterwarnings("ignore:sent has wh_word")
+def test_count_outcomes(counted_reflector):
+    counter = counted_reflector.stage_hooks[0]
+    for message in [
+        "今日は旅行へ行きました",
+        "楽しかったです",
+        "どうでしょう？",
+        "明日は晴れるかしら",
+        "知らへん",
+        "ほら",
+    ]:
+        counted_reflector.reflect(message)
+
+    assert counter.counts() == {
+        ("success", None): 2,
+        ("WhTokenNotSupported", "副詞"): 1,
+        ("CancelledByToken", "助詞-終助詞"): 1,
+        ("DialectNotSupported", "助動詞"): 1,
+        ("NoValidSentence", None): 1,
+    }
+    assert counter.count("CancelledByToken") == 1
+    assert counter.count("CancelledByToken", "助動詞") == 0
+
+    assert counter.to_prometheus().splitlines() == [
+        "# HELP dialog_reflection_reflections_total Reflections by outcome and cancelled token tag.",
+        "# TYPE dialog_reflection_reflections_total counter",
+        'dialog_reflection_reflections_total{outcome="CancelledByToken",tag="助詞-終助詞"} 1',
+        'dialog_reflection_reflections_total{outcome="DialectNotSupported",tag="助動詞"} 1',
+        'dialog_reflection_reflections_total{outcome="NoValidSentence"} 1',
+        'dialog_reflection_reflections_total{outcome="WhTokenNotSupported",tag="副詞"} 1',
+        'dialog_reflection_reflections_total{outcome="success"} 2',
+    ]
+
+
+def test_count_shed_outcomes(counted_reflector):
+    counter = counted_reflector.stage_hooks[0]
+    shedding = LoadSheddingReflector(
+        counted_reflector,
+        LoadSheddingOption(high_queue_depth=-1, probe_interval=None),
+    )
+
+    shedding.reflect("今日は旅行へ行きました")
+
+    assert counter.counts() == {("Overloaded", None): 1}
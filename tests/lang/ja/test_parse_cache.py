@@ -0,0 +1,57 @@
+import pytest
+from dialog_reflection.parse_cache import (
+    ParseCache,
+    write_parse_cache,
+)
+
+TEXTS = [
+    "今日は旅行へ行く",
+    "私は彼女を愛している。私は幸せだ。",
+    "それはそれ",
+    "遊ぶ？",
+    "知ってるきに",
+    "",
+    "あなたと歩きました",
+]
+
+
+@pytest.fixture(scope="module")
+def cache_dir(nlp_ja, tmp_path_factory):
+    cache_dir = str(tmp_path_factory.mktemp("parse_cache"))
+    assert write_parse_cache(nlp_ja, TEXTS, cache_dir, shard_size=3) == len(TEXTS)
+    return cache_dir
+
+
+def test_parse_cache_docs(nlp_ja, cache_dir):
+    cache = ParseCache(cache_dir)
+    assert len(cache) == len(TEXTS)
+    assert len(cache.shards) == 3
+    assert list(cache.texts()) == TEXTS
+
+    for cached, doc in zip(cache.docs(), nlp_ja.pipe(TEXTS)):
+        # read with a vocab apart from the model
+        assert cached.vocab is not nlp_ja.vocab
+        for attr in ["norm_", "lemma_", "tag_", "pos_", "dep_"]:
+            assert [getattr(t, attr) for t in cached] == [getattr(t, attr) for t in doc]
+        assert [t.morph.get("Inflection") for t in cached] == [
+            t.morph.get("Inflection") for t in doc
+        ]
+        assert [t.head.i for t in cached] == [t.head.i for t in doc]
+        assert [s.text for s in cached.sents] == [s.text for s in doc.sents]
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.filterwarnings(r"ignore:sent has wh_word")
+def test_build_many_from_parse_cache(nlp_ja, builder, cache_dir):
+    cache = ParseCache(cache_dir)
+    assert builder.build_many(cache.docs()) == [
+        builder.safe_build(doc) for doc in nlp_ja.pipe(TEXTS)
+    ]
+    assert builder.build_many(cache.docs(shards=[1])) == [
+        builder.safe_build(doc) for doc in nlp_ja.pipe(TEXTS[3:6])
+    ]
+
+
+def test_parse_cache_not_found(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ParseCache(str(tmp_path))
@@ -0,0 +1,87 @@
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.outcome_counter import OutcomeCounter
+from dialog_reflection.profiling_sampler import (
+    ProfilingOption,
+    ProfilingSampler,
+)
+from concurrent.futures import ThreadPoolExecutor
+import json
+import pstats
+import tracemalloc
+
+
+def _dumps(dump_dir, suffix):
+    return sorted(path for path in dump_dir.iterdir() if path.suffix == suffix)
+
+
+def test_profile_every_n(nlp_ja, builder, tmp_path):
+    reflector = SpacyReflector(nlp_ja, builder)
+    reflector.profiling_sampler = ProfilingSampler(
+        ProfilingOption(dump_dir=str(tmp_path), every_n=2)
+    )
+
+    for message in ["今日は旅行へ行く", "明日は雨が降る", "昨日は晴れた", "楽しかった"]:
+        reflector.reflect(message)
+
+    metas = [json.loads(path.read_text()) for path in _dumps(tmp_path, ".json")]
+    assert [meta["message"] for meta in metas] == ["明日は雨が降る", "楽しかった"]
+    assert all(meta["trigger"] == "every_n" for meta in metas)
+    profiles = _dumps(tmp_path, ".prof")
+    assert len(profiles) == 2
+    assert pstats.Stats(str(profiles[0])).total_calls > 0
+
+
+def test_profile_slow_calls(nlp_ja, builder, tmp_path):
+    reflector = SpacyReflector(nlp_ja, builder)
+    counter = OutcomeCounter()
+    reflector.add_stage_hook(counter)
+    sampler = ProfilingSampler(
+        ProfilingOption(dump_dir=str(tmp_path), slower_than_ms=0, mode="tracemalloc")
+    )
+    reflector.profiling_sampler = sampler
+
+    assert reflector.reflect("今日は旅行へ行く") == "旅行へ行くんですね。"
+    sampler.join()
+
+    (meta_path,) = _dumps(tmp_path, ".json")
+    meta = json.loads(meta_path.read_text())
+    assert meta["message"] == "今日は旅行へ行く"
+    assert meta["trigger"] == "slow"
+    assert meta["peak_bytes"] > 0
+    (snapshot_path,) = _dumps(tmp_path, ".tracemalloc")
+    assert tracemalloc.Snapshot.load(str(snapshot_path)).traces
+    # 再実行はhookに通知しない
+    assert counter.count("success") == 1
+
+
+def test_replay_while_reflecting(nlp_ja, builder, tmp_path):
+    reflector = SpacyReflector(nlp_ja, builder)
+    messages = ["今日は旅行へ行く", "明日は雨が降る", "昨日は晴れた"] * 50
+    expected = [reflector.reflect(message) for message in messages]
+    sampler = ProfilingSampler(
+        ProfilingOption(dump_dir=str(tmp_path), slower_than_ms=0, max_pending=4)
+    )
+    reflector.profiling_sampler = sampler
+
+    # 再実行中も解析が並行して走り続ける
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        reflections = list(executor.map(reflector.reflect, messages))
+    sampler.join()
+
+    assert reflections == expected
+    assert reflector._replay_nlp is not None
+    assert reflector._replay_nlp is not reflector.nlp
+    assert sampler.dump_count > 0
+
+
+def test_max_dumps(nlp_ja, builder, tmp_path):
+    reflector = SpacyReflector(nlp_ja, builder)
+    reflector.profiling_sampler = ProfilingSampler(
+        ProfilingOption(dump_dir=str(tmp_path), every_n=1, max_dumps=2)
+    )
+
+    for _ in range(5):
+        reflector.reflect("今日は旅行へ行く")
+
+    assert len(_dumps(tmp_path, ".json")) == 2
+    assert len(_dumps(tmp_path, ".prof")) == 2
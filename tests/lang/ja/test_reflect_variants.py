@@ -0,0 +1,78 @@
+import pytest
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.reflection_text_builder import safe_build_variants
+from dialog_reflection.stage_hook import StageTimingAggregator
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.reflection_text_builder_option import (
+    JaSpacyPlainRelflectionTextBuilderOption,
+)
+
+# 「だね」の口調
+DANE = JaSpacyPlainRelflectionTextBuilderOption(
+    fn_last_token_taigen=lambda token: token.text + "なんだね。",
+    fn_last_token_yougen=lambda token: token.lemma_ + "んだね。",
+)
+
+
+def _builder_with_aggregator(op=JaSpacyPlainRelflectionTextBuilderOption()):
+    builder = JaSpacyPlainReflectionTextBuilder(op)
+    aggregator = StageTimingAggregator()
+    builder.add_stage_hook(aggregator)
+    return builder, aggregator
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.filterwarnings(r"ignore:sent has wh_word")
+@pytest.mark.parametrize(
+    "message",
+    ["今日は旅行へ行く", "それはそれ", "遊ぶ？", "知ってるきに", "静かな海"],
+)
+def test_reflect_variants(nlp_ja, builder, message):
+    dane = JaSpacyPlainReflectionTextBuilder(DANE)
+    reflector = SpacyReflector(nlp_ja, builder)
+
+    assert reflector.reflect_variants(message, [builder, dane]) == [
+        reflector.reflect(message),
+        SpacyReflector(nlp_ja, dane).reflect(message),
+    ]
+
+
+def test_reflect_variants_tone(nlp_ja, builder):
+    dane = JaSpacyPlainReflectionTextBuilder(DANE)
+    reflector = SpacyReflector(nlp_ja, builder)
+    assert reflector.reflect_variants("今日は旅行へ行く", [builder, dane]) == [
+        "旅行へ行くんですね。",
+        "旅行へ行くんだね。",
+    ]
+
+
+def test_safe_build_variants_share_stages(nlp_ja):
+    doc = nlp_ja("今日は旅行へ行きました")
+    desu, desu_aggregator = _builder_with_aggregator()
+    dane, dane_aggregator = _builder_with_aggregator(DANE)
+    verb_only, verb_only_aggregator = _builder_with_aggregator(
+        JaSpacyPlainRelflectionTextBuilderOption(allowed_root_pos_tags={"VERB"})
+    )
+
+    safe_build_variants([desu, dane, verb_only], doc)
+
+    assert {"extract_tokens", "cut_suffix", "exclude_keigo"} <= set(
+        desu_aggregator.stages()
+    )
+    # 語尾の処理のみ実行される
+    assert "extract_tokens" not in dane_aggregator.stages()
+    assert "cut_suffix" not in dane_aggregator.stages()
+    assert "exclude_keigo" not in dane_aggregator.stages()
+    assert "finalize" in dane_aggregator.stages()
+    # allowed_root_pos_tags が異なるため共有されない
+    assert "extract_tokens" in verb_only_aggregator.stages()
+
+
+def test_safe_build_variants_not_shared_outside(nlp_ja):
+    doc = nlp_ja("今日は旅行へ行く")
+    builder, aggregator = _builder_with_aggregator()
+    builder.safe_build(doc)
+    builder.safe_build(doc)
+    assert aggregator.histogram("extract_tokens").count == 2
@@ -349,3 +349,45 @@ class TestReflectionBuilder:
         tokens = builder._extract_tokens_with_nearest_heads(root)
         result = "".join(map(lambda t: t.text, tokens))
         assert result == expected, assert_message
+
+
+@pytest.mark.filterwarnings("ignore:sent has wh_word")
+@pytest.mark.parametrize(
+    "text, k, expected",
+    [
+        (
+            "今日は旅行へ行きました。明日は公園で本を読みます。",
+            3,
+            ["本を読むんですね。", "旅行へ行ったんですね。", "読むんですね。"],
+        ),
+        (
+            "今日は旅行へ行きました。明日は公園で本を読みます。",
+            1,
+            ["本を読むんですね。"],
+        ),
+        ("今日は旅行へ行く", 3, ["旅行へ行くんですね。", "行くんですね。"]),
+        ("旅行へ行った。何を食べた？", 3, ["旅行へ行ったんですね。", "行ったんですね。"]),
+        # 候補がない場合は safe_build の結果
+        ("何を食べた？", 3, ["んー。"]),
+        # k が 1 未満でも応答を1つ返す
+        ("今日は旅行へ行く", 0, ["旅行へ行くんですね。"]),
+    ],
+)
+def test_build_candidates(nlp_ja, builder, text, k, expected):
+    doc = nlp_ja(text)
+    assert builder.build_candidates(doc, k) == expected
+
+
+class _BrokenCutSuffixBuilder(JaSpacyPlainReflectionTextBuilder):
+    def _cut_suffix(self, tokens):
+        if "旅行" in tokens.text:
+            raise RuntimeError("broken")
+        return super()._cut_suffix(tokens)
+
+
+def test_build_candidates_cut_suffix_failed(nlp_ja):
+    doc = nlp_ja("今日は旅行へ行きました。明日は公園で本を読みます。")
+    # 失敗した文を除いた候補を返す
+    with pytest.warns(UserWarning, match="broken"):
+        candidates = _BrokenCutSuffixBuilder().build_candidates(doc, 3)
+    assert candidates == ["本を読むんですね。", "読むんですね。"]
@@ -0,0 +1,215 @@
+import pytest
+import threading
+import time
+from dialog_reflection.reflector import SpacyReflector, order_by_length
+from dialog_reflection.stage_hook import IStageHook
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.reflector import JaSpacyReflector, PRUNABLE_COMPONENTS
+from dialog_reflection.vocab_growth_policy import VocabGrowthPolicy
+from dialog_reflection.lang.ja.warm_up_corpus import WARM_UP_CORPUS
+
+
+def test_warm_up(nlp_ja, builder):
+    reflector = SpacyReflector(nlp_ja, builder)
+    assert not reflector.is_ready
+
+    report = reflector.warm_up(WARM_UP_CORPUS)
+
+    assert reflector.is_ready
+    assert report is reflector.startup_report
+    assert report.import_sec is not None
+    assert report.warm_up_sec is not None
+
+
+def test_warm_up_corpus_covers_cut_suffix(nlp_ja):
+    tags = {token.tag_ for doc in nlp_ja.pipe(WARM_UP_CORPUS) for token in doc}
+    # `_cut_suffix` で分岐するタグ
+    assert {
+        "感動詞-一般",
+        "感動詞-フィラー",
+        "連体詞",
+        "助詞-準体助詞",
+        "補助記号-読点",
+        "補助記号-句点",
+        "助動詞",
+        "助詞-接続助詞",
+        "助詞-終助詞",
+        "助詞-副助詞",
+        "助詞-係助詞",
+        "助詞-格助詞",
+    } <= tags
+
+
+def test_ja_startup_report():
+    reflector = JaSpacyReflector(model="ja_ginza")
+    report = reflector.startup_report
+    assert report.model_load_sec is not None
+    assert report.builder_construction_sec is not None
+    assert report.warm_up_sec is None
+    assert not reflector.is_ready
+
+    reflector.warm_up()
+
+    assert report.warm_up_sec is not None
+    assert reflector.is_ready
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+def test_reflect_many(reflector):
+    messages = ["今日は旅行へ行く", "", "楽しかったです"]
+    assert reflector.reflect_many(messages, batch_size=2) == [
+        reflector.reflect(message) for message in messages
+    ]
+
+
+def test_order_by_length():
+    messages = ["あいう", "あ", "あい", "あいうえ", "あ"]
+    assert order_by_length(messages, 3) == [1, 2, 0, 4, 3]
+    with pytest.raises(ValueError):
+        order_by_length(messages, 0)
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.parametrize("sort_window", [1, 2, 100])
+def test_reflect_many_sorted_by_length(reflector, sort_window):
+    messages = ["私は彼女を愛している。私は幸せだ。", "", "今日は旅行へ行く", "遊ぶ？"]
+    assert reflector.reflect_many(
+        messages, batch_size=2, sort_window=sort_window
+    ) == reflector.reflect_many(messages, batch_size=2)
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+def test_reflect_with_deadline(nlp_ja, builder):
+    reflector = SpacyReflector(nlp_ja, builder)
+
+    assert reflector.reflect("今日は旅行へ行く", deadline_ms=10_000) == "旅行へ行くんですね。"
+    assert reflector.deadline_missed_count == 0
+
+    # 解析前に期限切れとなり解析を省略する
+    assert reflector.reflect("今日は旅行へ行く", deadline_ms=0) == "そうなんですね。"
+    assert reflector.deadline_missed_count == 1
+
+
+def test_reflect_with_infinite_deadline(nlp_ja, builder):
+    reflector = SpacyReflector(nlp_ja, builder)
+
+    # inf は期限なしとして扱う
+    assert reflector.reflect("今日は旅行へ行く", deadline_ms=float("inf")) == "旅行へ行くんですね。"
+    assert reflector.deadline_missed_count == 0
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.parametrize("deadline_ms", [float("nan"), -1, float("-inf")])
+def test_reflect_with_invalid_deadline(nlp_ja, builder, deadline_ms):
+    reflector = SpacyReflector(nlp_ja, builder)
+
+    # NaN と負の値は即座に期限切れとする
+    assert reflector.reflect("今日は旅行へ行く", deadline_ms=deadline_ms) == "そうなんですね。"
+    assert reflector.deadline_missed_count == 1
+
+
+def test_deadline_missed_count_in_threads(nlp_ja, builder):
+    reflector = SpacyReflector(nlp_ja, builder)
+
+    def count_many():
+        for _ in range(10_000):
+            reflector._count_deadline_missed()
+
+    threads = [threading.Thread(target=count_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert reflector.deadline_missed_count == 40_000
+
+
+class _SlowExtractBuilder(JaSpacyPlainReflectionTextBuilder):
+    def extract_tokens(self, doc):
+        time.sleep(0.5)
+        return super().extract_tokens(doc)
+
+
+class _ErrorHook(IStageHook):
+    def __init__(self):
+        self.errors = []
+
+    def on_reflection(self, timings):
+        self.errors.append(timings.error)
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+def test_reflect_with_deadline_between_stages(nlp_ja):
+    reflector = SpacyReflector(nlp_ja, _SlowExtractBuilder())
+    hook = _ErrorHook()
+    reflector.add_stage_hook(hook)
+
+    # 解析は間に合い、ステージの間で期限切れとなる
+    assert reflector.reflect("今日は旅行へ行く", deadline_ms=200) == "そうなんですね。"
+    assert reflector.deadline_missed_count == 1
+    (error,) = hook.errors
+    assert error.reason.stage == "cut_suffix"
+
+
+def test_reflect_with_deadline_skip_parsing(nlp_ja, builder):
+    reflector = SpacyReflector(nlp_ja, builder)
+    message = "今日は旅行へ行く。" * 10
+    reflector.reflect(message)
+    assert reflector._estimate_parse_ms(message) > 0
+
+    # 1文字あたり1秒かかる想定
+    reflector._parse_ns_per_char = 1e9
+    assert reflector.reflect(message, deadline_ms=10_000) == "そうなんですね。"
+    assert reflector.deadline_missed_count == 1
+
+
+def test_renew_nlp_by_vocab_growth(nlp_ja, builder):
+    reflector = SpacyReflector(nlp_ja, builder)
+    reflector.vocab_growth_policy = VocabGrowthPolicy(
+        max_new_strings=0, check_every=2, background=False
+    )
+    messages = ["ヌポペロさんと会った", "今日は旅行へ行く"]
+    expected = [reflector.reflect(message) for message in messages]
+
+    assert reflector.nlp_renewed_count == 1
+    assert reflector.nlp is not nlp_ja
+    assert [reflector.reflect(message) for message in messages] == expected
+
+
+def test_renew_nlp_not_exceeded(nlp_ja, builder):
+    reflector = SpacyReflector(nlp_ja, builder)
+    reflector.vocab_growth_policy = VocabGrowthPolicy(
+        max_new_strings=10_000, check_every=1, background=False
+    )
+    reflector.reflect("ヌポペロさんと会った")
+
+    assert reflector.nlp_renewed_count == 0
+    assert reflector.nlp is nlp_ja
+
+
+def test_renew_nlp_failed(nlp_ja, builder):
+    def _fail():
+        raise OSError("model not found")
+
+    reflector = SpacyReflector(nlp_ja, builder)
+    reflector.nlp_factory = _fail
+
+    with pytest.warns(UserWarning, match="model not found"):
+        reflector.renew_nlp()
+
+    assert reflector.nlp_renewed_count == 0
+    assert reflector.nlp is nlp_ja
+    assert not reflector._renewing_nlp
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.filterwarnings(r"ignore:sent has wh_word")
+def test_ja_reflector_pruned(reflector):
+    pruned = JaSpacyReflector(model="ja_ginza", exclude=PRUNABLE_COMPONENTS)
+    assert not set(PRUNABLE_COMPONENTS) & set(pruned.nlp.pipe_names)
+
+    messages = ["今日は旅行へ行く", "私は彼女を愛している。私は幸せだ。", "遊ぶ？"]
+    assert pruned.reflect_many(messages) == reflector.reflect_many(messages)
+    # renewed without the excluded components
+    assert not set(PRUNABLE_COMPONENTS) & set(pruned.load_fresh_nlp().pipe_names)
@@ -0,0 +1,102 @@
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.stage_hook import (
+    IStageHook,
+    LatencyHistogram,
+    StageTimingAggregator,
+)
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+import pytest
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.filterwarnings("ignore:sent has wh_word")
+def test_reflector_stage_hook(nlp_ja):
+    reflector = SpacyReflector(nlp_ja, JaSpacyPlainReflectionTextBuilder())
+    aggregator = StageTimingAggregator()
+    reflector.add_stage_hook(aggregator)
+
+    reflector.reflect("今日は旅行へ行きました")
+    reflector.reflect("どうでしょう？")
+    reflector.reflect_many(["今日は旅行へ行きました"])
+
+    assert aggregator.stages() == [
+        "cut_suffix",
+        "exclude_keigo",
+        "extract_tokens",
+        "finalize",
+        "nlp",
+        "total",
+    ]
+    assert aggregator.outcomes() == ["WhTokenNotSupported", "success"]
+    assert aggregator.histogram("total").count == 3
+    assert aggregator.histogram("nlp").count == 2
+    assert aggregator.histogram("cut_suffix", "success").count == 2
+    assert aggregator.histogram("cut_suffix", "WhTokenNotSupported").count == 0
+
+    summary = aggregator.summary(outcome="success")
+    assert summary["total"]["count"] == 2
+    assert summary["total"]["p50_ms"] > 0
+
+
+def test_builder_stage_hook(nlp_ja):
+    builder = JaSpacyPlainReflectionTextBuilder()
+    builder_aggregator = StageTimingAggregator()
+    builder.add_stage_hook(builder_aggregator)
+
+    builder.safe_build(nlp_ja("今日は旅行へ行きました"))
+
+    assert "nlp" not in builder_aggregator.stages()
+    assert builder_aggregator.histogram("total").count == 1
+
+    # reflectorのhookと併用した場合はreflector全体の時間を共有する
+    reflector = SpacyReflector(nlp_ja, builder)
+    reflector_aggregator = StageTimingAggregator()
+    reflector.add_stage_hook(reflector_aggregator)
+
+    reflector.reflect("今日は旅行へ行きました")
+
+    assert "nlp" in builder_aggregator.stages()
+    assert builder_aggregator.histogram("total").count == 2
+    assert builder_aggregator.histogram("nlp").max_ns == (
+        reflector_aggregator.histogram("nlp").max_ns
+    )
+
+    # 同じhookは1回の応答につき1回だけ呼ばれる
+    shared = StageTimingAggregator()
+    reflector = SpacyReflector(nlp_ja, JaSpacyPlainReflectionTextBuilder())
+    reflector.add_stage_hook(shared)
+    reflector.builder.add_stage_hook(shared)
+
+    reflector.reflect("今日は旅行へ行きました")
+
+    assert shared.histogram("total").count == 1
+
+
+class _BrokenHook(IStageHook):
+    def on_reflection(self, timings):
+        raise RuntimeError("broken hook")
+
+
+def test_broken_stage_hook(nlp_ja):
+    reflector = SpacyReflector(nlp_ja, JaSpacyPlainReflectionTextBuilder())
+    aggregator = StageTimingAggregator()
+    reflector.add_stage_hook(_BrokenHook())
+    reflector.add_stage_hook(aggregator)
+
+    # hookの例外は警告にとどめて応答を返す
+    with pytest.warns(UserWarning, match="broken hook"):
+        assert reflector.reflect("今日は旅行へ行く") == "旅行へ行くんですね。"
+    assert aggregator.histogram("total").count == 1
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram(sub_buckets=8)
+    for duration_ns in range(1, 1001):
+        histogram.add(duration_ns * 1000)
+
+    assert histogram.count == 1000
+    assert histogram.percentile(0.5) == pytest.approx(500_000, rel=0.1)
+    assert histogram.percentile(0.99) == pytest.approx(990_000, rel=0.1)
+    assert histogram.percentile(1.0) == 1_000_000
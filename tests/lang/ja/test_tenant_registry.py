@@ -0,0 +1,75 @@
+import pytest
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.tenant_registry import TenantRegistry, UnknownTenant
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.reflection_text_builder_option import (
+    JaSpacyPlainRelflectionTextBuilderOption,
+)
+
+DESU = JaSpacyPlainRelflectionTextBuilderOption()
+DANE = JaSpacyPlainRelflectionTextBuilderOption(
+    fn_last_token_taigen=lambda token: token.text + "なんだね。",
+    fn_last_token_yougen=lambda token: token.lemma_ + "んだね。",
+)
+
+
+@pytest.fixture
+def registry():
+    registry = TenantRegistry(JaSpacyPlainReflectionTextBuilder)
+    registry.set_option("desu", DESU)
+    registry.set_option("dane", DANE)
+    return registry
+
+
+def test_set_option(registry):
+    assert registry.tenants == ["desu", "dane"]
+    assert registry.option("dane") is DANE
+    assert registry.builder("dane").op is DANE
+
+    # 等しいオプションのbuilderは再利用される
+    builder = registry.builder("desu")
+    assert (
+        registry.set_option("desu", JaSpacyPlainRelflectionTextBuilderOption())
+        is builder
+    )
+    assert registry.set_option("other", DESU) is builder
+    assert len(registry) == 3
+
+
+def test_replace_option(registry):
+    builders = registry.builders
+    registry.set_option("desu", DANE)
+    assert registry.builder("desu") is registry.builder("dane")
+    # 置き換え前の参照は影響を受けない
+    assert builders["desu"].op is DESU
+
+
+def test_unknown_tenant(registry):
+    with pytest.raises(UnknownTenant):
+        registry.builder("unknown")
+    registry.remove("dane")
+    assert "dane" not in registry
+    with pytest.raises(UnknownTenant):
+        registry.remove("dane")
+
+
+def test_reflect_mixed_tenants(nlp_ja, registry):
+    reflector = SpacyReflector(nlp_ja, registry.builder("desu"))
+    tenants = ["desu", "dane", "dane", "desu"]
+
+    assert reflector.reflect_many(
+        ["今日は旅行へ行く"] * len(tenants),
+        builders=[registry.builder(tenant) for tenant in tenants],
+    ) == [
+        "旅行へ行くんですね。",
+        "旅行へ行くんだね。",
+        "旅行へ行くんだね。",
+        "旅行へ行くんですね。",
+    ]
+    assert (
+        reflector.reflect("今日は旅行へ行く", builder=registry.builder("dane")) == "旅行へ行くんだね。"
+    )
+    with pytest.raises(ValueError):
+        reflector.reflect_many(["今日は旅行へ行く"], builders=[])
@@ -0,0 +1,150 @@
+from dialog_reflection.serving.coalescing import (
+    BurstCoalescer,
+    BurstCoalescingOption,
+)
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
+import pytest
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _send(coalescer, session, messages, interval_sec):
+    tasks = []
+    for message in messages:
+        tasks.append(asyncio.create_task(coalescer.reflect(session, message)))
+        await asyncio.sleep(interval_sec)
+    return await asyncio.gather(*tasks)
+
+
+def test_join(reflector):
+    coalescer = BurstCoalescer(reflector)
+    assert coalescer.join(["今日さ", "会社で", "怒られた"]) == "今日さ、会社で、怒られた"
+    assert coalescer.join(["疲れた。", "今日は"]) == "疲れた。今日は"
+
+
+def test_coalesce_burst(reflector):
+    async def _test():
+        coalescer = BurstCoalescer(
+            reflector, BurstCoalescingOption(quiet_period_sec=0.05)
+        )
+        try:
+            return (
+                await asyncio.gather(
+                    _send(coalescer, "a", ["今日さ", "会社で", "怒られた"], 0.01),
+                    _send(coalescer, "b", ["今日は旅行へ行く"], 0.01),
+                ),
+                coalescer.metrics,
+            )
+        finally:
+            await coalescer.close()
+
+    (a, b), metrics = _run(_test())
+
+    assert a == [None, None, "会社で、怒られたんですね。"]
+    assert b == ["旅行へ行くんですね。"]
+    assert metrics.messages_total == 4
+    assert metrics.reflections_total == 2
+    assert metrics.coalesced_total == 2
+
+
+@pytest.mark.parametrize(
+    "op",
+    [
+        BurstCoalescingOption(quiet_period_sec=1.0, max_messages=2),
+        BurstCoalescingOption(quiet_period_sec=1.0, max_wait_sec=0.05),
+    ],
+)
+def test_flush_long_burst(reflector, op):
+    async def _test():
+        coalescer = BurstCoalescer(reflector, op)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            return (
+                await _send(coalescer, "a", ["今日さ", "怒られた"], 0.01),
+                loop.time() - start,
+            )
+        finally:
+            await coalescer.close()
+
+    reflections, elapsed_sec = _run(_test())
+
+    assert reflections == [None, "今日さ、怒られたんですね。"]
+    assert elapsed_sec < 1.0
+
+
+def test_supersede_reflecting_burst(reflector):
+    async def _test():
+        executor = ThreadPoolExecutor(max_workers=1)
+        coalescer = BurstCoalescer(
+            reflector, BurstCoalescingOption(quiet_period_sec=0.01), executor
+        )
+        # 最初のメッセージの応答を処理中のままにする
+        blocked = threading.Event()
+        executor.submit(blocked.wait)
+        try:
+            first = asyncio.create_task(coalescer.reflect("a", "今日さ"))
+            await asyncio.sleep(0.05)
+            second = asyncio.create_task(coalescer.reflect("a", "怒られた"))
+            await asyncio.sleep(0)
+            blocked.set()
+            return await asyncio.gather(first, second), coalescer.metrics
+        finally:
+            await coalescer.close()
+            executor.shutdown()
+
+    reflections, metrics = _run(_test())
+
+    assert reflections == [None, "今日さ、怒られたんですね。"]
+    assert metrics.superseded_total == 1
+    assert metrics.reflections_total == 1
+
+
+class _SlowReflector:
+    def __init__(self, reflector, sleep_sec):
+        self.reflector = reflector
+        self.sleep_sec = sleep_sec
+
+    def reflect(self, message):
+        time.sleep(self.sleep_sec)
+        return self.reflector.reflect(message)
+
+
+def test_answer_steady_stream_within_max_wait(reflector):
+    async def _test():
+        # 応答の処理よりも短い間隔でメッセージが届き続ける
+        coalescer = BurstCoalescer(
+            _SlowReflector(reflector, 0.05),
+            BurstCoalescingOption(quiet_period_sec=0.005, max_wait_sec=0.2),
+        )
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        answered_at = []
+
+        async def _reflect(message):
+            reflection = await coalescer.reflect("a", message)
+            if reflection is not None:
+                answered_at.append(loop.time() - start)
+            return reflection
+
+        try:
+            tasks = []
+            for _ in range(100):
+                tasks.append(asyncio.create_task(_reflect("今日は旅行へ行く")))
+                await asyncio.sleep(0.01)
+            reflections = await asyncio.gather(*tasks)
+            return reflections, answered_at
+        finally:
+            await coalescer.close()
+
+    reflections, answered_at = _run(_test())
+
+    # max_wait_sec と応答1回分の処理時間で最初の応答を返す
+    assert answered_at[0] < 0.2 + 0.05 * 2 + 0.1
+    assert len(answered_at) > 1
+    assert reflections[-1] is not None
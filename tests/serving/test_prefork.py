@@ -0,0 +1,176 @@
+from dialog_reflection.serving import prefork
+from dialog_reflection.serving.prefork import (
+    PreforkOption,
+    PreforkSupervisor,
+    read_memory_usage,
+    serve_lines,
+)
+import io
+import json
+import os
+import signal
+import socket
+import time
+import pytest
+
+
+def _request(path: str, messages):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        with client.makefile("rwb") as f:
+            responses = []
+            for message in messages:
+                f.write(json.dumps({"message": message}).encode() + b"\n")
+                f.flush()
+                responses.append(json.loads(f.readline()))
+            return responses
+
+
+def test_serve_lines(reflector):
+    rfile = io.BytesIO(
+        "\n".join(
+            [
+                json.dumps({"message": "今日は旅行へ行く"}),
+                "",
+                "not json",
+                json.dumps({"message": 1}),
+            ]
+        ).encode()
+    )
+    wfile = io.BytesIO()
+
+    handled = serve_lines(reflector, rfile, wfile)
+
+    responses = [json.loads(line) for line in wfile.getvalue().splitlines()]
+    assert handled == 3
+    assert responses[0] == {"reflection": "旅行へ行くんですね。"}
+    assert "error" in responses[1]
+    assert "error" in responses[2]
+
+
+def test_read_memory_usage():
+    usage = read_memory_usage(os.getpid())
+    if usage is None:
+        pytest.skip("/proc is not available")
+    assert usage.rss_bytes > 0
+    assert 0 < usage.private_bytes <= usage.rss_bytes
+    assert 0.0 <= usage.shared_fraction <= 1.0
+
+
+def test_recycle_after_requests_in_flight(reflector):
+    supervisor = PreforkSupervisor(
+        reflector, PreforkOption(max_requests_per_worker=1, recycle_grace_sec=10.0)
+    )
+    server, client = socket.socketpair()
+    # 閾値を超えた後も送信済みのリクエストには応答する
+    client.sendall(
+        b"".join(
+            json.dumps({"message": message}).encode() + b"\n"
+            for message in ["今日は旅行へ行く", "今日は旅行へ行く", "今日は旅行へ行く"]
+        )
+    )
+    client.shutdown(socket.SHUT_WR)
+
+    with server:
+        handled, recycle = supervisor._serve_connection(server, 0)
+
+    with client, client.makefile("rb") as f:
+        responses = [json.loads(line) for line in f]
+    assert handled == 3
+    assert recycle
+    assert responses == [{"reflection": "旅行へ行くんですね。"}] * 3
+
+
+def test_recycle_after_grace_period(reflector):
+    supervisor = PreforkSupervisor(
+        reflector, PreforkOption(max_requests_per_worker=1, recycle_grace_sec=0.1)
+    )
+    server, client = socket.socketpair()
+    client.sendall(json.dumps({"message": "今日は旅行へ行く"}).encode() + b"\n")
+
+    # クライアントが接続を閉じなくても猶予の後に終了する
+    with server:
+        handled, recycle = supervisor._serve_connection(server, 0)
+
+    with client, client.makefile("rb") as f:
+        assert [json.loads(line) for line in f] == [{"reflection": "旅行へ行くんですね。"}]
+    assert handled == 1
+    assert recycle
+
+
+def test_recycle_by_private_memory(reflector):
+    supervisor = PreforkSupervisor(
+        reflector,
+        PreforkOption(max_private_bytes_per_worker=1, memory_check_every=2),
+    )
+    if read_memory_usage(os.getpid()) is None:
+        pytest.skip("/proc is not available")
+    assert not supervisor._should_recycle(1)
+    assert supervisor._should_recycle(2)
+
+
+def test_client_disconnected(reflector):
+    supervisor = PreforkSupervisor(reflector)
+    server, client = socket.socketpair()
+    client.sendall(json.dumps({"message": "今日は旅行へ行く"}).encode() + b"\n")
+    # 応答を読まずに切断しても worker は終了しない
+    client.close()
+
+    with server:
+        handled, recycle = supervisor._serve_connection(server, 0)
+
+    assert handled == 1
+    assert not recycle
+
+
+def test_check_memory_only_on_requests(reflector, monkeypatch):
+    calls = []
+
+    def _read_memory_usage(pid):
+        calls.append(pid)
+        return None
+
+    monkeypatch.setattr(prefork, "read_memory_usage", _read_memory_usage)
+    supervisor = PreforkSupervisor(
+        reflector,
+        PreforkOption(max_private_bytes_per_worker=1, memory_check_every=2),
+    )
+    server, client = socket.socketpair()
+    # 空行では件数が変わらないため確認しない
+    client.sendall(json.dumps({"message": "今日は旅行へ行く"}).encode() + b"\n" + b"\n" * 10)
+    client.shutdown(socket.SHUT_WR)
+
+    with server:
+        handled, _ = supervisor._serve_connection(server, 1)
+
+    client.close()
+    assert handled == 2
+    assert len(calls) == 1
+
+
+@pytest.mark.filterwarnings("ignore:.*fork")
+def test_prefork_supervisor_restarts_workers(reflector, tmp_path):
+    path = str(tmp_path / "reflection.sock")
+    op = PreforkOption(
+        num_workers=1, max_requests_per_worker=1, check_interval_sec=0.05
+    )
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            PreforkSupervisor(reflector, op).serve_unix_socket(path)
+        finally:
+            os._exit(0)
+
+    try:
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.05)
+
+        # each request is served by a restarted worker
+        for _ in range(3):
+            assert _request(path, ["今日は旅行へ行く"]) == [{"reflection": "旅行へ行くんですね。"}]
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
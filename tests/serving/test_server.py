@@ -0,0 +1,295 @@
+from dialog_reflection.serving.server import (
+    ReflectionServer,
+    ServerOption,
+    ServerClosed,
+    ServerOverloaded,
+)
+from dialog_reflection.tenant_registry import TenantRegistry
+from dialog_reflection.lang.ja.reflection_text_builder import (
+    JaSpacyPlainReflectionTextBuilder,
+)
+from dialog_reflection.lang.ja.reflection_text_builder_option import (
+    JaSpacyPlainRelflectionTextBuilderOption,
+)
+import asyncio
+import json
+import pytest
+import struct
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_reflect_in_batches(reflector):
+    async def _test():
+        server = ReflectionServer(reflector, ServerOption(max_batch_size=8))
+        await server.start()
+        try:
+            return (
+                await asyncio.gather(*[server.reflect("今日は旅行へ行く") for _ in range(5)]),
+                server.metrics,
+            )
+        finally:
+            await server.close()
+
+    reflections, metrics = _run(_test())
+
+    assert reflections == ["旅行へ行くんですね。"] * 5
+    assert metrics.batched_requests_total == 5
+    assert metrics.batches_total < 5
+
+
+def test_reject_when_queue_is_full(reflector):
+    async def _test():
+        server = ReflectionServer(
+            reflector, ServerOption(max_queue_size=1, max_batch_size=1)
+        )
+        await server.start()
+        try:
+            return (
+                await asyncio.gather(
+                    *[server.reflect("今日は旅行へ行く") for _ in range(10)],
+                    return_exceptions=True,
+                ),
+                server.metrics,
+            )
+        finally:
+            await server.close()
+
+    results, metrics = _run(_test())
+
+    rejected = [r for r in results if isinstance(r, ServerOverloaded)]
+    assert len(rejected) > 0
+    assert metrics.rejected_total == len(rejected)
+    assert "旅行へ行くんですね。" in results
+
+
+def test_deadline_exceeded(reflector):
+    async def _test():
+        server = ReflectionServer(reflector)
+        await server.start()
+        try:
+            return await server.reflect("今日は旅行へ行く", deadline_ms=0), server.metrics
+        finally:
+            await server.close()
+
+    reflection, metrics = _run(_test())
+
+    # 期限切れはフォールバックの応答を返す
+    assert reflection == "そうなんですね。"
+    assert metrics.deadline_exceeded_total == 1
+
+
+class _FailingReflector:
+    def __init__(self, reflector):
+        self.builder = reflector.builder
+
+    def reflect_many(self, *args):
+        raise RuntimeError("broken pipeline")
+
+
+def test_batch_failure(reflector):
+    async def _test():
+        server = ReflectionServer(_FailingReflector(reflector))
+        await server.start()
+        try:
+            return await server._reflect_payload(
+                json.dumps({"message": "今日は旅行へ行く"}).encode()
+            )
+        finally:
+            await server.close()
+
+    assert _run(_test()) == (500, {"error": "RuntimeError: broken pipeline"})
+
+
+def test_close_fails_queued_requests(reflector):
+    async def _test():
+        server = ReflectionServer(reflector, ServerOption(max_batch_wait_sec=10.0))
+        await server.start()
+        tasks = [
+            asyncio.create_task(server.reflect("今日は旅行へ行く", deadline_ms=None))
+            for _ in range(3)
+        ]
+        # バッチが埋まるのを待っている間に閉じる
+        await asyncio.sleep(0.01)
+        await server.close()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = _run(_test())
+
+    assert len(results) == 3
+    assert all(isinstance(r, ServerClosed) for r in results)
+
+
+def test_serve_http(reflector):
+    async def _request(port, raw):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        status_line = await reader.readline()
+        headers = {}
+        while (line := await reader.readline()) != b"\r\n":
+            key, _, value = line.decode().partition(":")
+            headers[key.lower()] = value.strip()
+        body = await reader.readexactly(int(headers["content-length"]))
+        writer.close()
+        return int(status_line.split()[1]), body
+
+    async def _test():
+        server = ReflectionServer(reflector)
+        listener = await server.serve_http("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            body = json.dumps({"message": "今日は旅行へ行く"}).encode()
+            return (
+                await _request(
+                    port,
+                    f"POST /reflect HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+                    + body,  # noqa: W503
+                ),
+                await _request(port, b"GET /metrics HTTP/1.1\r\n\r\n"),
+                await _request(port, b"GET /unknown HTTP/1.1\r\n\r\n"),
+            )
+        finally:
+            listener.close()
+            await server.close()
+
+    reflection, metrics, not_found = _run(_test())
+
+    assert reflection == (
+        200,
+        json.dumps({"reflection": "旅行へ行くんですね。"}, ensure_ascii=False).encode(),
+    )
+    assert metrics[0] == 200
+    assert b"dialog_reflection_server_requests_total 1" in metrics[1]
+    assert not_found[0] == 404
+
+
+def test_serve_unix(reflector, tmp_path):
+    path = str(tmp_path / "reflection.sock")
+
+    async def _request(payload):
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(struct.pack(">I", len(payload)) + payload)
+        await writer.drain()
+        (length,) = struct.unpack(">I", await reader.readexactly(4))
+        response = json.loads(await reader.readexactly(length))
+        writer.close()
+        return response
+
+    async def _test():
+        server = ReflectionServer(reflector)
+        listener = await server.serve_unix(path)
+        try:
+            return (
+                await _request(json.dumps({"message": "今日は旅行へ行く"}).encode()),
+                await _request(b"{}"),
+            )
+        finally:
+            listener.close()
+            await server.close()
+
+    reflection, error = _run(_test())
+
+    assert reflection == {"reflection": "旅行へ行くんですね。"}
+    assert "error" in error
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        b'{"message": "a", "deadline_ms": true}',
+        b'{"message": "a", "deadline_ms": Infinity}',
+        b'{"message": "a", "deadline_ms": NaN}',
+    ],
+)
+def test_reject_invalid_deadline(reflector, payload):
+    async def _test():
+        server = ReflectionServer(reflector)
+        await server.start()
+        try:
+            return await server._reflect_payload(payload)
+        finally:
+            await server.close()
+
+    status, response = _run(_test())
+
+    assert status == 400
+    assert "deadline_ms" in response["error"]
+
+
+def test_serve_http_negative_content_length(reflector):
+    async def _test():
+        server = ReflectionServer(reflector)
+        listener = await server.serve_http("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"POST /reflect HTTP/1.1\r\nContent-Length: -1\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            listener.close()
+            await server.close()
+
+    assert _run(_test()).startswith(b"HTTP/1.1 400")
+
+
+def test_serve_unix_payload_too_large(reflector, tmp_path):
+    path = str(tmp_path / "reflection.sock")
+
+    async def _test():
+        server = ReflectionServer(reflector, ServerOption(max_body_bytes=8))
+        listener = await server.serve_unix(path)
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(struct.pack(">I", 9))
+            await writer.drain()
+            (length,) = struct.unpack(">I", await reader.readexactly(4))
+            response = json.loads(await reader.readexactly(length))
+            # エラーを返した後に接続を閉じる
+            closed = await reader.read() == b""
+            writer.close()
+            return response, closed
+        finally:
+            listener.close()
+            await server.close()
+
+    assert _run(_test()) == ({"error": "payload too large"}, True)
+
+
+def test_reflect_tenants(reflector):
+    tenants = TenantRegistry(JaSpacyPlainReflectionTextBuilder)
+    tenants.set_option(
+        "dane",
+        JaSpacyPlainRelflectionTextBuilderOption(
+            fn_last_token_taigen=lambda token: token.text + "なんだね。",
+            fn_last_token_yougen=lambda token: token.lemma_ + "んだね。",
+        ),
+    )
+
+    async def _test():
+        server = ReflectionServer(reflector, ServerOption(max_batch_size=8), tenants)
+        await server.start()
+        try:
+            return (
+                await asyncio.gather(
+                    server.reflect("今日は旅行へ行く"),
+                    server.reflect("今日は旅行へ行く", tenant="dane"),
+                ),
+                await server._reflect_payload(
+                    json.dumps({"message": "今日は旅行へ行く", "tenant": "x"}).encode()
+                ),
+                server.metrics,
+            )
+        finally:
+            await server.close()
+
+    reflections, unknown, metrics = _run(_test())
+
+    assert reflections == ["旅行へ行くんですね。", "旅行へ行くんだね。"]
+    assert unknown[0] == 400
+    assert metrics.batches_total == 1
@@ -0,0 +1,112 @@
+import glob
+import json
+import os
+import pytest
+from dialog_reflection.tools.bulk import (
+    BulkJobOption,
+    CHECKPOINT_FILE,
+    main,
+    read_chunk,
+    run_bulk_job,
+    shard_path,
+    split_chunks,
+)
+
+LINES = ["今日は旅行へ行く", "それはそれ", "今日は旅行へ行く", "", "楽しかったです"] * 4
+
+
+@pytest.fixture
+def input_path(tmp_path):
+    path = tmp_path / "messages.txt"
+    path.write_text("\n".join(LINES) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def _read_shards(output_dir):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(output_dir, "part-*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            rows.extend(json.loads(line) for line in f)
+    return rows
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 64, 2**20])
+def test_split_chunks(input_path, chunk_bytes):
+    chunks = split_chunks(input_path, chunk_bytes)
+    assert chunks[0][0] == 0
+    assert chunks[-1][1] == os.path.getsize(input_path)
+    assert [
+        line for start, end in chunks for line in read_chunk(input_path, start, end)
+    ] == LINES
+
+
+@pytest.mark.parametrize("chunk_bytes", [0, -1])
+def test_split_chunks_of_invalid_size(input_path, chunk_bytes):
+    with pytest.raises(ValueError, match="must be positive"):
+        split_chunks(input_path, chunk_bytes)
+    with pytest.raises(ValueError):
+        BulkJobOption(chunk_bytes=chunk_bytes)
+
+
+def test_main_of_invalid_chunk_size(input_path, tmp_path):
+    with pytest.raises(SystemExit):
+        main([input_path, str(tmp_path / "out"), "--chunk-mb", "0"])
+
+
+def test_read_chunk_of_broken_bytes(tmp_path):
+    path = tmp_path / "broken.txt"
+    path.write_bytes("今日は旅行へ行く\n".encode() + b"\xff\xfe\n")
+
+    # 壊れたバイトは置き換えてジョブを続ける
+    assert read_chunk(str(path), 0, path.stat().st_size) == [
+        "今日は旅行へ行く",
+        "\ufffd\ufffd",
+    ]
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_bulk_job(reflector, input_path, tmp_path, workers):
+    output_dir = str(tmp_path / "out")
+    report = run_bulk_job(
+        reflector,
+        input_path,
+        output_dir,
+        BulkJobOption(chunk_bytes=64, workers=workers),
+    )
+
+    assert report.chunks_processed == report.chunks_total > 1
+    assert report.lines == len(LINES)
+    # deduplicated within the chunks
+    assert report.reflected < len(LINES)
+    rows = _read_shards(output_dir)
+    assert [row["message"] for row in rows] == LINES
+    assert [row["reflection"] for row in rows] == reflector.reflect_many(LINES)
+
+
+@pytest.mark.filterwarnings(r"ignore:.*Traceback")
+def test_run_bulk_job_resume(reflector, input_path, tmp_path):
+    output_dir = str(tmp_path / "out")
+    op = BulkJobOption(chunk_bytes=64)
+    first = run_bulk_job(reflector, input_path, output_dir, op)
+
+    # nothing to do after the job completed
+    second = run_bulk_job(reflector, input_path, output_dir, op)
+    assert second.chunks_skipped == first.chunks_total
+    assert second.chunks_processed == 0
+
+    # a shard lost by a crash is processed again
+    os.remove(shard_path(output_dir, 1))
+    third = run_bulk_job(reflector, input_path, output_dir, op)
+    assert third.chunks_processed == 1
+    assert [row["message"] for row in _read_shards(output_dir)] == LINES
+
+
+def test_run_bulk_job_checkpoint_of_another_option(reflector, input_path, tmp_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    (output_dir / CHECKPOINT_FILE).write_text(
+        json.dumps({"manifest": {"chunk_bytes": 1}, "done": []})
+    )
+    with pytest.raises(ValueError, match="another input or option"):
+        run_bulk_job(reflector, input_path, str(output_dir))
@@ -0,0 +1,73 @@
+import json
+import pytest
+from dialog_reflection.parse_cache import write_parse_cache
+from dialog_reflection.tools.option_diff import (
+    diff_options,
+    evolve_option,
+    load_builder,
+)
+from dialog_reflection.lang.ja.reflection_text_builder_option import (
+    JaSpacyPlainRelflectionTextBuilderOption,
+)
+
+TEXTS = ["今日は旅行へ行く", "それはそれ", "楽しい", "遊ぶ？", "雨が降った"]
+
+# テスト用の設定
+NOUN_ONLY = JaSpacyPlainRelflectionTextBuilderOption(allowed_root_pos_tags={"NOUN"})
+
+
+@pytest.fixture(scope="module")
+def cache_dir(nlp_ja, tmp_path_factory):
+    cache_dir = str(tmp_path_factory.mktemp("parse_cache"))
+    write_parse_cache(nlp_ja, TEXTS, cache_dir, shard_size=2)
+    return cache_dir
+
+
+def test_evolve_option():
+    op = JaSpacyPlainRelflectionTextBuilderOption()
+    evolved = evolve_option(
+        op,
+        {
+            "+valid_setsuzokujoshi_norms": ["けど"],
+            "-allowed_root_pos_tags": ["VERB"],
+        },
+    )
+    assert evolved.valid_setsuzokujoshi_norms == op.valid_setsuzokujoshi_norms | {"けど"}
+    assert evolved.allowed_root_pos_tags == op.allowed_root_pos_tags - {"VERB"}
+
+    with pytest.raises(ValueError, match="unknown option"):
+        evolve_option(op, {"unknown": []})
+    with pytest.raises(ValueError, match="not a set"):
+        evolve_option(op, {"+fn_message_when_error": []})
+
+
+def test_load_builder(tmp_path):
+    assert load_builder(None).op == JaSpacyPlainRelflectionTextBuilderOption()
+    assert load_builder(f"{__name__}:NOUN_ONLY").op is NOUN_ONLY
+
+    path = tmp_path / "candidate.json"
+    path.write_text(json.dumps({"allowed_root_pos_tags": ["NOUN"]}))
+    assert load_builder(str(path)).op.allowed_root_pos_tags == {"NOUN"}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_diff_options(cache_dir, tmp_path, workers):
+    path = tmp_path / "candidate.json"
+    path.write_text(json.dumps({"-allowed_root_pos_tags": ["VERB"]}))
+
+    diff = diff_options(cache_dir, None, str(path), workers=workers)
+
+    assert diff.docs == len(TEXTS)
+    assert [c.text for c in diff.changed] == ["今日は旅行へ行く", "雨が降った"]
+    assert diff.outcome_changes == {("success", "NoValidSentence"): 2}
+    assert diff.base_docs_per_sec > 0
+    assert diff.candidate_docs_per_sec > 0
+    assert "success -> NoValidSentence: 2" in diff.format(show=10)
+    assert diff.to_dict(show=1)["changed"] == 2
+
+
+def test_diff_options_same(cache_dir):
+    diff = diff_options(cache_dir, None, None, workers=1)
+    assert diff.docs == len(TEXTS)
+    assert not diff.changed
+    assert not diff.outcome_changes
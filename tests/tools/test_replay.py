@@ -0,0 +1,88 @@
+import json
+import pytest
+from dialog_reflection.reflector import SpacyReflector
+from dialog_reflection.tools.replay import (
+    _fresh_reflector,
+    format_summary,
+    read_corpus,
+    replay,
+)
+
+MESSAGES = ["今日は旅行へ行く", "それはそれ", "楽しかったです", "何を食べた？"] * 3
+
+
+def test_read_corpus_text(tmp_path):
+    path = tmp_path / "corpus.txt"
+    path.write_text("今日は旅行へ行く\n\n楽しかった\nそれはそれ\n", encoding="utf-8")
+    assert read_corpus(str(path)) == ["今日は旅行へ行く", "楽しかった", "それはそれ"]
+    assert read_corpus(str(path), limit=2) == ["今日は旅行へ行く", "楽しかった"]
+
+
+def test_read_corpus_jsonl(tmp_path):
+    path = tmp_path / "corpus.jsonl"
+    lines = [{"text": "今日は旅行へ行く"}, "楽しかった", {"text": None}, {"other": "x"}]
+    path.write_text(
+        "\n".join(json.dumps(line, ensure_ascii=False) for line in lines),
+        encoding="utf-8",
+    )
+    assert read_corpus(str(path), field="text") == ["今日は旅行へ行く", "楽しかった"]
+
+
+def test_read_corpus_parquet(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    path = tmp_path / "corpus.parquet"
+    table = pyarrow.table({"message": ["今日は旅行へ行く", None, "楽しかった"]})
+    pyarrow.parquet.write_table(table, str(path))
+    assert read_corpus(str(path)) == ["今日は旅行へ行く", "楽しかった"]
+
+
+@pytest.mark.parametrize(
+    "batch_size, workers, parallel",
+    [
+        (None, 1, "thread"),
+        (4, 1, "thread"),
+        (None, 2, "process"),
+        (4, 2, "process"),
+    ],
+)
+def test_replay(reflector, batch_size, workers, parallel):
+    hooks = reflector.stage_hooks
+
+    summary = replay(
+        reflector,
+        MESSAGES,
+        batch_size=batch_size,
+        workers=workers,
+        parallel=parallel,
+        chunk_size=5,
+    )
+
+    assert summary["messages"] == len(MESSAGES)
+    assert summary["messages_per_sec"] > 0
+    assert set(summary["latency"]) == {"mean_ms", "p50_ms", "p95_ms", "p99_ms"}
+    assert {"extract_tokens", "cut_suffix", "finalize"} <= set(summary["stages"])
+    assert {
+        outcome: stats["count"] for outcome, stats in summary["outcomes"].items()
+    } == {"success": 6, "NoValidSentence": 3, "WhTokenNotSupported": 3}
+    assert "outcomes" in format_summary(summary)
+    # the hooks of the replay are removed
+    assert reflector.stage_hooks == hooks
+
+
+def test_replay_threads(reflector):
+    summary = replay(reflector, MESSAGES, workers=2, parallel="thread", chunk_size=5)
+    assert summary["messages"] == len(MESSAGES)
+    assert summary["outcomes"]["success"]["count"] == 6
+
+
+def test_fresh_reflector_warmed_up(nlp_ja, reflector):
+    reflector = SpacyReflector(nlp_ja, reflector.builder)
+    reflector.warm_up_corpus = ["今日は旅行へ行く"]
+    assert not _fresh_reflector(reflector).is_ready
+
+    reflector.warm_up()
+    fresh = _fresh_reflector(reflector)
+    assert fresh.is_ready
+    assert fresh.nlp is not reflector.nlp